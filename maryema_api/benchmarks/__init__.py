@@ -0,0 +1,7 @@
+"""
+Benchmarks of the hot paths of the API
+
+They are not collected by the test runner, run them with:
+
+    python manage.py test benchmarks --pattern="bench_*.py"
+"""
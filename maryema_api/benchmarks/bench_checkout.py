@@ -0,0 +1,99 @@
+"""
+Hammers the checkout from many threads against one hot variant
+
+Every customer has the hot variant in the cart and checks out at the same time,
+only as many checkouts as there are units in stock should succeed.
+
+The number of threads is set with the BENCH_THREADS environment variable.
+Run it against PostgreSQL to measure the contention of the row locks,
+SQLite serializes the writers so the failed attempts are retried.
+"""
+
+import os
+import threading
+import time
+from collections import Counter
+from profile.tests.factories import ProfileFactory
+from time import perf_counter
+
+from django.db import OperationalError, connection
+from django.test import TransactionTestCase
+from rest_framework.test import APIClient
+
+from cart.models import CartItem
+from order.models import Order
+from product.models import ProductListing, Size
+from product.tests.factories import VariantFactory
+
+THREADS = int(os.environ.get("BENCH_THREADS", 50))
+STOCK = THREADS // 5
+RETRIES = 20
+
+
+class CheckoutConcurrencyBenchmark(TransactionTestCase):
+    def setUp(self) -> None:
+        self.variant = VariantFactory(
+            size=Size.objects.create(name="M"), quantity=STOCK, cost=50, price=100
+        )
+        self.customers = ProfileFactory.create_batch(THREADS)
+        for customer in self.customers:
+            CartItem.objects.create(
+                cart=customer.carts.get(is_active=True),
+                product_variant=self.variant,
+                quantity=1,
+            )
+
+    def count(self, results: Counter, key) -> None:
+        with self.lock:
+            results[key] += 1
+
+    def checkout(self, customer, barrier: threading.Barrier, results: Counter):
+        client = APIClient()
+        client.force_authenticate(user=customer.user)
+        barrier.wait()
+        try:
+            for _ in range(RETRIES):
+                try:
+                    response = client.post("/api/cart/checkout/")
+                except OperationalError:
+                    response = None
+                # the database was busy (SQLite), try again
+                if response is None or "locked" in str(response.data):
+                    self.count(results, "retries")
+                    time.sleep(0.01)
+                    continue
+                self.count(results, response.status_code)
+                return
+            self.count(results, "gave up")
+        finally:
+            connection.close()
+
+    def test_hot_variant(self) -> None:
+        results = Counter()
+        self.lock = threading.Lock()
+        barrier = threading.Barrier(THREADS)
+        threads = [
+            threading.Thread(target=self.checkout, args=(customer, barrier, results))
+            for customer in self.customers
+        ]
+        start = perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = perf_counter() - start
+
+        self.variant.refresh_from_db()
+        sold = Order.objects.count()
+        print(
+            f"\n{THREADS} concurrent checkouts of {STOCK} units"
+            f" in {elapsed * 1000:.0f} ms ({THREADS / elapsed:.0f} checkouts/s)"
+        )
+        print(f"responses: {dict(results)}")
+        # no unit is sold twice
+        self.assertLessEqual(sold, STOCK)
+        self.assertEqual(self.variant.quantity, STOCK - sold)
+        listing = ProductListing.objects.get(product=self.variant.product)
+        self.assertEqual(listing.in_stock, STOCK - sold)
+        if not results["gave up"]:
+            self.assertEqual(sold, STOCK)
@@ -0,0 +1,67 @@
+"""
+Benchmarks the bulk generation of the discount codes of a rule
+
+It compares creating codes one by one with `DiscountCode.save()`
+(a `full_clean` with a uniqueness query each) with `generate_codes`.
+
+The number of generated codes is set with the BENCH_CODES environment variable
+(1000000 for a large campaign), the codes saved one by one are a tenth of them
+up to SAVED_CODES.
+"""
+
+import os
+from datetime import timedelta
+from time import perf_counter
+
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+from discount.codes import (
+    DEFAULT_ALPHABET,
+    DEFAULT_LENGTH,
+    generate_codes,
+    random_codes,
+)
+from discount.models import DiscountCode, DiscountRule
+
+CODES = int(os.environ.get("BENCH_CODES", 200_000))
+SAVED_CODES = min(CODES // 10, 2000)
+
+
+class GenerateCodesBenchmark(TransactionTestCase):
+    def setUp(self) -> None:
+        now = timezone.now()
+        self.rule = DiscountRule.objects.create(
+            title="Campaign",
+            value=10,
+            starts_at=now,
+            ends_at=now + timedelta(days=30),
+        )
+
+    def test_generate(self) -> None:
+        codes = random_codes(SAVED_CODES, DEFAULT_ALPHABET, DEFAULT_LENGTH, "S")
+        start = perf_counter()
+        for code in codes:
+            DiscountCode(
+                discount_rule=self.rule,
+                code=code,
+                starts_at=self.rule.starts_at,
+                ends_at=self.rule.ends_at,
+            ).save()
+        saved = perf_counter() - start
+
+        start = perf_counter()
+        created = generate_codes(self.rule, CODES)
+        generated = perf_counter() - start
+
+        print(
+            f"\nsave(): {SAVED_CODES} codes in {saved:.2f} s"
+            f" ({SAVED_CODES / saved:.0f} codes/s)"
+            f"\ngenerate_codes: {CODES} codes in {generated:.2f} s"
+            f" ({CODES / generated:.0f} codes/s)"
+        )
+        self.assertEqual(len(set(created)), CODES)
+        self.assertEqual(
+            DiscountCode.objects.filter(discount_rule=self.rule).count(),
+            CODES + SAVED_CODES,
+        )
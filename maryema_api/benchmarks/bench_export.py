@@ -0,0 +1,76 @@
+"""
+Benchmarks the streaming export of the order items
+
+It exports growing numbers of items and reports the time and the peak of the memory
+allocated while streaming them, which stays flat whatever the number of rows.
+
+The largest number of items is set with the BENCH_ORDER_ITEMS environment variable.
+"""
+
+import os
+import tracemalloc
+from profile.tests.factories import ProfileFactory
+from time import perf_counter
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from order.models import Order, OrderItem
+from product.models import Size
+from product.tests.factories import VariantFactory
+
+ORDER_ITEMS = int(os.environ.get("BENCH_ORDER_ITEMS", 200000))
+ITEMS_PER_ORDER = 4
+
+
+class OrderExportBenchmark(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Size.objects.create(name="M")
+        variants = VariantFactory.create_batch(ITEMS_PER_ORDER)
+        profile = ProfileFactory()
+        orders = Order.objects.bulk_create(
+            [Order(profile=profile) for _ in range(ORDER_ITEMS // ITEMS_PER_ORDER)],
+            batch_size=5000,
+        )
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(order=order, product_variant=variant)
+                for order in orders
+                for variant in variants
+            ],
+            batch_size=5000,
+        )
+        cls.orders = [order.pk for order in orders]
+
+    def export(self, client: APIClient, params: dict) -> tuple[float, float, int]:
+        tracemalloc.start()
+        start = perf_counter()
+        response = client.get("/api/orders/export/", params)
+        size = sum(len(chunk) for chunk in response.streaming_content)
+        elapsed = perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return elapsed, peak / 2**20, size
+
+    def test_export(self) -> None:
+        client = APIClient()
+        client.force_authenticate(user=ProfileFactory(admin=True).user)
+        print(f"\n{'items':>8} {'output':>10} {'s':>6} {'peak MiB':>9} {'MiB':>7}")
+        for fraction in (10, 1):
+            items = ORDER_ITEMS // fraction
+            # only the orders up to the wanted number of items
+            Order.objects.filter(pk__in=self.orders[items // ITEMS_PER_ORDER :]).update(
+                status=Order.StatusChoice.CLOSED
+            )
+            for output, gzip in (("ndjson", False), ("csv", False), ("csv", True)):
+                params = {"status": "pending", "output": output}
+                if gzip:
+                    params["gzip"] = "true"
+                elapsed, peak, size = self.export(client, params)
+                label = f"{output}{'.gz' if gzip else ''}"
+                print(
+                    f"{items:>8} {label:>10} {elapsed:>6.1f} {peak:>9.1f}"
+                    f" {size / 2**20:>7.1f}"
+                )
+            Order.objects.update(status=Order.StatusChoice.PENDING)
@@ -0,0 +1,75 @@
+"""
+Benchmarks the derivatives of the product images
+
+It compares the bytes a product grid downloads with the originals and with the
+card derivatives, and the time to generate the derivatives of a batch of images
+on one thread and on the worker pool.
+
+The size of the originals is set with the BENCH_IMAGE_SIZE environment variable
+(the width, 3:2) and the number of images with BENCH_IMAGES.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from time import perf_counter
+
+from django.test import SimpleTestCase
+from PIL import Image, ImageFilter
+
+from product.images import CARD_WIDTH, render_derivatives
+
+WIDTH = int(os.environ.get("BENCH_IMAGE_SIZE", 2400))
+IMAGES = int(os.environ.get("BENCH_IMAGES", 8))
+# the cards of a page of the products list
+GRID = 24
+
+
+def photo(seed: int) -> bytes:
+    """A photo-like JPEG upload: a blurred noise (smooth areas and some detail)"""
+    size = (WIDTH, WIDTH * 2 // 3)
+    noise = Image.effect_noise((size[0] // 8, size[1] // 8), 64 + seed)
+    image = Image.merge(
+        "RGB", [noise.resize(size).filter(ImageFilter.GaussianBlur(2))] * 3
+    )
+    file = BytesIO()
+    image.save(file, "JPEG", quality=92)
+    return file.getvalue()
+
+
+class ImageDerivativesBenchmark(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.originals = [photo(seed) for seed in range(IMAGES)]
+
+    def render(self, original: bytes) -> list:
+        return list(render_derivatives(BytesIO(original)))
+
+    def test_grid_bytes(self) -> None:
+        original = self.originals[0]
+        cards = {
+            format: len(data)
+            for format, width, data in self.render(original)
+            if width == CARD_WIDTH
+        }
+        print(f"\nbytes of a grid of {GRID} cards ({WIDTH}px originals)")
+        print(f"{'original':>10} {GRID * len(original) / 1024:>10.0f} KiB")
+        for format, size in cards.items():
+            print(
+                f"{format:>10} {GRID * size / 1024:>10.0f} KiB"
+                f" ({len(original) / size:.0f}x smaller)"
+            )
+            self.assertLess(size * 10, len(original))
+
+    def test_generation_time(self) -> None:
+        print(f"\ngenerating the derivatives of {IMAGES} images ({WIDTH}px)")
+        for workers in (1, 2, 4):
+            start = perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(self.render, self.originals))
+            elapsed = perf_counter() - start
+            print(
+                f"{workers:>3} workers {elapsed:>7.2f} s"
+                f" {elapsed / IMAGES * 1000:>8.0f} ms/image"
+            )
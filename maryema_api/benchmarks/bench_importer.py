@@ -0,0 +1,86 @@
+"""
+Benchmarks the catalog import of a generated CSV file
+
+It reports the time and the peak of the memory allocated by the import,
+which is bounded by the size of the chunks, not by the size of the file.
+
+The number of variants is set with the BENCH_VARIANTS environment variable.
+"""
+
+import csv
+import os
+import tempfile
+import tracemalloc
+from time import perf_counter
+
+from django.core.files.storage import default_storage
+from django.test import TransactionTestCase
+
+from core.utils import create_image
+from product.importer import CatalogImporter
+from product.models import ProductVariant
+
+VARIANTS = int(os.environ.get("BENCH_VARIANTS", 20000))
+SIZES = ["XS", "S", "M", "L", "XL", "XXL"]
+COLORS = [("Red", "#ff0000"), ("Blue", "#0000ff"), ("Green", "#00ff00")]
+
+
+class CatalogImportBenchmark(TransactionTestCase):
+    def setUp(self) -> None:
+        self.image = default_storage.save("product_images/bench.jpg", create_image())
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "catalog.csv")
+        per_product = len(SIZES) * len(COLORS)
+        with open(self.path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(
+                [
+                    "product",
+                    "category",
+                    "division",
+                    "color1_name",
+                    "color1_value",
+                    "size",
+                    "image",
+                    "cost",
+                    "price",
+                    "quantity",
+                ]
+            )
+            for i in range(VARIANTS):
+                product, variant = divmod(i, per_product)
+                color, size = divmod(variant, len(SIZES))
+                writer.writerow(
+                    [
+                        f"Product {product}",
+                        f"Category {product % 20}",
+                        f"Division {product % 3}",
+                        *COLORS[color],
+                        SIZES[size],
+                        self.image,
+                        100,
+                        150,
+                        10,
+                    ]
+                )
+
+    def tearDown(self) -> None:
+        default_storage.delete(self.image)
+        self.directory.cleanup()
+
+    def test_import(self) -> None:
+        tracemalloc.start()
+        start = perf_counter()
+        with open(self.path, newline="") as file:
+            report = CatalogImporter().import_file(file, "csv")
+        elapsed = perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.assertEqual(report.error_count, 0)
+        self.assertEqual(ProductVariant.objects.count(), VARIANTS)
+        print(
+            f"\n{VARIANTS} variants of {report.products} products imported"
+            f" in {elapsed:.1f} s ({VARIANTS / elapsed:.0f} rows/s),"
+            f" peak memory {peak / 2**20:.1f} MiB"
+        )
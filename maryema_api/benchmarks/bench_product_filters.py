@@ -0,0 +1,138 @@
+"""
+Benchmarks the variant filters of the products list (price, size and color)
+
+It compares the filters combined into one `EXISTS` subquery on the variants
+with the previous implementation joining the variants once per filter.
+
+The size of the catalog is set with the BENCH_PRODUCTS environment variable.
+"""
+
+import os
+import random
+from statistics import median
+from time import perf_counter
+
+from django.db import connection
+from django.db.models import Q, QuerySet
+from django.test import TestCase
+
+from product.filters import ProductFilter
+from product.models import Product, ProductVariant, Size
+from product.services import rebuild_product_listings
+from product.tests.factories import (
+    CategoryFactory,
+    ColorFactory,
+    ImgFactory,
+)
+
+PRODUCTS = int(os.environ.get("BENCH_PRODUCTS", 5000))
+VARIANTS_PER_PRODUCT = 4
+ROUNDS = 5
+
+FILTERS = [
+    {"min_price": 100},
+    {"min_price": 100, "max_price": 600, "size": "M"},
+    {
+        "min_price": 100,
+        "max_price": 600,
+        "size": "M",
+        "color_name": "re",
+        "color_value": "#ff0000",
+    },
+]
+
+
+def joined(queryset: QuerySet, params: dict) -> QuerySet:
+    """The previous implementation, one join of the variants per filter"""
+    lookups = {
+        "min_price": lambda value: Q(variant__price__gte=value),
+        "max_price": lambda value: Q(variant__price__lte=value),
+        "size": lambda value: Q(variant__size__name__exact=value),
+        "color_name": lambda value: Q(variant__color__color1_name__icontains=value)
+        | Q(variant__color__color2_name__icontains=value),
+        "color_value": lambda value: Q(variant__color__color1_value__exact=value)
+        | Q(variant__color__color2_value__exact=value),
+    }
+    for name, value in params.items():
+        queryset = queryset.filter(lookups[name](value))
+    return queryset.distinct()
+
+
+def combined(queryset: QuerySet, params: dict) -> QuerySet:
+    return ProductFilter(params, queryset=queryset).qs
+
+
+def timed(queryset: QuerySet) -> tuple[float, int]:
+    """The median time (ms) to fetch the first page and the count"""
+    times = []
+    for _ in range(ROUNDS):
+        start = perf_counter()
+        count = queryset.count()
+        list(queryset.order_by("-created_at")[:10])
+        times.append((perf_counter() - start) * 1000)
+    return median(times), count
+
+
+class ProductFiltersBenchmark(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        random.seed(0)
+        categories = CategoryFactory.create_batch(10)
+        sizes = [Size.objects.create(name=name) for name in ("S", "M", "L", "XL")]
+        colors = [
+            ColorFactory(color1_name="Red", color1_value="#ff0000"),
+            ColorFactory(color1_name="Blue", color1_value="#0000ff"),
+            ColorFactory(color1_name="Green", color1_value="#00ff00"),
+            ColorFactory(
+                dual=True,
+                color1_name="Black",
+                color2_name="Red",
+                color2_value="#ff0000",
+            ),
+        ]
+        image = ImgFactory()
+        products = Product.objects.bulk_create(
+            [
+                Product(name=f"Product {i}", category=random.choice(categories))
+                for i in range(PRODUCTS)
+            ],
+            batch_size=1000,
+        )
+        variants = []
+        for product in products:
+            for sort_order in range(VARIANTS_PER_PRODUCT):
+                cost = random.randint(10, 800)
+                variants.append(
+                    ProductVariant(
+                        product=product,
+                        color=colors[sort_order],
+                        size=random.choice(sizes),
+                        image=image,
+                        cost=cost,
+                        price=cost + random.randint(50, 300),
+                        quantity=random.randint(0, 20),
+                        sort_order=sort_order + 1,
+                    )
+                )
+        ProductVariant.objects.bulk_create(variants, batch_size=2000)
+        rebuild_product_listings()
+        # gather the statistics the query planner relies on
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def test_filters(self) -> None:
+        queryset = Product.objects.filter(listing__variant_count__gt=0)
+        print(
+            f"\n{PRODUCTS} products, {PRODUCTS * VARIANTS_PER_PRODUCT} variants"
+            f" (median of {ROUNDS} rounds)"
+        )
+        print(f"{'filters':>8} {'joins (ms)':>12} {'exists (ms)':>12} {'matches':>8}")
+        for params in FILTERS:
+            joins_time, joins_count = timed(joined(queryset, params))
+            exists_time, exists_count = timed(combined(queryset, params))
+            # the joins may match different variants for each filter
+            self.assertLessEqual(exists_count, joins_count)
+            print(
+                f"{len(params):>8} {joins_time:>12.1f} {exists_time:>12.1f}"
+                f" {exists_count:>8}"
+            )
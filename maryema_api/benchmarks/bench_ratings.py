@@ -0,0 +1,72 @@
+"""
+Benchmarks sorting the products by rating
+
+It compares ordering a page of products by an average of their feedbacks
+aggregated at request time with ordering by the rating kept on their listings.
+
+The numbers of products and of feedbacks per product are set with the
+BENCH_PRODUCTS and BENCH_FEEDBACKS environment variables.
+"""
+
+import os
+from profile.tests.factories import ProfileFactory
+from random import Random
+from statistics import median
+from time import perf_counter
+
+from django.db.models import Avg, Count, Q
+from django.test import TestCase
+
+from feedback.models import Feedback
+from feedback.services import rebuild_product_ratings
+from product.models import Product
+from product.tests.factories import ProductFactory
+
+PRODUCTS = int(os.environ.get("BENCH_PRODUCTS", 2000))
+FEEDBACKS = int(os.environ.get("BENCH_FEEDBACKS", 20))
+ROUNDS = 5
+PAGE = 20
+
+
+def timed(queryset) -> float:
+    """The median time (ms) to fetch the first page of the queryset"""
+    times = []
+    for _ in range(ROUNDS):
+        start = perf_counter()
+        list(queryset[:PAGE])
+        times.append((perf_counter() - start) * 1000)
+    return median(times)
+
+
+class ProductRatingBenchmark(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        random = Random(0)
+        products = ProductFactory.create_batch(PRODUCTS)
+        customers = ProfileFactory.create_batch(FEEDBACKS)
+        Feedback.objects.bulk_create(
+            [
+                Feedback(customer=customer, product=product, rate=random.randint(0, 5))
+                for product in products
+                for customer in customers
+            ],
+            batch_size=5000,
+        )
+        rebuild_product_ratings()
+
+    def test_sort_by_rating(self) -> None:
+        rated = Q(feedback__rate__gt=0)
+        aggregated = (
+            Product.objects.annotate(
+                average=Avg("feedback__rate", filter=rated),
+                count=Count("feedback", filter=rated),
+            )
+            .select_related("listing")
+            .order_by("-average", "-count", "-created_at")
+        )
+        listed = Product.objects.select_related("listing").order_by(
+            "-listing__rating_average", "-listing__rating_count", "-created_at"
+        )
+        print(f"\na page of {PRODUCTS} products with {FEEDBACKS} feedbacks each")
+        print(f"{'aggregated':>12} {timed(aggregated):>8.1f} ms")
+        print(f"{'listing':>12} {timed(listed):>8.1f} ms")
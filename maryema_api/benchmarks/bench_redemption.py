@@ -0,0 +1,104 @@
+"""
+Hammers the redemption of one discount code from many threads
+
+Every customer redeems the same code at the same time,
+only as many redemptions as its usage limit should succeed.
+
+The number of threads is set with the BENCH_THREADS environment variable
+(1000 to reproduce a campaign launch). Run it against PostgreSQL to measure
+the contention of the row lock, SQLite serializes the writers so the failed
+attempts are retried.
+"""
+
+import os
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from profile.tests.factories import ProfileFactory
+from time import perf_counter
+
+from django.db import OperationalError, connection
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+from discount.models import DiscountCode, DiscountRedemption, DiscountRule
+from discount.redemption import RedemptionError, redeem_code
+
+THREADS = int(os.environ.get("BENCH_THREADS", 50))
+LIMIT = THREADS // 5
+RETRIES = 50
+
+
+class RedemptionConcurrencyBenchmark(TransactionTestCase):
+    def setUp(self) -> None:
+        now = timezone.now()
+        rule = DiscountRule.objects.create(
+            title="Launch",
+            value=10,
+            starts_at=now - timedelta(days=1),
+            ends_at=now + timedelta(days=1),
+            usage_limit=LIMIT,
+        )
+        self.code = DiscountCode.objects.create(
+            discount_rule=rule,
+            code="LAUNCH",
+            starts_at=rule.starts_at,
+            ends_at=rule.ends_at,
+        )
+        self.customers = [
+            ProfileFactory(user__username=f"customer{index}")
+            for index in range(THREADS)
+        ]
+
+    def count(self, results: Counter, key) -> None:
+        with self.lock:
+            results[key] += 1
+
+    def redeem(self, customer, barrier: threading.Barrier, results: Counter):
+        barrier.wait()
+        try:
+            for _ in range(RETRIES):
+                try:
+                    redeem_code("LAUNCH", customer.pk)
+                except RedemptionError:
+                    self.count(results, "refused")
+                except OperationalError:
+                    # the database was busy (SQLite), try again
+                    self.count(results, "retries")
+                    time.sleep(0.01)
+                    continue
+                else:
+                    self.count(results, "redeemed")
+                return
+            self.count(results, "gave up")
+        finally:
+            connection.close()
+
+    def test_hot_code(self) -> None:
+        results = Counter()
+        self.lock = threading.Lock()
+        barrier = threading.Barrier(THREADS)
+        threads = [
+            threading.Thread(target=self.redeem, args=(customer, barrier, results))
+            for customer in self.customers
+        ]
+        start = perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = perf_counter() - start
+
+        self.code.refresh_from_db()
+        print(
+            f"\n{THREADS} concurrent redemptions of a code usable {LIMIT} times"
+            f" in {elapsed * 1000:.0f} ms ({THREADS / elapsed:.0f} redemptions/s)"
+        )
+        print(f"results: {dict(results)}")
+        # the code is never used past its limit
+        self.assertLessEqual(self.code.usage_count, LIMIT)
+        self.assertEqual(DiscountRedemption.objects.count(), self.code.usage_count)
+        self.assertEqual(results["redeemed"], self.code.usage_count)
+        if not results["gave up"]:
+            self.assertEqual(self.code.usage_count, LIMIT)
@@ -0,0 +1,96 @@
+"""
+Benchmarks the validation of the saves of CartItem, Order and ProductVariant
+
+It counts the queries run by the validation of one save in each validation mode,
+with the related objects loaded on the instance like a serializer write does,
+and compares `bulk_full_clean` with a `full_clean` per instance.
+
+The size of the batch is set with the BENCH_INSTANCES environment variable.
+"""
+
+import os
+from profile.tests.factories import ProfileFactory
+from statistics import median
+from time import perf_counter
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from cart.models import CartItem
+from core.validation import FULL, SKIP, TRUSTED, bulk_full_clean, validate
+from order.models import Order
+from product.models import ProductVariant, Size
+from product.tests.factories import ProductFactory, VariantFactory
+
+INSTANCES = int(os.environ.get("BENCH_INSTANCES", 200))
+ROUNDS = 5
+
+
+def measured(function) -> tuple[int, float]:
+    """The queries run by the function and its median time (ms)"""
+    times = []
+    for _ in range(ROUNDS):
+        with CaptureQueriesContext(connection) as context:
+            start = perf_counter()
+            function()
+            times.append((perf_counter() - start) * 1000)
+    return len(context.captured_queries), median(times)
+
+
+class ValidationBenchmark(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Size.objects.create(name="M")
+        cls.customer = ProfileFactory()
+        cls.cart = cls.customer.carts.get(is_active=True)
+        cls.variants = VariantFactory.create_batch(INSTANCES)
+
+    def instances(self) -> dict:
+        product = ProductFactory()
+        variant = self.variants[0]
+        return {
+            "CartItem": CartItem(cart=self.cart, product_variant=variant, quantity=1),
+            "Order": Order(profile=self.customer),
+            "ProductVariant": ProductVariant(
+                product=product,
+                color=variant.color,
+                size=variant.size,
+                image=variant.image,
+                cost=10,
+                price=20,
+                quantity=1,
+                sort_order=1,
+            ),
+        }
+
+    def test_validation_modes(self) -> None:
+        print(f"\nqueries (ms) of the validation of one save (median of {ROUNDS})")
+        print(f"{'model':>15} {FULL:>12} {TRUSTED:>12} {SKIP:>12}")
+        for name, instance in self.instances().items():
+            results = [
+                measured(lambda: validate(instance, mode))
+                for mode in (FULL, TRUSTED, SKIP)
+            ]
+            self.assertLess(results[1][0], results[0][0])
+            print(
+                f"{name:>15} " + " ".join(f"{f'{n} ({t:.2f})':>12}" for n, t in results)
+            )
+
+    def test_bulk_full_clean(self) -> None:
+        items = [
+            CartItem(cart_id=self.cart.pk, product_variant_id=variant.pk, quantity=1)
+            for variant in self.variants
+        ]
+
+        def one_by_one():
+            for item in items:
+                item.full_clean(validate_unique=False, validate_constraints=False)
+
+        single = measured(one_by_one)
+        bulk = measured(lambda: bulk_full_clean(items))
+        self.assertLess(bulk[0], single[0])
+        print(f"\n{INSTANCES} cart items (median of {ROUNDS})")
+        print(f"{'':>16} {'queries':>8} {'ms':>8}")
+        print(f"{'full_clean each':>16} {single[0]:>8} {single[1]:>8.1f}")
+        print(f"{'bulk_full_clean':>16} {bulk[0]:>8} {bulk[1]:>8.1f}")
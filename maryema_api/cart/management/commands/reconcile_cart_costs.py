@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from cart.models import Cart
+from cart.services import reconcile_cart_costs
+
+
+class Command(BaseCommand):
+    help = "Recomputes the costs of the carts that drifted from their items"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Check the checked out carts too, not only the active ones",
+        )
+
+    def handle(self, *args, **options):
+        carts = Cart.objects.all() if options["all"] else None
+        count = reconcile_cart_costs(carts)
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {count} cart costs"))
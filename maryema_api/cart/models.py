@@ -8,14 +8,21 @@ from django.core.exceptions import ValidationError
 from django.db import models
 
 from core.models import BaseModel
+from core.validation import batched
 
 # from discount.models import DiscountCode
 from product.models import ProductVariant
 
 
-def is_customer(value: uuid.UUID) -> None:
+@batched(
+    lambda ids: Profile.objects.filter(
+        id__in=ids, role=Profile.RoleChoices.CUSTOMER
+    ).values_list("id", flat=True)
+)
+def is_customer(value: uuid.UUID | Profile) -> None:
     """Ensures that the cart is associated with a customer"""
-    if not Profile.objects.get(id=value).is_customer:
+    profile = value if isinstance(value, Profile) else Profile.objects.get(id=value)
+    if not profile.is_customer:
         raise ValidationError("The cart must be associated with a customer")
 
 
@@ -65,9 +72,15 @@ class Cart(BaseModel):
         ]
 
 
-def is_active_cart(value: uuid.UUID) -> None:
+@batched(
+    lambda ids: Cart.objects.filter(id__in=ids, is_active=True).values_list(
+        "id", flat=True
+    )
+)
+def is_active_cart(value: "uuid.UUID | Cart") -> None:
     """Ensures that the cart is active"""
-    if not Cart.objects.get(id=value).is_active:
+    cart = value if isinstance(value, Cart) else Cart.objects.get(id=value)
+    if not cart.is_active:
         raise ValidationError("The cart must be active")
 
 
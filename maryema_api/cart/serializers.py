@@ -1,9 +1,17 @@
 from rest_framework import serializers
 
 from cart.models import Cart, CartItem
+from cart.services import apply_cart_quantities
+from core.validation import TrustedSaveMixin
+from product.models import ProductVariant
 
+# the maximum of the PositiveSmallIntegerField of the quantity
+MAX_QUANTITY = 32767
+MAX_OPERATIONS = 100
+MAX_CODES = 10
 
-class CartItemSerializer(serializers.ModelSerializer):
+
+class CartItemSerializer(TrustedSaveMixin, serializers.ModelSerializer):
 
     class Meta:
         model = CartItem
@@ -19,3 +27,95 @@ class CartSerializer(serializers.ModelSerializer):
         model = Cart
         fields = "__all__"
         read_only_fields = ["id", "created_at", "updated_at"]
+
+
+class CartOperationSerializer(serializers.Serializer):
+    """An operation on the item of a variant in a bulk change of the cart"""
+
+    ADD = "add"
+    UPDATE = "update"
+    REMOVE = "remove"
+
+    op = serializers.ChoiceField(choices=[ADD, UPDATE, REMOVE])
+    product_variant = serializers.UUIDField()
+    quantity = serializers.IntegerField(
+        min_value=1, max_value=MAX_QUANTITY, required=False
+    )
+
+    def validate(self, attrs):
+        if attrs["op"] != self.REMOVE and "quantity" not in attrs:
+            raise serializers.ValidationError({"quantity": "This field is required."})
+        return attrs
+
+
+class BulkCartSerializer(serializers.Serializer):
+    """
+    Applies a list of operations to the items of the cart given in the context
+
+    The operations are applied in order, then the resulting items are saved
+    with one query per kind of change and the cost of the cart is computed once.
+    Either all the operations are valid and applied or none is.
+    """
+
+    operations = CartOperationSerializer(
+        many=True, allow_empty=False, max_length=MAX_OPERATIONS
+    )
+
+    def validate(self, attrs):
+        cart = self.context["cart"]
+        operations = attrs["operations"]
+        items = {item.product_variant_id: item for item in cart.items.all()}
+        added = {
+            operation["product_variant"]
+            for operation in operations
+            if operation["op"] == CartOperationSerializer.ADD
+        }
+        existing = set(
+            ProductVariant.objects.filter(pk__in=added).values_list("pk", flat=True)
+        )
+
+        quantities = {variant_id: item.quantity for variant_id, item in items.items()}
+        errors = []
+        for operation in operations:
+            variant_id = operation["product_variant"]
+            current = quantities.get(variant_id, 0)
+            error = {}
+            if operation["op"] == CartOperationSerializer.ADD:
+                if variant_id not in existing:
+                    error["product_variant"] = "Product variant does not exist."
+                elif current + operation["quantity"] > MAX_QUANTITY:
+                    error["quantity"] = (
+                        f"The quantity of an item can't exceed {MAX_QUANTITY}."
+                    )
+                else:
+                    quantities[variant_id] = current + operation["quantity"]
+            elif not current:
+                error["product_variant"] = "This variant is not in the cart."
+            elif operation["op"] == CartOperationSerializer.UPDATE:
+                quantities[variant_id] = operation["quantity"]
+            else:
+                quantities[variant_id] = 0
+            errors.append(error)
+
+        if any(errors):
+            raise serializers.ValidationError({"operations": errors})
+        attrs["items"] = items
+        attrs["quantities"] = quantities
+        return attrs
+
+    def create(self, validated_data):
+        cart = self.context["cart"]
+        apply_cart_quantities(
+            cart, validated_data["items"], validated_data["quantities"]
+        )
+        return cart
+
+
+class CheckoutSerializer(serializers.Serializer):
+    """The discount codes given at the checkout"""
+
+    codes = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        max_length=MAX_CODES,
+        default=list,
+    )
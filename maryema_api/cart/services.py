@@ -0,0 +1,170 @@
+"""
+This module contains the maintenance of the carts costs
+
+The cost of a cart is adjusted by the cost of each change of its items
+in a single UPDATE, instead of summing all its items again,
+so adding an item runs the same queries whatever the size of the cart.
+
+The prices are read at the time of the change, so a change of the price of a variant
+recomputes the costs of the active carts holding it (see `recompute_cart_costs`),
+and `reconcile_cart_costs` fixes the carts changed without signals (such as by `update`).
+The checkout recomputes the cost of the cart it orders from its items.
+
+The bulk changes of the items (see `apply_cart_quantities`) defer the costs
+of the carts they change to a single recomputation at their end.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models import (
+    DecimalField,
+    ExpressionWrapper,
+    F,
+    OuterRef,
+    QuerySet,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from cart.models import Cart, CartItem
+from product.models import ProductVariant
+
+MONEY = DecimalField(max_digits=10, decimal_places=2)
+
+# the ids of the carts whose costs are recomputed at the end of a bulk change
+_deferred_carts: ContextVar[set | None] = ContextVar("deferred_carts", default=None)
+
+
+def price_of(variant_id) -> Subquery:
+    return Subquery(ProductVariant.objects.filter(pk=variant_id).values("price")[:1])
+
+
+def add_to_cart_cost(cart_id, *changes: tuple) -> None:
+    """
+    Applies the cost of quantity changes to the cost of a cart in a single UPDATE
+
+    Args:
+        changes: (variant id, quantity delta) pairs, the delta is negative for removals
+    """
+    delta = Value(0, output_field=MONEY)
+    for variant_id, quantity in changes:
+        if quantity:
+            delta = delta + price_of(variant_id) * Value(quantity)
+    Cart.objects.filter(pk=cart_id).update(
+        cost=ExpressionWrapper(F("cost") + delta, output_field=MONEY),
+        updated_at=timezone.now(),
+    )
+
+
+def items_cost() -> Coalesce:
+    """The cost of the items of the outer cart"""
+    costs = (
+        CartItem.objects.filter(cart=OuterRef("pk"))
+        .order_by()
+        .values("cart")
+        .annotate(cost=Sum(F("product_variant__price") * F("quantity")))
+        .values("cost")
+    )
+    return Coalesce(Subquery(costs, output_field=MONEY), Value(0, output_field=MONEY))
+
+
+def recompute_cart_costs(carts: QuerySet) -> int:
+    """
+    Recomputes the cost of the carts from their items,
+    with one UPDATE summing the items of each cart
+
+    Returns:
+        the number of the carts updated
+    """
+    return Cart.objects.filter(pk__in=carts.values("pk")).update(
+        cost=items_cost(), updated_at=timezone.now()
+    )
+
+
+def reconcile_cart_costs(carts: QuerySet | None = None) -> int:
+    """
+    Recomputes the cost of the carts whose cost drifted from their items
+    (such as after a change of the variant prices)
+
+    Args:
+        carts: the carts to check, all the active carts by default
+    Returns:
+        the number of carts that were fixed
+    """
+    if carts is None:
+        carts = Cart.objects.filter(is_active=True)
+    drifted = carts.alias(actual_cost=items_cost()).exclude(cost=F("actual_cost"))
+    return recompute_cart_costs(drifted)
+
+
+def defer_cart_cost(*cart_ids) -> bool:
+    """
+    Defers the cost of the given carts to the end of the current bulk change
+
+    Returns:
+        False if there is no bulk change going on, so the cost must be applied now
+    """
+    deferred = _deferred_carts.get()
+    if deferred is None:
+        return False
+    deferred.update(cart_id for cart_id in cart_ids if cart_id is not None)
+    return True
+
+
+@contextmanager
+def deferred_cart_costs(*cart_ids):
+    """
+    Recomputes the costs of the carts changed in the block once at its end,
+    instead of applying the cost of each change of their items
+
+    Args:
+        cart_ids: carts to recompute even if no signal is sent for their changes
+            (such as by `bulk_create` and `bulk_update`)
+    """
+    deferred = set(cart_ids)
+    token = _deferred_carts.set(deferred)
+    try:
+        yield deferred
+    finally:
+        _deferred_carts.reset(token)
+    recompute_cart_costs(Cart.objects.filter(pk__in=deferred))
+
+
+def apply_cart_quantities(cart: Cart, items: dict, quantities: dict) -> None:
+    """
+    Brings the items of a cart to the given quantities in a few bulk queries
+
+    Args:
+        items: the current items of the cart by variant id
+        quantities: the new quantities by variant id, 0 removes the item
+    """
+    now = timezone.now()
+    created, updated, removed = [], [], []
+    for variant_id, quantity in quantities.items():
+        item = items.get(variant_id)
+        if item is None:
+            if quantity:
+                created.append(
+                    CartItem(
+                        cart=cart, product_variant_id=variant_id, quantity=quantity
+                    )
+                )
+        elif not quantity:
+            removed.append(item.pk)
+        elif quantity != item.quantity:
+            item.quantity = quantity
+            item.updated_at = now
+            updated.append(item)
+
+    with deferred_cart_costs(cart.pk):
+        if removed:
+            CartItem.objects.filter(pk__in=removed).delete()
+        if updated:
+            CartItem.objects.bulk_update(updated, ["quantity", "updated_at"])
+        if created:
+            CartItem.objects.bulk_create(created)
+    cart.refresh_from_db(fields=["cost", "updated_at"])
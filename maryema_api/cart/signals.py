@@ -1,26 +1,96 @@
 from profile.models import Profile
 
-from django.db.models import F, Sum, signals
+from django.db.models import signals
 from django.dispatch import receiver
 
 from cart.models import Cart, CartItem
+from cart.services import add_to_cart_cost, defer_cart_cost, recompute_cart_costs
+from core.validation import TRUSTED, validation_mode
+from product.models import ProductVariant
 
 
 @receiver(signals.post_save, sender=Profile)
 def create_cart(sender, instance, created, **kwargs):
     """Creates a cart for a new customer"""
     if created and instance.is_customer:
-        Cart.objects.create(customer=instance)
+        with validation_mode(TRUSTED):
+            Cart.objects.create(customer=instance)
 
 
-@receiver([signals.post_save, signals.post_delete], sender=CartItem)
-def update_cart_cost(sender, instance, created=False, **kwargs):
-    """Updates the cost of the cart when a cart item is created or updated or removed"""
-    cart = instance.cart
-    cart.cost = (
-        cart.items.annotate(
-            subtotal=F("product_variant__price") * F("quantity")
-        ).aggregate(Sum("subtotal"))["subtotal__sum"]
-        or 0
+@receiver(signals.post_init, sender=CartItem)
+def remember_cart_item(sender, instance, **kwargs):
+    """Remembers the loaded cart, variant and quantity of an item to apply the changes"""
+    # read through __dict__ to not trigger a query for deferred fields
+    instance._loaded = (
+        instance.__dict__.get("cart_id"),
+        instance.__dict__.get("product_variant_id"),
+        instance.__dict__.get("quantity") or 0,
     )
-    cart.save()
+
+
+def refresh_cached_cart_cost(instance: CartItem) -> None:
+    """Keeps the cost of the cart the item holds (if any) up to date"""
+    cart = CartItem.cart.field.get_cached_value(instance, None)
+    if cart is not None:
+        try:
+            cart.refresh_from_db(fields=["cost"])
+        except Cart.DoesNotExist:
+            # deleted along with its items
+            pass
+
+
+@receiver(signals.post_save, sender=CartItem)
+def update_cart_cost(sender, instance, created=False, **kwargs):
+    """Applies the change of the item to the cost of its cart"""
+    loaded = (instance.cart_id, instance.product_variant_id, instance.quantity)
+    if not created and instance._loaded == loaded:
+        return
+    cart_id, variant_id, quantity = instance._loaded if not created else (None,) * 3
+    if defer_cart_cost(cart_id, instance.cart_id):
+        instance._loaded = loaded
+        return
+    if cart_id is None or cart_id == instance.cart_id:
+        add_to_cart_cost(
+            instance.cart_id,
+            (variant_id, -(quantity or 0)),
+            (instance.product_variant_id, instance.quantity),
+        )
+    else:
+        # moved to another cart
+        add_to_cart_cost(cart_id, (variant_id, -quantity))
+        add_to_cart_cost(
+            instance.cart_id, (instance.product_variant_id, instance.quantity)
+        )
+    instance._loaded = loaded
+    refresh_cached_cart_cost(instance)
+
+
+@receiver(signals.post_delete, sender=CartItem)
+def remove_from_cart_cost(sender, instance, **kwargs):
+    """Removes the cost of a deleted item from its cart"""
+    cart_id, variant_id, quantity = instance._loaded
+    if defer_cart_cost(cart_id):
+        return
+    add_to_cart_cost(cart_id, (variant_id, -quantity))
+    refresh_cached_cart_cost(instance)
+
+
+@receiver(signals.post_init, sender=ProductVariant)
+def remember_variant_price(sender, instance, **kwargs):
+    """Remembers the loaded price of a variant to detect changing it"""
+    # read through __dict__ to not trigger a query for deferred fields
+    instance._loaded_price = instance.__dict__.get("price")
+
+
+@receiver(signals.post_save, sender=ProductVariant)
+def update_carts_of_variant(sender, instance, created, **kwargs):
+    """
+    Recomputes the costs of the active carts holding a repriced variant,
+    since the changes of their items apply the current price
+    """
+    price = instance.__dict__.get("price")
+    if not created and price != instance._loaded_price:
+        recompute_cart_costs(
+            Cart.objects.filter(is_active=True, item__product_variant=instance)
+        )
+    instance._loaded_price = price
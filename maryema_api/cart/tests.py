@@ -1,14 +1,31 @@
 import uuid
 from datetime import datetime
 from profile.models import Profile
+from profile.tests.factories import ProfileFactory
 
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APITestCase
 
 from cart.models import Cart, CartItem
+from cart.services import reconcile_cart_costs
 from core.utils import create_image
-from product.models import Category, Color, Division, Img, Product, ProductVariant, Size
+from order.models import Order
+from product.models import (
+    Category,
+    Color,
+    Division,
+    Img,
+    Product,
+    ProductListing,
+    ProductVariant,
+    Size,
+)
+from product.tests.factories import ProductFactory, VariantFactory
 
 
 class CartTestCase(TestCase):
@@ -429,3 +446,254 @@ class CartSignalsTestCase(TestCase):
         cart.items.all().delete()
         cart.refresh_from_db()
         self.assertEqual(cart.cost, 0)
+
+    def test_update_cart_cost_when_cart_item_variant_is_changed(self) -> None:
+        cart = Cart.objects.get(customer=self.customer)
+        item = cart.items.create(product_variant=self.variant1, quantity=2)
+        item.product_variant = self.variant3
+        item.quantity = 1
+        item.save()
+        cart.refresh_from_db()
+        self.assertEqual(cart.cost, 20)
+
+    def test_update_cart_cost_when_cart_item_is_moved(self) -> None:
+        cart = Cart.objects.get(customer=self.customer)
+        item = cart.items.create(product_variant=self.variant1, quantity=2)
+        other = ProfileFactory().carts.get(is_active=True)
+        item = CartItem.objects.get(pk=item.pk)
+        item.cart = other
+        item.save()
+        cart.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(cart.cost, 0)
+        self.assertEqual(other.cost, 20)
+
+    def test_unchanged_cart_item_save_runs_no_cost_update(self) -> None:
+        cart = Cart.objects.get(customer=self.customer)
+        item = cart.items.create(product_variant=self.variant1, quantity=2)
+        with CaptureQueriesContext(connection) as context:
+            item.save()
+        self.assertFalse(
+            any('UPDATE "cart"' in query["sql"] for query in context.captured_queries)
+        )
+        cart.refresh_from_db()
+        self.assertEqual(cart.cost, 20)
+
+    def test_adding_an_item_runs_the_same_queries_whatever_the_cart_size(self) -> None:
+        cart = Cart.objects.get(customer=self.customer)
+        cart.items.create(product_variant=self.variant1, quantity=1)
+        with CaptureQueriesContext(connection) as small:
+            cart.items.create(product_variant=self.variant2, quantity=1)
+        for variant in VariantFactory.create_batch(20):
+            cart.items.create(product_variant=variant, quantity=1)
+        with CaptureQueriesContext(connection) as large:
+            cart.items.create(product_variant=self.variant3, quantity=1)
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+
+    def test_reconcile_cart_costs_after_a_price_change(self) -> None:
+        cart = Cart.objects.get(customer=self.customer)
+        cart.items.create(product_variant=self.variant1, quantity=2)
+        ProductVariant.objects.filter(pk=self.variant1.pk).update(price=12)
+        self.assertEqual(reconcile_cart_costs(), 1)
+        cart.refresh_from_db()
+        self.assertEqual(cart.cost, 24)
+        # nothing drifted anymore
+        self.assertEqual(reconcile_cart_costs(), 0)
+
+    def test_repricing_a_variant_updates_the_active_carts(self) -> None:
+        cart = Cart.objects.get(customer=self.customer)
+        cart.items.create(product_variant=self.variant1, quantity=2)
+        cart.items.create(product_variant=self.variant2, quantity=1)
+        cart.is_active = False
+        cart.save()
+        active = Cart.objects.create(customer=self.customer, is_active=True)
+        item = active.items.create(product_variant=self.variant1, quantity=3)
+        variant = ProductVariant.objects.get(pk=self.variant1.pk)
+        variant.price = 100
+        variant.save()
+        active.refresh_from_db()
+        self.assertEqual(active.cost, 300)
+        # the checked out carts keep their cost
+        cart.refresh_from_db()
+        self.assertEqual(cart.cost, 34)
+        # removing the item at the new price doesn't drift the cost
+        item.delete()
+        active.refresh_from_db()
+        self.assertEqual(active.cost, 0)
+
+
+class BulkCartViewTestCase(APITestCase):
+    """A test suit for the bulk operations on the cart"""
+
+    url = "/api/cart/bulk/"
+
+    @classmethod
+    def setUpTestData(cls):
+        Size.objects.create(name="M")
+        cls.variants = VariantFactory.create_batch(3, price=10, cost=5)
+
+    def setUp(self) -> None:
+        self.customer = ProfileFactory()
+        self.client.force_authenticate(user=self.customer.user)
+        self.cart = self.customer.carts.get(is_active=True)
+
+    def operation(self, op: str, variant: ProductVariant, quantity=None) -> dict:
+        operation = {"op": op, "product_variant": str(variant.id)}
+        if quantity is not None:
+            operation["quantity"] = quantity
+        return operation
+
+    def test_operations_are_applied_in_order(self) -> None:
+        first, second, third = self.variants
+        self.cart.items.create(product_variant=first, quantity=1)
+        self.cart.items.create(product_variant=second, quantity=1)
+        response = self.client.post(
+            self.url,
+            {
+                "operations": [
+                    self.operation("add", first, 2),
+                    self.operation("remove", second),
+                    self.operation("add", third, 1),
+                    self.operation("update", third, 4),
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        quantities = dict(self.cart.items.values_list("product_variant_id", "quantity"))
+        self.assertEqual(quantities, {first.id: 3, third.id: 4})
+        self.assertEqual(response.data["cost"], "70.00")
+        self.assertEqual(len(response.data["items"]), 2)
+
+    def test_invalid_operation_applies_nothing(self) -> None:
+        first, second, _ = self.variants
+        response = self.client.post(
+            self.url,
+            {
+                "operations": [
+                    self.operation("add", first, 1),
+                    self.operation("update", second, 2),
+                    {"op": "add", "product_variant": str(uuid.uuid4()), "quantity": 1},
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = response.data["operations"]
+        self.assertEqual(errors[0], {})
+        self.assertIn("product_variant", errors[1])
+        self.assertIn("product_variant", errors[2])
+        self.assertFalse(self.cart.items.exists())
+
+    def test_quantity_is_required_to_add(self) -> None:
+        response = self.client.post(
+            self.url,
+            {"operations": [self.operation("add", self.variants[0])]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("quantity", response.data["operations"][0])
+
+    def test_empty_operations(self) -> None:
+        response = self.client.post(self.url, {"operations": []}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_queries_do_not_grow_with_the_operations(self) -> None:
+        variants = list(self.variants) + VariantFactory.create_batch(27)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(
+                self.url,
+                {"operations": [self.operation("add", v, 1) for v in variants]},
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.cart.items.count(), 30)
+        self.assertLess(len(context.captured_queries), 20)
+        self.cart.refresh_from_db()
+        self.assertEqual(
+            self.cart.cost,
+            sum(variant.price for variant in variants),
+        )
+
+
+class CheckoutViewTestCase(APITestCase):
+    """A test suit for the checkout of the cart and its stock reservation"""
+
+    @classmethod
+    def setUpTestData(cls):
+        size = Size.objects.create(name="M")
+        cls.product = ProductFactory()
+        cls.hot = VariantFactory(
+            product=cls.product, size=size, quantity=3, price=100, cost=50
+        )
+        cls.other = VariantFactory(quantity=5, size=size, price=100, cost=50)
+
+    def setUp(self) -> None:
+        self.customer = ProfileFactory()
+        self.client.force_authenticate(user=self.customer.user)
+
+    def add(self, customer: Profile, variant: ProductVariant, quantity: int) -> None:
+        cart = customer.carts.get(is_active=True)
+        CartItem.objects.create(cart=cart, product_variant=variant, quantity=quantity)
+
+    def test_checkout_reserves_the_stock(self) -> None:
+        self.add(self.customer, self.hot, 2)
+        self.add(self.customer, self.other, 1)
+        response = self.client.post("/api/cart/checkout/")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        self.hot.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual(self.hot.quantity, 1)
+        self.assertEqual(self.other.quantity, 4)
+        self.assertEqual(ProductListing.objects.get(product=self.product).in_stock, 1)
+
+        order = Order.objects.get(profile=self.customer)
+        self.assertEqual(order.items.count(), 2)
+        self.assertEqual(order.total, 300)
+        # the customer got a new empty cart
+        self.assertEqual(self.customer.carts.get(is_active=True).items.count(), 0)
+
+    def test_checkout_totals_the_current_prices(self) -> None:
+        self.add(self.customer, self.hot, 2)
+        # repriced without signals, so the cost of the cart is stale
+        ProductVariant.objects.filter(pk=self.hot.pk).update(price=120)
+        response = self.client.post("/api/cart/checkout/")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        order = Order.objects.get(profile=self.customer)
+        self.assertEqual(order.total, 240)
+        self.assertEqual(self.customer.carts.get(is_active=False).cost, 240)
+
+    def test_checkout_without_enough_stock_reserves_nothing(self) -> None:
+        self.add(self.customer, self.hot, 4)
+        self.add(self.customer, self.other, 1)
+        response = self.client.post("/api/cart/checkout/")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data["variants"], [self.hot.id])
+
+        self.hot.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual((self.hot.quantity, self.other.quantity), (3, 5))
+        self.assertFalse(Order.objects.filter(profile=self.customer).exists())
+        # the cart is kept to be fixed
+        self.assertEqual(self.customer.carts.get(is_active=True).items.count(), 2)
+
+    def test_last_units_are_sold_once(self) -> None:
+        late = ProfileFactory()
+        self.add(self.customer, self.hot, 3)
+        self.add(late, self.hot, 1)
+        self.assertEqual(
+            self.client.post("/api/cart/checkout/").status_code,
+            status.HTTP_201_CREATED,
+        )
+        self.client.force_authenticate(user=late.user)
+        self.assertEqual(
+            self.client.post("/api/cart/checkout/").status_code,
+            status.HTTP_409_CONFLICT,
+        )
+        self.hot.refresh_from_db()
+        self.assertEqual(self.hot.quantity, 0)
+
+    def test_empty_cart(self) -> None:
+        response = self.client.post("/api/cart/checkout/")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -2,6 +2,8 @@ from django.urls import path
 
 from cart.views import (
     AddToCartView,
+    BulkCartView,
+    CartDiscountsView,
     CheckoutView,
     ClearCartView,
     GetCartView,
@@ -11,7 +13,9 @@ from cart.views import (
 urlpatterns = [
     path("", GetCartView.as_view(), name="cart"),
     path("add/", AddToCartView.as_view(), name="add-to-cart"),
+    path("bulk/", BulkCartView.as_view(), name="bulk-cart"),
     path("clear/", ClearCartView.as_view(), name="clear-cart"),
+    path("discounts/", CartDiscountsView.as_view(), name="cart-discounts"),
     path(
         "item/<uuid:pk>/",
         UpdateDeleteCartItemView.as_view(),
@@ -1,3 +1,4 @@
+from django.db import transaction
 from rest_framework import status
 from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
@@ -5,10 +6,20 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from cart.models import Cart, CartItem
-from cart.serializers import CartItemSerializer, CartSerializer
+from cart.serializers import (
+    BulkCartSerializer,
+    CartItemSerializer,
+    CartSerializer,
+    CheckoutSerializer,
+)
+from cart.services import items_cost
 from core.permissions import IsCustomer
+from core.validation import TRUSTED, validation_mode
+from discount.engine import evaluate_cart
+from discount.redemption import RedemptionError, redeem_codes
 from order.models import Order, OrderItem
 from order.serializers import OrderSerializer
+from product.inventory import InsufficientStock, quantities_of, reserve_stock
 
 
 class GetCartView(APIView):
@@ -38,7 +49,9 @@ class ClearCartView(APIView):
         If there is no active cart, a new one is created which will be already empty
         """
 
-        cart = Cart.objects.get_or_create(customer=request.user.profile, is_active=True)
+        cart, created = Cart.objects.get_or_create(
+            customer=request.user.profile, is_active=True
+        )
         if cart.items.count() > 0:
             cart.items.all().delete()
         serializer = CartSerializer(cart)
@@ -54,7 +67,9 @@ class AddToCartView(APIView):
 
         If there is no active cart, a new one is created and add the item to it.
         """
-        cart = Cart.objects.get_or_create(customer=request.user.profile, is_active=True)
+        cart, created = Cart.objects.get_or_create(
+            customer=request.user.profile, is_active=True
+        )
         serializer = CartItemSerializer(data=request.data)
         if serializer.is_valid():
             serializer.save(cart=cart)
@@ -63,6 +78,38 @@ class AddToCartView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class BulkCartView(APIView):
+    permission_classes = [IsAuthenticated, IsCustomer]
+
+    def post(self, request):
+        """
+        Applies a list of operations to the items of the current user's active cart
+
+        Each operation is one of:
+
+        - `{"op": "add", "product_variant": <id>, "quantity": <n>}`:
+          adds n units of the variant (to its item if it is already in the cart)
+        - `{"op": "update", "product_variant": <id>, "quantity": <n>}`:
+          sets the quantity of the item of the variant
+        - `{"op": "remove", "product_variant": <id>}`: removes the item of the variant
+
+        The operations are validated together and applied in one transaction,
+        so either all of them are applied or none. The final cart is returned.
+        """
+
+        Cart.objects.get_or_create(customer=request.user.profile, is_active=True)
+        with transaction.atomic():
+            # locked, so concurrent changes of the cart are applied one after the other
+            cart = Cart.objects.select_for_update().get(
+                customer=request.user.profile, is_active=True
+            )
+            serializer = BulkCartSerializer(data=request.data, context={"cart": cart})
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            serializer.save()
+        return Response(CartSerializer(cart).data)
+
+
 class UpdateDeleteCartItemView(APIView):
     permission_classes = [IsAuthenticated, IsCustomer]
 
@@ -114,40 +161,114 @@ class UpdateDeleteCartItemView(APIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class CartDiscountsView(APIView):
+    permission_classes = [IsAuthenticated, IsCustomer]
+
+    def get(self, request):
+        """
+        Evaluates the discounts of the current user's active cart
+
+        The discount codes are given as `codes`, a comma separated list.
+        Returns the subtotal, the discount and the total of the cart,
+        the discounts applied with the amount off each variant
+        and the codes that don't apply to the cart.
+        """
+        cart, created = Cart.objects.get_or_create(
+            customer=request.user.profile, is_active=True
+        )
+        codes = request.query_params.get("codes", "").split(",")
+        return Response(evaluate_cart(cart, codes).to_dict())
+
+
 class CheckoutView(APIView):
     permission_classes = [IsAuthenticated, IsCustomer]
 
     def post(self, request):
         """
         Checks out the current user's active cart
+
+        The stock of the items is reserved in the same transaction as the order,
+        if any item is out of stock nothing is ordered and 409 is returned
+        with the ids of the variants that are short.
+
+        The discount codes given as `codes` are redeemed in the same transaction,
+        a code that doesn't apply to the cart is refused with 400
+        and a code that can't be redeemed anymore with 409.
         """
+        checkout = CheckoutSerializer(data=request.data)
+        checkout.is_valid(raise_exception=True)
 
         # Get the current user's active cart or create a new one if there is none
         # return 400 if the cart is empty (or created just now)
         cart, created = Cart.objects.get_or_create(
             customer=request.user.profile, is_active=True
         )
-        if created or cart.items.count() == 0:
+        if created or not cart.items.exists():
             return Response(
                 {"error": "Cart is empty"}, status=status.HTTP_400_BAD_REQUEST
             )
 
         # Create the order from the cart and return the order details
         try:
-            order = Order.objects.create(customer=request.user.profile)
-            items = cart.items.values("product_variant", "quantity")
-            OrderItem.objects.bulk_create(
-                [OrderItem(order=order, **item) for item in items]
-            )
-            order.total = cart.cost
-            order.save()
-            serializer = OrderSerializer(order)
-
-            # deactivate the current cart and create a new one
-            cart.is_active = False
-            cart.save()
-            Cart.objects.create(customer=request.user.profile, is_active=True)
+            # the profile is the authenticated customer, it isn't queried again
+            with transaction.atomic(), validation_mode(TRUSTED):
+                # deactivate the cart first, so a concurrent checkout of it is refused,
+                # recomputing its cost from its items at their current prices
+                if not Cart.objects.filter(pk=cart.pk, is_active=True).update(
+                    is_active=False, cost=items_cost()
+                ):
+                    return Response(
+                        {"error": "Cart is already checked out"},
+                        status=status.HTTP_409_CONFLICT,
+                    )
+                # read once the cart is locked, so the items ordered are the ones costed
+                items = list(cart.items.values_list("product_variant_id", "quantity"))
+                if not items:
+                    transaction.set_rollback(True)
+                    return Response(
+                        {"error": "Cart is empty"}, status=status.HTTP_400_BAD_REQUEST
+                    )
+                evaluation = evaluate_cart(cart, checkout.validated_data["codes"])
+                if evaluation.rejected_codes:
+                    transaction.set_rollback(True)
+                    return Response(
+                        {
+                            "error": "Some discount codes don't apply to the cart",
+                            "codes": evaluation.rejected_codes,
+                        },
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+                reserve_stock(quantities_of(items))
+                order = Order.objects.create(profile=request.user.profile)
+                OrderItem.objects.bulk_create(
+                    [
+                        OrderItem(order=order, product_variant_id=variant, quantity=n)
+                        for variant, n in items
+                    ]
+                )
+                redemptions = redeem_codes(
+                    [applied.code for applied in evaluation.applied if applied.code],
+                    request.user.profile.pk,
+                )
+                # the lines evaluated are the items ordered, at their current prices
+                order.total = evaluation.total
+                order.save()
+                if redemptions:
+                    order.discount_codes.add(
+                        *(redemption.discount_code_id for redemption in redemptions)
+                    )
+                Cart.objects.create(customer=request.user.profile, is_active=True)
+            serializer = OrderSerializer(order, context={"request": request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
+        except InsufficientStock as e:
+            return Response(
+                {"error": str(e), "variants": e.variant_ids},
+                status=status.HTTP_409_CONFLICT,
+            )
+        except RedemptionError as e:
+            return Response(
+                {"error": str(e), "codes": [e.code]}, status=status.HTTP_409_CONFLICT
+            )
         except ValueError as e:
             # handle ValueError specifically
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
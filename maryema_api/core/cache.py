@@ -0,0 +1,168 @@
+"""
+This module contains the response cache of the read-only endpoints
+
+A response is cached under a key made of:
+
+- the namespace of the endpoint (the basename of its viewset)
+- its scope: `list` for the collection endpoints or the pk of the object
+- the current version of that scope
+- the role of the user
+- the absolute URL of the request with its query params sorted
+
+The model signals invalidate the responses by replacing the versions
+of exactly the affected scopes (see `invalidate_responses`),
+so the stale entries are never read again and expire on their own.
+
+The responses are stored in the `responses` cache (see the CACHES setting).
+"""
+
+import hashlib
+import time
+from functools import partial
+from typing import Iterable
+from urllib.parse import urlencode
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+CACHE_ALIAS = "responses"
+LIST = "list"
+
+# a cold key is computed by a single worker, the others wait for its result
+LOCK_TIMEOUT = 30
+LOCK_WAIT = 5
+LOCK_POLL_INTERVAL = 0.05
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def version_key(namespace: str, scope: str) -> str:
+    return f"response-version:{namespace}:{scope}"
+
+
+def get_version(namespace: str, scope: str) -> str:
+    """Returns the current version of a scope, creating it if there is none"""
+    cache = get_cache()
+    key = version_key(namespace, scope)
+    version = cache.get(key)
+    if version is None:
+        # a random version, so an evicted version never brings back stale entries
+        cache.add(key, uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_responses(namespace: str, pks: Iterable = (), list_: bool = True):
+    """
+    Invalidates the cached responses of the given objects of a namespace
+
+    The list responses of the namespace are invalidated too unless `list_` is False.
+    """
+    scopes = [str(pk) for pk in pks]
+    if list_:
+        scopes.append(LIST)
+
+    def bump():
+        get_cache().set_many(
+            {version_key(namespace, scope): uuid4().hex for scope in scopes},
+            timeout=None,
+        )
+
+    bump()
+    # and again once committed, in case the old data was cached in the meantime
+    transaction.on_commit(bump)
+
+
+def get_role(request) -> str:
+    user = request.user
+    if not user.is_authenticated:
+        return "anonymous"
+    return user.profile.role
+
+
+class CachedResponseMixin:
+    """
+    A viewset mixin caching the successful responses of its read-only actions
+
+    - `cached_actions`: the actions whose GET responses are cached,
+      extra actions with `detail=False` share the scope of the list
+    - `cache_timeout`: defaults to the `RESPONSE_CACHE_TIMEOUT` setting
+    - `get_cache_namespace` and `should_cache_response` can be overridden
+      to give an action its own namespace or to skip some of its requests
+
+    The signals of the models the responses are built from
+    should call `invalidate_responses` with the basename of the viewset.
+    """
+
+    cached_actions: tuple = ("list", "retrieve")
+    cache_timeout: int | None = None
+
+    def get_cache_scope(self) -> str:
+        lookup = self.lookup_url_kwarg or self.lookup_field
+        return str(self.kwargs[lookup]) if lookup in self.kwargs else LIST
+
+    def get_cache_namespace(self) -> str:
+        return self.basename
+
+    def should_cache_response(self, request) -> bool:
+        return True
+
+    def get_cache_key(self, request) -> str:
+        namespace = self.get_cache_namespace()
+        scope = self.get_cache_scope()
+        version = get_version(namespace, scope)
+        params = urlencode(sorted(request.query_params.lists()), doseq=True)
+        url = f"{request.build_absolute_uri(request.path)}?{params}"
+        digest = hashlib.sha1(url.encode()).hexdigest()
+        return f"response:{namespace}:{scope}:{version}:{get_role(request)}:{digest}"
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # after the authentication, so the role of the user is known
+        if (
+            request.method == "GET"
+            and self.action in self.cached_actions
+            and self.should_cache_response(request)
+        ):
+            self.get = partial(self.cached_response, self.get)
+
+    def cached_response(self, handler, request, *args, **kwargs) -> Response:
+        cache = get_cache()
+        key = self.get_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            return self.build_cached_response(cached)
+
+        lock = f"{key}:lock"
+        locked = cache.add(lock, 1, timeout=LOCK_TIMEOUT)
+        deadline = time.monotonic() + LOCK_WAIT
+        while not locked and time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            cached = cache.get(key)
+            if cached is not None:
+                return self.build_cached_response(cached)
+            locked = cache.add(lock, 1, timeout=LOCK_TIMEOUT)
+
+        try:
+            # another worker may have computed it before the lock was acquired
+            cached = cache.get(key) if locked else None
+            if cached is not None:
+                return self.build_cached_response(cached)
+            response = handler(request, *args, **kwargs)
+            if response.status_code == 200:
+                timeout = self.cache_timeout or settings.RESPONSE_CACHE_TIMEOUT
+                cache.set(key, (response.data, response.status_code), timeout)
+            response["X-Cache"] = "MISS"
+            return response
+        finally:
+            if locked:
+                cache.delete(lock)
+
+    def build_cached_response(self, cached: tuple) -> Response:
+        data, status = cached
+        return Response(data, status=status, headers={"X-Cache": "HIT"})
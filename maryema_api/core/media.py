@@ -0,0 +1,43 @@
+"""
+This module contains the content addressing of the media files and their serving
+
+The content-addressed files are named by the hash of their content
+(see `product.images`), so a URL of one of them never changes what it serves
+and they are served with far-future immutable cache headers.
+The other media files get the default headers.
+"""
+
+import re
+from hashlib import sha256
+from typing import Iterable
+
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
+
+# the hex digits of the sha256 of the content kept in the names
+DIGEST_LENGTH = 32
+# a digest, optionally with the width of a derivative, and an extension
+HASHED_NAME = re.compile(rf"(^|/)[0-9a-f]{{{DIGEST_LENGTH}}}(-\d+w)?(\.\w+)?$")
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+
+
+def content_digest(chunks: Iterable[bytes]) -> str:
+    """The digest naming a content-addressed file"""
+    digest = sha256()
+    for chunk in chunks:
+        digest.update(chunk)
+    return digest.hexdigest()[:DIGEST_LENGTH]
+
+
+def is_content_addressed(name: str) -> bool:
+    return HASHED_NAME.search(name) is not None
+
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """Serves a media file, caching the content-addressed ones forever"""
+    response = serve(request, path, document_root, show_indexes)
+    if response.status_code in (200, 304) and is_content_addressed(path):
+        patch_cache_control(
+            response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True
+        )
+    return response
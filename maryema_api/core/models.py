@@ -2,6 +2,8 @@ from uuid import uuid4
 
 from django.db import models
 
+from core.validation import validate
+
 
 class BaseModel(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
@@ -11,7 +13,11 @@ class BaseModel(models.Model):
     class Meta:
         abstract = True
 
-    def save(self, *args, **kwargs) -> None:
-        """ensure a full clean before saving"""
-        self.full_clean()
+    def save(self, *args, validation: str | None = None, **kwargs) -> None:
+        """
+        ensure a full clean before saving
+
+        `validation` overrides the current validation mode (see `core.validation`)
+        """
+        validate(self, validation)
         super().save(*args, **kwargs)
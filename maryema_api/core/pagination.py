@@ -0,0 +1,254 @@
+"""
+This module contains the pagination classes of the API
+"""
+
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination on a unique ordering such as `(-created_at, -id)`
+
+    Each page is fetched with a `WHERE (created_at, id) < (...)` condition
+    instead of an `OFFSET`, so deep pages are as fast as the first one,
+    and the pages stay stable when new rows are inserted.
+    The total count is not computed unless it is requested with `count=true`.
+    """
+
+    ordering = ("-created_at", "-id")
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    count_query_param = "count"
+    invalid_cursor_message = "Invalid cursor"
+
+    def __init__(self, ordering: tuple | None = None) -> None:
+        if ordering is not None:
+            self.ordering = tuple(ordering)
+
+    # cursors
+
+    def encode_cursor(self, values: list, reverse: bool) -> str:
+        payload = json.dumps({"v": values, "r": int(reverse)}, default=str)
+        return urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, request) -> tuple[list, bool] | None:
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(urlsafe_b64decode(encoded.encode()))
+            values, reverse = payload["v"], bool(payload["r"])
+            if len(values) != len(self.ordering):
+                raise ValueError
+            values = [
+                self.get_field(field).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (KeyError, TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def get_field(self, ordering_field: str):
+        return self.model._meta.get_field(ordering_field.lstrip("-"))
+
+    def get_position(self, obj) -> list:
+        return [getattr(obj, self.get_field(field).attname) for field in self.ordering]
+
+    # filtering
+
+    def get_ordering(self, reverse: bool) -> tuple:
+        if not reverse:
+            return self.ordering
+        return tuple(
+            field[1:] if field.startswith("-") else f"-{field}"
+            for field in self.ordering
+        )
+
+    def keyset_filter(self, values: list, reverse: bool) -> Q:
+        """
+        Builds the condition selecting the rows after the position `values`
+
+        (a, b) after (x, y) is: a > x OR (a = x AND b > y), for ascending fields
+        """
+        condition = Q()
+        equals = {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip("-")
+            descending = field.startswith("-") != reverse
+            lookup = "lt" if descending else "gt"
+            condition |= Q(**equals, **{f"{name}__{lookup}": value})
+            equals[name] = value
+        return condition
+
+    def get_page_size(self, request) -> int:
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+            if size > 0:
+                return min(size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    def paginate_queryset(self, queryset: QuerySet, request, view=None):
+        self.request = request
+        self.model = queryset.model
+        self.page_size = self.get_page_size(request)
+        self.count = None
+        if request.query_params.get(self.count_query_param) in ("true", "1"):
+            self.count = queryset.count()
+
+        cursor = self.decode_cursor(request)
+        reverse = cursor[1] if cursor else False
+        queryset = queryset.order_by(*self.get_ordering(reverse))
+        if cursor:
+            queryset = queryset.filter(self.keyset_filter(*cursor))
+
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+        if reverse:
+            results.reverse()
+
+        self.next_position = self.previous_position = None
+        if results:
+            # going backward, there is a next page (the one we came from)
+            if has_more or reverse:
+                self.next_position = self.get_position(results[-1])
+            if (has_more and reverse) or (cursor and not reverse):
+                self.previous_position = self.get_position(results[0])
+        return results
+
+    # links
+
+    def get_link(self, position: list | None, reverse: bool) -> str | None:
+        if position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(position, reverse)
+        )
+
+    def get_next_link(self) -> str | None:
+        return self.get_link(self.next_position, False)
+
+    def get_previous_link(self) -> str | None:
+        return self.get_link(self.previous_position, True)
+
+    def get_paginated_response(self, data) -> Response:
+        response = {"next": self.get_next_link(), "previous": self.get_previous_link()}
+        if self.count is not None:
+            response["count"] = self.count
+        response["results"] = data
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema: dict) -> dict:
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "count": {"type": "integer", "example": 123},
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class PageNumberOrKeysetPagination(PageNumberPagination):
+    """
+    The default page number pagination, with keyset pagination as a per request opt-in
+
+    The keyset pagination is used when the request has `pagination=cursor`
+    (or a `cursor` from a previous page), otherwise the page number one is used.
+    """
+
+    mode_query_param = "pagination"
+    keyset_ordering = KeysetPagination.ordering
+
+    def uses_keyset(self, request) -> bool:
+        return (
+            request.query_params.get(self.mode_query_param) == "cursor"
+            or KeysetPagination.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset: QuerySet, request, view=None):
+        self.keyset = None
+        if self.uses_keyset(request):
+            self.keyset = KeysetPagination(ordering=self.keyset_ordering)
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data) -> Response:
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view) -> list:
+        return super().get_schema_operation_parameters(view) + [
+            {
+                "name": self.mode_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Use `cursor` for keyset pagination.",
+                "schema": {"type": "string", "enum": ["page", "cursor"]},
+            },
+            {
+                "name": KeysetPagination.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The cursor of the page (keyset pagination).",
+                "schema": {"type": "string"},
+            },
+        ]
+
+
+class CachedCountPaginator(Paginator):
+    """A paginator taking its count from the cache, counting only when it's missing"""
+
+    def __init__(
+        self, object_list, per_page, cache_key: str, timeout=DEFAULT_TIMEOUT, **kwargs
+    ):
+        super().__init__(object_list, per_page, **kwargs)
+        self.cache_key = cache_key
+        self.timeout = timeout
+
+    @cached_property
+    def count(self) -> int:
+        count = cache.get(self.cache_key)
+        if count is None:
+            count = super().count
+            cache.set(self.cache_key, count, self.timeout)
+        return count
+
+
+class CachedCountPagination(PageNumberPagination):
+    """
+    The page number pagination with the total count kept in the cache under a key
+
+    The pages are sliced from the queryset, only the `COUNT` is cached,
+    so the owner of the key must forget it when the counted rows change.
+    """
+
+    def __init__(self, cache_key: str, timeout=DEFAULT_TIMEOUT) -> None:
+        self.cache_key = cache_key
+        self.timeout = timeout
+
+    def django_paginator_class(self, object_list, per_page, **kwargs):
+        return CachedCountPaginator(
+            object_list, per_page, self.cache_key, self.timeout, **kwargs
+        )
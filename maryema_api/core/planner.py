@@ -0,0 +1,68 @@
+"""
+This module contains a small query planner for the viewsets
+
+A viewset declares a `QueryPlan` for each serializer it may use,
+and the planner applies the plan of the chosen serializer to the viewset queryset,
+so that the nested and computed fields of that serializer are loaded
+in a constant number of queries instead of lazily per object.
+"""
+
+from dataclasses import dataclass, field
+
+from django.db.models import QuerySet
+
+
+@dataclass(frozen=True)
+class QueryPlan:
+    """The relations to join, to prefetch and the values to annotate for a serializer
+
+    Attributes:::
+
+        select_related: forward relations joined in the same query
+        prefetch_related: lookups or `Prefetch` objects loaded in one query each
+        annotations: expressions (such as `Subquery` or `Sum`) annotated on each row
+    """
+
+    select_related: tuple = ()
+    prefetch_related: tuple = ()
+    annotations: dict = field(default_factory=dict)
+
+    def apply(self, queryset: QuerySet) -> QuerySet:
+        """Returns the queryset with this plan applied to it"""
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        if self.annotations:
+            queryset = queryset.annotate(**self.annotations)
+        return queryset
+
+
+class QueryPlannerMixin:
+    """
+    A viewset mixin that applies the query plan of the chosen serializer to the queryset
+
+    - `query_plans`: a dict mapping serializer classes to their `QueryPlan`
+    - `planned_actions`: the actions the plans are applied to,
+      other actions (such as extra actions that only need the object) use the bare queryset
+
+    Viewsets overriding `get_queryset` should return `self.plan_queryset(queryset)`.
+    """
+
+    query_plans: dict = {}
+    planned_actions: tuple = ("list", "retrieve")
+
+    def get_query_plan(self) -> QueryPlan | None:
+        if self.action not in self.planned_actions:
+            return None
+        return self.query_plans.get(self.get_serializer_class())
+
+    def plan_queryset(self, queryset: QuerySet) -> QuerySet:
+        """Applies the query plan of the current action to the queryset (if any)"""
+        plan = self.get_query_plan()
+        if plan is None:
+            return queryset
+        return plan.apply(queryset)
+
+    def get_queryset(self) -> QuerySet:
+        return self.plan_queryset(super().get_queryset())
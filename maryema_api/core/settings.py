@@ -102,11 +102,32 @@ DATABASES = {
 
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.redis.RedisCache",
-        "LOCATION": "redis://localhost:6379/1",
-    }
+        "BACKEND": env(
+            "CACHE_BACKEND", default="django.core.cache.backends.redis.RedisCache"
+        ),
+        "LOCATION": env("CACHE_LOCATION", default="redis://localhost:6379/1"),
+    },
+    # the cached responses of the read-only endpoints (see core/cache.py)
+    "responses": {
+        "BACKEND": env(
+            "RESPONSE_CACHE_BACKEND",
+            default="django.core.cache.backends.redis.RedisCache",
+        ),
+        "LOCATION": env("RESPONSE_CACHE_LOCATION", default="redis://localhost:6379/2"),
+    },
 }
 
+# The tests run with in-memory caches cleared before each test
+# and a temporary media root (see core/testing.py)
+TEST_RUNNER = "core.testing.IsolatedCacheTestRunner"
+
+# How long (in seconds) the responses of the read-only catalog endpoints are cached
+RESPONSE_CACHE_TIMEOUT = env.int("RESPONSE_CACHE_TIMEOUT", default=60 * 60)
+
+# The threads generating the resized derivatives of the uploaded images (see product/images.py),
+# 0 generates them in the request that uploaded the image
+IMAGE_WORKERS = env.int("IMAGE_WORKERS", default=2)
+
 SESSION_ENGINE = "django.contrib.sessions.backends.cache"
 
 SESSION_CACHE_ALIAS = "default"  # Which cache to use for sessions
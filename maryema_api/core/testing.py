@@ -0,0 +1,106 @@
+"""
+This module contains helpers shared by the test suits of the apps
+"""
+
+import shutil
+import tempfile
+from contextlib import contextmanager
+from unittest import TextTestResult
+
+from django.core.cache import caches
+from django.db import connection
+from django.test import override_settings
+from django.test.runner import (
+    DiscoverRunner,
+    ParallelTestSuite,
+    RemoteTestResult,
+    RemoteTestRunner,
+)
+from django.test.utils import CaptureQueriesContext
+
+from core.cache import CACHE_ALIAS
+
+
+class QueryBudgetMixin:
+    """
+    A TestCase mixin to assert the maximum number of queries a block of code runs
+
+    Unlike `assertNumQueries`, a budget is an upper bound,
+    so it can be used to assert that an endpoint runs a constant number of queries
+    whatever the number of objects it returns.
+    """
+
+    @contextmanager
+    def assertQueryBudget(self, budget: int):
+        with CaptureQueriesContext(connection) as context:
+            yield context
+        executed = len(context.captured_queries)
+        if executed > budget:
+            queries = "\n".join(
+                f"{i}. {query['sql']}"
+                for i, query in enumerate(context.captured_queries, start=1)
+            )
+            self.fail(f"{executed} queries executed, the budget is {budget}\n{queries}")
+
+
+# the caches of the test runs, in the memory of each run instead of the configured servers
+TEST_CACHES = {
+    alias: {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": f"test-{alias}",
+    }
+    for alias in ("default", CACHE_ALIAS)
+}
+
+
+class ClearCachesMixin:
+    """A test result clearing the caches before each test, so no test reads another's"""
+
+    def startTest(self, test):
+        for cache in caches.all():
+            cache.clear()
+        super().startTest(test)
+
+
+class IsolatedCacheRemoteTestResult(ClearCachesMixin, RemoteTestResult):
+    pass
+
+
+class IsolatedCacheRemoteTestRunner(RemoteTestRunner):
+    resultclass = IsolatedCacheRemoteTestResult
+
+
+class IsolatedCacheParallelTestSuite(ParallelTestSuite):
+    runner_class = IsolatedCacheRemoteTestRunner
+
+
+class IsolatedCacheTestRunner(DiscoverRunner):
+    """
+    The test runner of the project (see the TEST_RUNNER setting)
+
+    The tests use in-memory caches cleared before each test (in the `--parallel`
+    workers too), so the cached responses and values neither survive across the tests
+    nor across the runs (as they would in Redis).
+    The files they store go to a temporary media root removed after the run.
+    """
+
+    parallel_test_suite = IsolatedCacheParallelTestSuite
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.caches_override = override_settings(CACHES=TEST_CACHES)
+        self.caches_override.enable()
+        self.media_root = tempfile.mkdtemp(prefix="test-media-")
+        self.media_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.media_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.media_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+        self.caches_override.disable()
+        super().teardown_test_environment(**kwargs)
+
+    def get_resultclass(self):
+        # the --debug-sql and --pdb results clear the caches too
+        base = super().get_resultclass() or TextTestResult
+        return type(base.__name__, (ClearCachesMixin, base), {})
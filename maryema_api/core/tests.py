@@ -0,0 +1,153 @@
+import os
+import shutil
+import tempfile
+import uuid
+from profile.models import Profile
+from profile.tests.factories import ProfileFactory
+
+from django.core.exceptions import ValidationError
+from django.test import RequestFactory, SimpleTestCase, TestCase
+
+from cart.models import Cart, CartItem
+from core.media import is_content_addressed, serve_media
+from core.validation import (
+    SKIP,
+    TRUSTED,
+    BulkValidationError,
+    bulk_full_clean,
+    validation_mode,
+)
+from product.models import Size
+from product.tests.factories import VariantFactory
+
+
+class ValidationModesTestCase(TestCase):
+    """A test suit for the validation modes of the saves"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Size.objects.create(name="M")
+        cls.customer = ProfileFactory()
+        cls.cart = cls.customer.carts.get(is_active=True)
+        cls.variants = VariantFactory.create_batch(3)
+
+    def test_trusted_save_does_not_query_the_loaded_relations(self) -> None:
+        full = CartItem(cart=self.cart, product_variant=self.variants[0])
+        # the unique checks of the id and of the variant in the cart,
+        # the cart (with is_active_cart) and the variant, the insert and the cost
+        with self.assertNumQueries(8):
+            full.save()
+
+        item = CartItem(cart=self.cart, product_variant=self.variants[1])
+        # the unique check of the variant in the cart, the insert and the cost
+        with self.assertNumQueries(4):
+            item.save(validation=TRUSTED)
+
+    def test_trusted_save_validates_the_loaded_relations(self) -> None:
+        self.cart.is_active = False
+        with self.assertRaises(ValidationError) as context:
+            with validation_mode(TRUSTED):
+                CartItem.objects.create(
+                    cart=self.cart, product_variant=self.variants[0]
+                )
+        self.assertIn("cart", context.exception.message_dict)
+
+    def test_trusted_save_queries_the_relations_given_by_id(self) -> None:
+        with self.assertRaises(ValidationError) as context:
+            CartItem(cart_id=uuid.uuid4(), product_variant=self.variants[0]).save(
+                validation=TRUSTED
+            )
+        self.assertIn("cart", context.exception.message_dict)
+
+    def test_skip_does_not_validate(self) -> None:
+        provider = ProfileFactory(role=Profile.RoleChoices.PROVIDER)
+        with self.assertRaises(ValidationError):
+            Cart.objects.create(customer=provider)
+        with validation_mode(SKIP):
+            Cart.objects.create(customer=provider)
+        self.assertTrue(provider.carts.exists())
+
+    def test_skip_runs_no_validation_queries(self) -> None:
+        profile = Profile.objects.get(pk=ProfileFactory().pk)
+        # only the update, the user and the unique fields aren't checked
+        with self.assertNumQueries(1):
+            profile.save(validation=SKIP)
+
+    def test_unknown_mode(self) -> None:
+        with self.assertRaises(ValueError):
+            with validation_mode("partial"):
+                pass
+
+
+class BulkFullCleanTestCase(TestCase):
+    """A test suit for the validation of many instances at once"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Size.objects.create(name="M")
+        cls.cart = ProfileFactory().carts.get(is_active=True)
+        cls.variants = VariantFactory.create_batch(5)
+
+    def test_one_query_per_relation(self) -> None:
+        items = [
+            CartItem(cart_id=self.cart.pk, product_variant_id=variant.pk)
+            for variant in self.variants
+        ]
+        # the existence of the carts and of the variants, the active carts
+        with self.assertNumQueries(3):
+            bulk_full_clean(items)
+
+    def test_errors_by_index(self) -> None:
+        inactive = ProfileFactory().carts.get(is_active=True)
+        Cart.objects.filter(pk=inactive.pk).update(is_active=False)
+        items = [
+            CartItem(cart_id=self.cart.pk, product_variant_id=self.variants[0].pk),
+            CartItem(cart_id=self.cart.pk, product_variant_id=uuid.uuid4()),
+            CartItem(cart_id=inactive.pk, product_variant_id=self.variants[1].pk),
+            CartItem(cart_id=self.cart.pk, product_variant_id=self.variants[2].pk),
+        ]
+        items[3].quantity = -1
+        with self.assertRaises(BulkValidationError) as context:
+            bulk_full_clean(items)
+        errors = context.exception.by_index
+        self.assertEqual(set(errors), {1, 2, 3})
+        self.assertEqual(set(errors[1]), {"product_variant"})
+        self.assertEqual(set(errors[2]), {"cart"})
+        self.assertEqual(set(errors[3]), {"quantity"})
+        self.assertIn("2.cart", context.exception.message_dict)
+
+
+class ServeMediaTestCase(SimpleTestCase):
+    """A test suit for the cache headers of the served media files"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.root = tempfile.mkdtemp()
+        cls.hashed = "0123456789abcdef0123456789abcdef"
+        for name in (f"{cls.hashed}.jpg", f"{cls.hashed}-320w.webp", "photo.jpg"):
+            with open(os.path.join(cls.root, name), "wb") as file:
+                file.write(b"image")
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.root)
+        super().tearDownClass()
+
+    def serve(self, path):
+        return serve_media(RequestFactory().get(f"/media/{path}"), path, self.root)
+
+    def test_content_addressed_files_are_immutable(self) -> None:
+        for path in (f"{self.hashed}.jpg", f"{self.hashed}-320w.webp"):
+            response = self.serve(path)
+            self.assertEqual(
+                response["Cache-Control"], "public, max-age=31536000, immutable"
+            )
+
+    def test_other_files_keep_the_default_headers(self) -> None:
+        self.assertFalse(self.serve("photo.jpg").has_header("Cache-Control"))
+
+    def test_is_content_addressed(self) -> None:
+        self.assertTrue(is_content_addressed(f"product_images/{self.hashed}.png"))
+        self.assertFalse(is_content_addressed("product_images/photo.png"))
+        self.assertFalse(is_content_addressed(f"product_images/x{self.hashed}.png"))
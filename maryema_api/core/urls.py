@@ -53,5 +53,9 @@ if settings.DEBUG:
     from django.conf import settings
     from django.conf.urls.static import static
 
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    from core.media import serve_media
+
+    urlpatterns += static(
+        settings.MEDIA_URL, view=serve_media, document_root=settings.MEDIA_ROOT
+    )
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
@@ -0,0 +1,244 @@
+"""
+This module contains the validation modes of the saves of the models
+
+`BaseModel.save` validates the instance according to the current mode:
+
+- `FULL` (the default): `full_clean`, every foreign key is checked with its own
+  queries (its existence and the queries of its validators)
+- `TRUSTED`: the foreign keys whose related objects are loaded on the instance
+  aren't queried again, their validators are given the loaded objects instead of
+  their ids, and a generated primary key isn't checked for uniqueness.
+  The other fields, `clean` and the unique checks are validated as usual.
+  It is meant for the writes of data validated already, like the serializer writes.
+- `SKIP`: no validation at all, for the internal writes of known valid data
+
+The mode is set for a block with `validation_mode` or for one save
+with its `validation` argument.
+
+`bulk_full_clean` validates many instances with one query per foreign key.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterable
+
+from django.core.exceptions import ValidationError
+from django.db import models
+
+FULL = "full"
+TRUSTED = "trusted"
+SKIP = "skip"
+MODES = (FULL, TRUSTED, SKIP)
+
+_mode: ContextVar[str] = ContextVar("validation_mode", default=FULL)
+
+
+def get_validation_mode() -> str:
+    return _mode.get()
+
+
+@contextmanager
+def validation_mode(mode: str):
+    """Validates the saves of the block according to the given mode"""
+    if mode not in MODES:
+        raise ValueError(f"Unknown validation mode: {mode}")
+    token = _mode.set(mode)
+    try:
+        yield
+    finally:
+        _mode.reset(token)
+
+
+def batched(valid_values: Callable[[set], Iterable]):
+    """
+    Gives a foreign key validator a batched form for `bulk_full_clean`
+
+    `valid_values` is given a set of ids and returns the valid ones in a single query.
+    The validator itself must accept both an id and a loaded related object.
+    """
+
+    def decorate(validator):
+        validator.valid_values = valid_values
+        return validator
+
+    return decorate
+
+
+def loaded_relations(instance: models.Model) -> list:
+    """The foreign keys of the instance whose saved related objects are loaded on it"""
+    relations = []
+    for field in instance._meta.concrete_fields:
+        if not field.many_to_one or not field.is_cached(instance):
+            continue
+        related = field.get_cached_value(instance)
+        if (
+            related is not None
+            and not related._state.adding
+            and getattr(related, field.target_field.attname)
+            == getattr(instance, field.attname)
+        ):
+            relations.append(field)
+    return relations
+
+
+def generated_pk(instance: models.Model) -> set:
+    """The primary key of a new instance if it is generated, as it needs no unique check"""
+    pk = instance._meta.pk
+    if instance._state.adding and pk.has_default():
+        return {pk.name}
+    return set()
+
+
+def trusted_clean(instance: models.Model) -> None:
+    """`full_clean` without querying the foreign keys whose objects are loaded"""
+    relations = loaded_relations(instance)
+    errors = {}
+    try:
+        instance.full_clean(
+            exclude={field.name for field in relations},
+            validate_unique=False,
+            validate_constraints=False,
+        )
+    except ValidationError as e:
+        errors = e.update_error_dict(errors)
+    for field in relations:
+        related = field.get_cached_value(instance)
+        for validator in field.validators:
+            try:
+                validator(related)
+            except ValidationError as e:
+                errors.setdefault(field.name, []).extend(e.error_list)
+    # the unique checks aren't excluded along with the foreign keys
+    for check in (instance.validate_unique, instance.validate_constraints):
+        try:
+            check(exclude=generated_pk(instance))
+        except ValidationError as e:
+            errors = e.update_error_dict(errors)
+    if errors:
+        raise ValidationError(errors)
+
+
+def validate(instance: models.Model, mode: str | None = None) -> None:
+    """Validates the instance according to the given mode or the current one"""
+    mode = mode or get_validation_mode()
+    if mode == FULL:
+        instance.full_clean()
+    elif mode == TRUSTED:
+        trusted_clean(instance)
+    elif mode != SKIP:
+        raise ValueError(f"Unknown validation mode: {mode}")
+
+
+class BulkValidationError(ValidationError):
+    """
+    The errors of `bulk_full_clean`
+
+    `by_index` maps the index of each invalid instance to its errors by field,
+    the errors are also given by `<index>.<field>` keys as a regular error dict.
+    """
+
+    def __init__(self, errors: dict) -> None:
+        self.by_index = {index: errors[index] for index in sorted(errors)}
+        super().__init__(
+            {
+                f"{index}.{field}": field_errors
+                for index, instance_errors in self.by_index.items()
+                for field, field_errors in instance_errors.items()
+            }
+        )
+
+
+def check_foreign_key(field: models.ForeignKey, values: set) -> dict:
+    """
+    Checks the given ids of a foreign key with one query for its existence
+    and one per batched validator
+
+    Returns:
+        the errors of the invalid ids
+    """
+    errors = {}
+    target = field.target_field.attname
+    existing = set(
+        field.remote_field.model._base_manager.filter(**{f"{target}__in": values})
+        .complex_filter(field.get_limit_choices_to())
+        .values_list(target, flat=True)
+    )
+    for value in values - existing:
+        errors[value] = [
+            ValidationError(
+                field.error_messages["invalid"],
+                code="invalid",
+                params={
+                    "model": field.remote_field.model._meta.verbose_name,
+                    "pk": value,
+                    "field": field.remote_field.field_name,
+                    "value": value,
+                },
+            )
+        ]
+    for validator in field.validators:
+        if hasattr(validator, "valid_values"):
+            invalid = existing - set(validator.valid_values(existing))
+        else:
+            invalid = existing
+        # the validator gives the message of each invalid value
+        for value in invalid:
+            try:
+                validator(value)
+            except ValidationError as e:
+                errors.setdefault(value, []).extend(e.error_list)
+    return errors
+
+
+def bulk_full_clean(instances: Iterable[models.Model]) -> None:
+    """
+    Validates the instances like `full_clean` but checks each foreign key
+    of all of them with a single `IN` query (and one per batched validator)
+
+    The unique checks involving the foreign keys are left to the database,
+    and the generated primary keys aren't checked.
+
+    Raises:
+        BulkValidationError: with the errors of each invalid instance
+    """
+    instances = list(instances)
+    errors = {}
+    relations = {}
+    for index, instance in enumerate(instances):
+        fields = [f for f in instance._meta.concrete_fields if f.many_to_one]
+        try:
+            instance.full_clean(
+                exclude={field.name for field in fields} | generated_pk(instance)
+            )
+        except ValidationError as e:
+            errors[index] = e.update_error_dict({})
+        for field in fields:
+            value = getattr(instance, field.attname)
+            if value is None:
+                if not field.null:
+                    errors.setdefault(index, {}).setdefault(field.name, []).append(
+                        ValidationError(field.error_messages["null"], code="null")
+                    )
+                continue
+            relations.setdefault(field, {}).setdefault(value, []).append(index)
+
+    for field, indexes in relations.items():
+        for value, value_errors in check_foreign_key(field, set(indexes)).items():
+            for index in indexes[value]:
+                errors.setdefault(index, {}).setdefault(field.name, []).extend(
+                    value_errors
+                )
+
+    if errors:
+        raise BulkValidationError(errors)
+
+
+class TrustedSaveMixin:
+    """
+    A serializer mixin saving its instance in the `TRUSTED` validation mode,
+    as the related objects were loaded (and validated) by the serializer fields
+    """
+
+    def save(self, **kwargs):
+        with validation_mode(TRUSTED):
+            return super().save(**kwargs)
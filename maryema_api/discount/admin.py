@@ -2,6 +2,8 @@ from django.contrib import admin
 
 from discount.models import (
     DiscountCode,
+    DiscountEntitlement,
+    DiscountRedemption,
     DiscountRule,
     PrerequisiteToEntitlementQuantityRatio,
 )
@@ -9,3 +11,5 @@ from discount.models import (
 admin.site.register(DiscountRule)
 admin.site.register(DiscountCode)
 admin.site.register(PrerequisiteToEntitlementQuantityRatio)
+admin.site.register(DiscountRedemption)
+admin.site.register(DiscountEntitlement)
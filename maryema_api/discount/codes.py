@@ -0,0 +1,129 @@
+"""
+This module contains the bulk generation of the discount codes of a rule
+
+The codes are random strings of an alphabet, generated in batches:
+
+- the random bytes of a whole batch are read at once and mapped to the alphabet
+  with `bytes.translate` (the bytes past the largest multiple of the alphabet size
+  are dropped, so every character is equally likely)
+- the codes of a batch already taken are found with one query on the unique code index
+- the others are inserted with one `bulk_create` ignoring the conflicts
+  (a code taken concurrently meanwhile), which skips the `full_clean` of `save`
+
+A batch is generated again for the codes that were taken until the count is reached.
+"""
+
+import os
+from uuid import uuid4
+
+from django.db import transaction
+from django.utils import timezone
+
+from discount.engine import invalidate_rule_set
+from discount.entitlements import refresh_entitlements
+from discount.models import DiscountCode, DiscountRule
+
+# without the characters that are easily mistaken for each other (0/O, 1/I/L)
+DEFAULT_ALPHABET = "ABCDEFGHJKMNPQRSTUVWXYZ23456789"
+DEFAULT_LENGTH = 10
+BATCH_SIZE = 5000
+# the space of the codes must be this many times the number of codes wanted,
+# so a random code rarely collides
+MIN_SPACE_RATIO = 1000
+CODE_MAX_LENGTH = DiscountCode._meta.get_field("code").max_length
+
+
+def check_format(count: int, alphabet: str, length: int, prefix: str) -> None:
+    if len(set(alphabet)) != len(alphabet) or len(alphabet) < 2:
+        raise ValueError("The alphabet must have at least 2 distinct characters")
+    if len(alphabet.encode()) != len(alphabet):
+        raise ValueError("The alphabet must be made of ASCII characters")
+    if len(prefix) + length > CODE_MAX_LENGTH:
+        raise ValueError(f"The codes can't be longer than {CODE_MAX_LENGTH}")
+    if len(alphabet) ** length < count * MIN_SPACE_RATIO:
+        raise ValueError(
+            f"{len(alphabet)} characters of length {length} are too few"
+            f" for {count} codes, use a longer length or a larger alphabet"
+        )
+
+
+def random_codes(count: int, alphabet: str, length: int, prefix: str = "") -> set:
+    """Generates a set of count distinct random codes"""
+    # the bytes mapped to a character, the others are dropped
+    usable = 256 - 256 % len(alphabet)
+    table = bytes(alphabet.encode()[byte % len(alphabet)] for byte in range(256))
+    dropped = bytes(range(usable, 256))
+    codes = set()
+    while len(codes) < count:
+        missing = count - len(codes)
+        # with a margin for the dropped bytes
+        data = os.urandom(missing * length * 256 // usable + length)
+        chars = data.translate(table, dropped).decode()
+        codes.update(
+            prefix + chars[start : start + length]
+            for start in range(0, len(chars) - length + 1, length)
+        )
+    return set(list(codes)[:count])
+
+
+def generate_codes(
+    rule: DiscountRule,
+    count: int,
+    length: int = DEFAULT_LENGTH,
+    alphabet: str = DEFAULT_ALPHABET,
+    prefix: str = "",
+    starts_at=None,
+    ends_at=None,
+    batch_size: int = BATCH_SIZE,
+) -> list[str]:
+    """
+    Creates count new unique codes for a rule
+
+    The codes are valid in the time window of the rule unless another one is given.
+
+    Returns:
+        the created codes
+    Raises:
+        ValueError: the format can't give that many codes without many collisions
+    """
+    check_format(count, alphabet, length, prefix)
+    starts_at = starts_at or rule.starts_at
+    ends_at = ends_at or rule.ends_at
+    created = []
+    while len(created) < count:
+        candidates = random_codes(
+            min(batch_size, count - len(created)), alphabet, length, prefix
+        )
+        candidates -= set(
+            DiscountCode.objects.filter(code__in=candidates).values_list(
+                "code", flat=True
+            )
+        )
+        now = timezone.now()
+        codes = [
+            DiscountCode(
+                id=uuid4(),
+                discount_rule=rule,
+                code=code,
+                starts_at=starts_at,
+                ends_at=ends_at,
+                created_at=now,
+                updated_at=now,
+            )
+            for code in candidates
+        ]
+        with transaction.atomic():
+            DiscountCode.objects.bulk_create(codes, ignore_conflicts=True)
+            # the codes taken by a concurrent generation aren't inserted
+            inserted = set(
+                DiscountCode.objects.filter(
+                    pk__in=[code.pk for code in codes]
+                ).values_list("code", flat=True)
+            )
+        created.extend(code for code in candidates if code in inserted)
+    # the signals of the codes aren't sent by bulk_create
+    invalidate_rule_set()
+    if created:
+        # a rule with codes isn't automatic anymore
+        refresh_entitlements([rule.pk])
+    return created
@@ -0,0 +1,626 @@
+"""
+This module contains the evaluation of the discount rules against a cart
+
+The rules are compiled into in-memory matchers once, then every cart is evaluated
+against them without a query per rule or per item:
+
+- the entitled and prerequisite collections, products and variants of a rule
+  are expanded into sets of variant ids (None when the rule targets all the variants)
+- the selected customers become a set of profile ids
+- the thresholds, the allocation and the Buy X Get Y ratio are plain attributes
+
+A rule with codes only applies when one of its codes is given,
+a rule without codes applies automatically to the eligible carts.
+
+The compiled rule set is kept in each process with the version it was built for.
+The version is kept in the default cache and replaced (see `invalidate_rule_set`)
+by the changes of the rules, their codes and the collections (see discount/signals.py),
+so the rules are compiled again only after they changed.
+
+The rules and the codes active now are precomputed into a `Schedule` kept in the
+default cache until the next start or end of a rule or a code (see `get_schedule`
+and discount/schedule.py), so a cart, its codes and the sale prices are checked
+against sets of ids instead of the time windows of the rules and the codes.
+
+A cart is evaluated in one pass over its lines per applicable rule.
+Two discounts combine as long as they don't discount the same variant,
+the combination of the applicable discounts with the largest total is applied.
+"""
+
+from dataclasses import dataclass, field
+from decimal import ROUND_HALF_UP, Decimal
+from functools import partial
+from typing import Iterable
+from uuid import UUID, uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from cart.models import Cart
+from discount.models import DiscountCode, DiscountRule
+from product.models import Collection, ProductVariant
+
+VERSION_KEY = "discount-rules-version"
+SCHEDULE_KEY = "discount-schedule"
+CENT = Decimal("0.01")
+# the largest number of applicable discounts whose combinations are all tried,
+# the smaller ones past it are added when they don't overlap the combination
+MAX_COMBINED = 16
+
+
+def to_money(amount: Decimal) -> Decimal:
+    return amount.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+@dataclass(frozen=True)
+class Line:
+    """A line of a cart: the quantity of a variant at its unit price"""
+
+    variant_id: UUID
+    quantity: int
+    price: Decimal
+
+    @property
+    def total(self) -> Decimal:
+        return self.price * self.quantity
+
+
+@dataclass(frozen=True)
+class CompiledRule:
+    """
+    The matcher of a discount rule
+
+    The sets of ids are None when the rule doesn't restrict them
+    (all the customers, all the variants, no prerequisite items).
+    """
+
+    id: UUID
+    title: str
+    starts_at: object
+    ends_at: object
+    value_type: str
+    value: Decimal
+    allocation_method: str
+    allocation_limit: int | None
+    customers: frozenset | None
+    entitled: frozenset | None
+    prerequisites: frozenset | None
+    min_quantity: int
+    min_subtotal: Decimal
+    min_prerequisite_subtotal: Decimal
+    # (prerequisite quantity, entitled quantity) of a Buy X Get Y rule
+    ratio: tuple[int, int] | None
+    has_codes: bool
+
+    def is_active(self, now) -> bool:
+        return self.starts_at <= now <= self.ends_at
+
+    @property
+    def is_automatic(self) -> bool:
+        """The rule discounts a single unit of any customer without a code"""
+        return (
+            not self.has_codes
+            and self.customers is None
+            and self.prerequisites is None
+            and self.ratio is None
+            and self.min_quantity <= 1
+            and not self.min_subtotal
+            and not self.min_prerequisite_subtotal
+        )
+
+    def is_eligible(self, customer_id) -> bool:
+        return self.customers is None or customer_id in self.customers
+
+    def entitles(self, line: Line) -> bool:
+        return (
+            self.entitled is None or line.variant_id in self.entitled
+        ) and line.quantity >= self.min_quantity
+
+    def unit_discount(self, price: Decimal) -> Decimal:
+        if self.value_type == DiscountRule.TypeChoices.PERCENTAGE:
+            return to_money(price * self.value / 100)
+        return min(price, self.value)
+
+    def allocate(self, lines: list[Line], subtotal: Decimal) -> dict[UUID, Decimal]:
+        """
+        The discount of each entitled variant of the lines
+
+        Returns:
+            {variant id: discount amount}, empty if the rule doesn't apply
+        """
+        if subtotal < self.min_subtotal:
+            return {}
+        entitled = [line for line in lines if self.entitles(line)]
+        if not entitled:
+            return {}
+        if self.prerequisites is not None:
+            required = [line for line in lines if line.variant_id in self.prerequisites]
+            if not required:
+                return {}
+            purchased = sum((line.total for line in required), Decimal(0))
+        else:
+            required, purchased = [], subtotal
+        if purchased < self.min_prerequisite_subtotal:
+            return {}
+        if self.ratio is not None and required:
+            return self.allocate_ratio(required, entitled)
+        if self.allocation_method == DiscountRule.AllocationChoices.ACROSS:
+            return self.allocate_across(entitled)
+        return self.allocate_each(entitled, self.allocation_limit)
+
+    def allocate_each(
+        self, lines: list[Line], limit: int | None
+    ) -> dict[UUID, Decimal]:
+        """
+        Discounts each unit of the lines, the most expensive ones first
+        when the number of units is limited
+        """
+        allocation = {}
+        for line in sorted(lines, key=lambda line: line.price, reverse=True):
+            quantity = line.quantity
+            if limit is not None:
+                quantity = min(quantity, limit)
+                limit -= quantity
+            if quantity > 0:
+                amount = self.unit_discount(line.price) * quantity
+                if amount:
+                    allocation[line.variant_id] = amount
+            if limit == 0:
+                break
+        return allocation
+
+    def allocate_across(self, lines: list[Line]) -> dict[UUID, Decimal]:
+        """Spreads the discount over the lines in proportion to their totals"""
+        if self.value_type == DiscountRule.TypeChoices.PERCENTAGE:
+            return self.allocate_each(lines, None)
+        total = sum((line.total for line in lines), Decimal(0))
+        amount = min(self.value, total)
+        allocation, left = {}, amount
+        for index, line in enumerate(lines):
+            if index == len(lines) - 1:
+                share = left
+            else:
+                share = to_money(amount * line.total / total)
+                left -= share
+            if share:
+                allocation[line.variant_id] = share
+        return allocation
+
+    def allocate_ratio(
+        self, required: list[Line], entitled: list[Line]
+    ) -> dict[UUID, Decimal]:
+        """
+        Buy X Get Y: every X prerequisite units bought entitle Y units to the discount
+
+        The most expensive prerequisite units are counted as bought first,
+        the discount goes to the cheapest entitled units left.
+        The allocation limit caps the number of times the ratio is applied.
+        """
+        prerequisite_quantity, entitled_quantity = self.ratio
+        quantities = {line.variant_id: line.quantity for line in entitled}
+        bought = sum(line.quantity for line in required)
+        times = bought // prerequisite_quantity
+        if self.allocation_limit is not None:
+            times = min(times, self.allocation_limit)
+        # the units bought can't be given as well
+        left = times * prerequisite_quantity
+        for line in sorted(required, key=lambda line: line.price, reverse=True):
+            if line.variant_id in quantities:
+                used = min(left, quantities[line.variant_id])
+                quantities[line.variant_id] -= used
+            else:
+                used = min(left, line.quantity)
+            left -= used
+        allocation, free = {}, times * entitled_quantity
+        for line in sorted(entitled, key=lambda line: line.price):
+            quantity = min(free, quantities[line.variant_id])
+            if quantity > 0:
+                allocation[line.variant_id] = self.unit_discount(line.price) * quantity
+                free -= quantity
+        return {variant: amount for variant, amount in allocation.items() if amount}
+
+
+@dataclass
+class AppliedDiscount:
+    rule: CompiledRule
+    code: str | None
+    lines: dict[UUID, Decimal]
+
+    @property
+    def amount(self) -> Decimal:
+        return sum(self.lines.values(), Decimal(0))
+
+    def to_dict(self) -> dict:
+        return {
+            "rule": self.rule.id,
+            "title": self.rule.title,
+            "code": self.code,
+            "amount": str(self.amount),
+            "lines": {
+                str(variant_id): str(amount)
+                for variant_id, amount in self.lines.items()
+            },
+        }
+
+
+@dataclass
+class Evaluation:
+    subtotal: Decimal
+    applied: list[AppliedDiscount] = field(default_factory=list)
+    # the given codes that don't apply to the cart
+    rejected_codes: list[str] = field(default_factory=list)
+
+    @property
+    def discount(self) -> Decimal:
+        return sum((applied.amount for applied in self.applied), Decimal(0))
+
+    @property
+    def total(self) -> Decimal:
+        return self.subtotal - self.discount
+
+    def to_dict(self) -> dict:
+        return {
+            "subtotal": str(to_money(self.subtotal)),
+            "discount": str(to_money(self.discount)),
+            "total": str(to_money(self.total)),
+            "discounts": [applied.to_dict() for applied in self.applied],
+            "rejected_codes": self.rejected_codes,
+        }
+
+
+def best_combination(candidates: list[AppliedDiscount]) -> list[AppliedDiscount]:
+    """
+    The combination of discounts on distinct variants with the largest total
+
+    The largest MAX_COMBINED candidates are searched exhaustively (with pruning),
+    the others are added greedily when they fit.
+    """
+    candidates = sorted(candidates, key=lambda applied: applied.amount, reverse=True)
+    searched, rest = candidates[:MAX_COMBINED], candidates[MAX_COMBINED:]
+    amounts = [applied.amount for applied in searched]
+    # the largest total the candidates from an index on could still add
+    bounds = [sum(amounts[index:], Decimal(0)) for index in range(len(amounts) + 1)]
+    best, best_total = [], Decimal(0)
+
+    def search(index: int, chosen: list, variants: set, total: Decimal) -> None:
+        nonlocal best, best_total
+        if total > best_total:
+            best, best_total = list(chosen), total
+        if index == len(searched) or total + bounds[index] <= best_total:
+            return
+        applied = searched[index]
+        if variants.isdisjoint(applied.lines):
+            chosen.append(applied)
+            search(
+                index + 1,
+                chosen,
+                variants | applied.lines.keys(),
+                total + amounts[index],
+            )
+            chosen.pop()
+        search(index + 1, chosen, variants, total)
+
+    search(0, [], set(), Decimal(0))
+    variants = {variant for applied in best for variant in applied.lines}
+    for applied in rest:
+        if variants.isdisjoint(applied.lines):
+            best.append(applied)
+            variants |= applied.lines.keys()
+    return best
+
+
+@dataclass
+class RuleSet:
+    """The compiled rules which haven't expired when they were compiled"""
+
+    rules: dict[UUID, CompiledRule]
+
+    def evaluate(
+        self,
+        lines: Iterable[Line],
+        customer_id=None,
+        codes: dict[str, UUID] | None = None,
+        now=None,
+        active: frozenset | None = None,
+    ) -> Evaluation:
+        """
+        Evaluates the lines of a cart against the rules
+
+        Args:
+            customer_id: the id of the profile of the customer
+            codes: the rule id of each valid code given by the customer
+                   (see `resolve_codes`)
+            active: the ids of the rules active now (see `get_schedule`),
+                    the time windows of the rules are checked when not given
+        """
+        now = now or timezone.now()
+        codes = codes or {}
+        lines = [line for line in lines if line.quantity > 0]
+        subtotal = sum((line.total for line in lines), Decimal(0))
+        evaluation = Evaluation(subtotal)
+        # the rules with codes only apply through one of them
+        by_rule = {rule_id: code for code, rule_id in codes.items()}
+        candidates = []
+        for rule in self.rules.values():
+            code = by_rule.get(rule.id)
+            if rule.has_codes and code is None:
+                continue
+            if active is None and not rule.is_active(now):
+                continue
+            if active is not None and rule.id not in active:
+                continue
+            if not rule.is_eligible(customer_id):
+                continue
+            allocation = rule.allocate(lines, subtotal)
+            if allocation:
+                candidates.append(AppliedDiscount(rule, code, allocation))
+        evaluation.applied = best_combination(candidates)
+        applied_codes = {applied.code for applied in evaluation.applied}
+        evaluation.rejected_codes = [
+            code for code in codes if code not in applied_codes
+        ]
+        return evaluation
+
+
+def related_ids(rule_ids: list, name: str) -> dict[UUID, set]:
+    """The ids of the objects related to each rule through a many-to-many field"""
+    m2m = DiscountRule._meta.get_field(name)
+    source, target = m2m.m2m_field_name(), m2m.m2m_reverse_field_name()
+    related = {}
+    for rule_id, related_id in m2m.remote_field.through.objects.filter(
+        **{f"{source}_id__in": rule_ids}
+    ).values_list(f"{source}_id", f"{target}_id"):
+        related.setdefault(rule_id, set()).add(related_id)
+    return related
+
+
+def expand_to_variants(
+    rule_ids: list, collections: str, products: str, variants: str
+) -> dict[UUID, set]:
+    """
+    The ids of the variants of the collections, products and variants of each rule,
+    in one query per many-to-many field and one for the variants of the products
+
+    Only the rules with some of them have an entry.
+    """
+    collection_ids = related_ids(rule_ids, collections)
+    product_ids = related_ids(rule_ids, products)
+    variant_ids = related_ids(rule_ids, variants)
+
+    all_collections = set().union(*collection_ids.values())
+    products_of = {}
+    if all_collections:
+        for collection_id, product_id in Collection.products.through.objects.filter(
+            collection_id__in=all_collections
+        ).values_list("collection_id", "product_id"):
+            products_of.setdefault(collection_id, set()).add(product_id)
+    for rule_id, ids in collection_ids.items():
+        product_ids.setdefault(rule_id, set()).update(
+            *(products_of.get(collection_id, ()) for collection_id in ids)
+        )
+
+    all_products = set().union(*product_ids.values())
+    variants_of = {}
+    if all_products:
+        for product_id, variant_id in ProductVariant.objects.filter(
+            product_id__in=all_products
+        ).values_list("product_id", "pk"):
+            variants_of.setdefault(product_id, set()).add(variant_id)
+    for rule_id, ids in product_ids.items():
+        variant_ids.setdefault(rule_id, set()).update(
+            *(variants_of.get(product_id, ()) for product_id in ids)
+        )
+    return variant_ids
+
+
+def compile_rules(now=None, rule_ids=None) -> RuleSet:
+    """
+    Compiles the rules which haven't expired, in a fixed number of queries
+
+    Args:
+        rule_ids: the ids of the rules to compile, all of them by default
+    """
+    now = now or timezone.now()
+    rules = DiscountRule.objects.filter(ends_at__gte=now)
+    if rule_ids is not None:
+        rules = rules.filter(pk__in=rule_ids)
+    rules = list(rules.select_related("prerequisite_to_entitlement_quantity_ratio"))
+    if not rules:
+        return RuleSet({})
+    rule_ids = [rule.pk for rule in rules]
+    entitled = expand_to_variants(
+        rule_ids, "entitled_collection", "entitled_products", "entitled_variants"
+    )
+    prerequisites = expand_to_variants(
+        rule_ids,
+        "prerequisite_collections",
+        "prerequisite_products",
+        "prerequisite_variants",
+    )
+    customers = related_ids(rule_ids, "selected_customers")
+    with_codes = set(
+        DiscountCode.objects.filter(discount_rule_id__in=rule_ids)
+        .values_list("discount_rule_id", flat=True)
+        .distinct()
+    )
+
+    compiled = {}
+    for rule in rules:
+        ratio = getattr(rule, "prerequisite_to_entitlement_quantity_ratio", None)
+        selected = DiscountRule.SelectionChoices.SELECTED
+        compiled[rule.pk] = CompiledRule(
+            id=rule.pk,
+            title=rule.title,
+            starts_at=rule.starts_at,
+            ends_at=rule.ends_at,
+            value_type=rule.value_type,
+            value=Decimal(rule.value),
+            allocation_method=rule.allocation_method,
+            allocation_limit=rule.allocation_limit,
+            customers=(
+                frozenset(customers.get(rule.pk, ()))
+                if rule.customer_selection == selected
+                else None
+            ),
+            entitled=(
+                frozenset(entitled.get(rule.pk, ()))
+                if rule.target_selection == selected
+                else None
+            ),
+            prerequisites=(
+                frozenset(prerequisites.get(rule.pk, ()))
+                if rule.pk in prerequisites
+                else None
+            ),
+            min_quantity=rule.prerequisite_quantity_range,
+            min_subtotal=rule.prerequisite_subtotal_range,
+            min_prerequisite_subtotal=rule.prerequisite_to_entitlement_purchase,
+            ratio=(
+                (ratio.prerequisite_quantity, ratio.entitled_quantity)
+                if ratio is not None
+                else None
+            ),
+            has_codes=rule.pk in with_codes,
+        )
+    return RuleSet(compiled)
+
+
+# the rule set compiled by this process, with the version it was compiled for
+_compiled: tuple[str, RuleSet] | None = None
+
+
+def get_version() -> str:
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid4().hex, timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def get_rule_set() -> RuleSet:
+    """The compiled rules, compiled again only if they changed since"""
+    global _compiled
+    version = get_version()
+    if _compiled is None or _compiled[0] != version:
+        _compiled = (version, compile_rules())
+    return _compiled[1]
+
+
+@dataclass(frozen=True)
+class Schedule:
+    """
+    The ids of the rules and of the codes active at `computed_at`,
+    until the next start or end of a rule or a code
+    """
+
+    active: frozenset
+    computed_at: object
+    until: object = None
+    active_codes: frozenset = frozenset()
+
+    def is_current(self, now) -> bool:
+        return self.computed_at <= now and (self.until is None or now < self.until)
+
+
+def compute_schedule(now=None) -> Schedule:
+    """
+    The rules and the codes active now and the next start or end of one of them,
+    in one query for the rules and one for the codes
+    """
+    now = now or timezone.now()
+    boundaries = []
+
+    def active_now(model) -> frozenset:
+        active = set()
+        for pk, starts_at, ends_at in model.objects.filter(
+            ends_at__gte=now
+        ).values_list("pk", "starts_at", "ends_at"):
+            if starts_at <= now:
+                active.add(pk)
+                boundaries.append(ends_at)
+            else:
+                boundaries.append(starts_at)
+        return frozenset(active)
+
+    active, active_codes = active_now(DiscountRule), active_now(DiscountCode)
+    return Schedule(active, now, min(boundaries, default=None), active_codes)
+
+
+def get_schedule(now=None) -> Schedule:
+    """
+    The cached schedule, computed again once past its boundary,
+    so it stays exact even when the scheduler is late
+    """
+    now = now or timezone.now()
+    schedule = cache.get(SCHEDULE_KEY)
+    if schedule is None or not schedule.is_current(now):
+        schedule = compute_schedule(now)
+        cache.set(SCHEDULE_KEY, schedule, timeout=None)
+    return schedule
+
+
+def invalidate_rule_set(schedule: bool = True) -> None:
+    """
+    Makes every process compile the rules and their schedule again, now and once committed
+
+    Args:
+        schedule: False to keep the schedule, when no time window changed
+    """
+
+    def bump():
+        cache.set(VERSION_KEY, uuid4().hex, timeout=None)
+        if schedule:
+            cache.delete(SCHEDULE_KEY)
+
+    bump()
+    # in case the old rules were compiled again before the commit
+    transaction.on_commit(bump)
+
+
+def invalidate_schedule() -> None:
+    """Computes the schedule again, now and once committed (when only a time window changed)"""
+    cache.delete(SCHEDULE_KEY)
+    transaction.on_commit(partial(cache.delete, SCHEDULE_KEY))
+
+
+def resolve_codes(codes: Iterable[str], now=None) -> dict[str, UUID]:
+    """
+    The rule id of each of the given codes which is usable now, in one query
+
+    The codes usable now are read from the schedule,
+    the usage limits are checked when the codes are redeemed.
+    """
+    codes = {code.strip() for code in codes if code.strip()}
+    if not codes:
+        return {}
+    active_codes = get_schedule(now).active_codes
+    return {
+        code: rule_id
+        for pk, code, rule_id in DiscountCode.objects.filter(
+            code__in=codes
+        ).values_list("pk", "code", "discount_rule_id")
+        if pk in active_codes
+    }
+
+
+def cart_lines(cart: Cart) -> list[Line]:
+    """The lines of a cart with the current prices of their variants, in one query"""
+    return [
+        Line(variant_id, quantity, price)
+        for variant_id, quantity, price in cart.items.values_list(
+            "product_variant_id", "quantity", "product_variant__price"
+        )
+    ]
+
+
+def evaluate_cart(cart: Cart, codes: Iterable[str] = (), now=None) -> Evaluation:
+    """Evaluates a cart against the discount rules, with the codes given for it"""
+    now = now or timezone.now()
+    resolved = resolve_codes(codes, now)
+    evaluation = get_rule_set().evaluate(
+        cart_lines(cart), cart.customer_id, resolved, now, get_schedule(now).active
+    )
+    unknown = {code.strip() for code in codes if code.strip()} - set(resolved)
+    evaluation.rejected_codes += sorted(unknown)
+    return evaluation
@@ -0,0 +1,185 @@
+"""
+This module contains the entitlement index of the discount rules
+
+`DiscountEntitlement` holds a row for each variant discounted by a rule which hasn't expired,
+with the time window of the rule and the discount of a unit at the price of the variant:
+
+- the rules are expanded into variants by the compiler of the engine
+  (see `discount.engine.compile_rules`), in a fixed number of queries
+- the rows of the refreshed rules (and variants) are replaced in one transaction
+- the rows are filtered by the rules active now when they are read
+  (see `discount.engine.get_schedule`), so a rule starting or ending doesn't need a refresh
+
+The signals of the discount app refresh the rows of the rules whose targets,
+conditions or time window change, of the rules entitling the collections
+whose products change and of the variants created, repriced or moved
+(see discount/signals.py).
+
+The sale price of a variant is its price minus its largest automatic discount
+of a rule active at the time of the query, annotated with one subquery
+(see `current_discount`), so a page of variants or products needs no query per row.
+"""
+
+from decimal import Decimal
+from typing import Iterable
+
+from django.db import transaction
+from django.db.models import DecimalField, Max, OuterRef, Q, QuerySet, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from core.cache import invalidate_responses
+from discount.engine import RuleSet, compile_rules, get_schedule
+from discount.models import DiscountEntitlement, DiscountRule
+from product.models import ProductVariant
+
+BATCH_SIZE = 2000
+
+
+def rules_entitling(product_ids: Iterable, variant_ids: Iterable = ()) -> list:
+    """The ids of the rules which haven't expired and target some of these products"""
+    return list(
+        DiscountRule.objects.filter(ends_at__gte=timezone.now())
+        .filter(
+            Q(target_selection=DiscountRule.SelectionChoices.ALL)
+            | Q(entitled_products__in=product_ids)
+            | Q(entitled_collection__products__in=product_ids)
+            | Q(entitled_variants__in=variant_ids)
+        )
+        .values_list("pk", flat=True)
+        .distinct()
+    )
+
+
+def build_entitlements(
+    rule_set: RuleSet, variants: QuerySet | None = None
+) -> tuple[list[DiscountEntitlement], set]:
+    """
+    The entitlements of the compiled rules (restricted to some variants),
+    in one query for the prices of the variants
+
+    Returns:
+        the entitlements and the ids of the products of their variants
+    """
+    rules = list(rule_set.rules.values())
+    if not rules:
+        return [], set()
+    variants = ProductVariant.objects.all() if variants is None else variants
+    if all(rule.entitled is not None for rule in rules):
+        variants = variants.filter(pk__in=set().union(*(r.entitled for r in rules)))
+    prices = {
+        pk: (product_id, price)
+        for pk, product_id, price in variants.values_list("pk", "product_id", "price")
+    }
+    entitlements = []
+    for rule in rules:
+        automatic = rule.is_automatic
+        entitled = prices.keys() if rule.entitled is None else rule.entitled
+        for variant_id in prices.keys() & entitled:
+            entitlements.append(
+                DiscountEntitlement(
+                    discount_rule_id=rule.id,
+                    variant_id=variant_id,
+                    starts_at=rule.starts_at,
+                    ends_at=rule.ends_at,
+                    automatic=automatic,
+                    discount=rule.unit_discount(prices[variant_id][1]),
+                )
+            )
+    product_ids = {prices[entitlement.variant_id][0] for entitlement in entitlements}
+    return entitlements, product_ids
+
+
+def refresh_entitlements(
+    rule_ids: Iterable | None = None, variants: QuerySet | None = None, now=None
+) -> int:
+    """
+    Replaces the entitlements of the given rules (and variants), of all of them by default
+
+    The entitlements of the rules which have expired are removed.
+
+    Returns:
+        the number of the entitlements created
+    """
+    stale = DiscountEntitlement.objects.all()
+    if rule_ids is not None:
+        rule_ids = set(rule_ids)
+        if not rule_ids:
+            return 0
+        stale = stale.filter(discount_rule_id__in=rule_ids)
+    if variants is not None:
+        stale = stale.filter(variant__in=variants.values("pk"))
+    with transaction.atomic():
+        product_ids = set(stale.values_list("variant__product_id", flat=True))
+        stale.delete()
+        entitlements, entitled_products = build_entitlements(
+            compile_rules(now, rule_ids), variants
+        )
+        DiscountEntitlement.objects.bulk_create(entitlements, batch_size=BATCH_SIZE)
+    # the sale prices of the products changed
+    product_ids |= entitled_products
+    if product_ids:
+        invalidate_responses("product", product_ids)
+    return len(entitlements)
+
+
+def forget_entitlements(rule_ids: Iterable) -> None:
+    """Invalidates the products entitled to rules about to be deleted"""
+    product_ids = set(
+        DiscountEntitlement.objects.filter(discount_rule_id__in=rule_ids).values_list(
+            "variant__product_id", flat=True
+        )
+    )
+    if product_ids:
+        invalidate_responses("product", product_ids)
+
+
+class ActiveRulesSubquery(Subquery):
+    """
+    A subquery of the entitlements restricted to the rules active when it is compiled,
+    so the querysets built once (like the prefetches of the views) read the current ones
+    """
+
+    def as_sql(self, compiler, connection, *args, **kwargs):
+        clone = self.copy()
+        clone.query.add_q(Q(discount_rule_id__in=get_schedule().active))
+        return super(ActiveRulesSubquery, clone).as_sql(
+            compiler, connection, *args, **kwargs
+        )
+
+
+def current_discount(variant: str = "pk") -> Coalesce:
+    """
+    The largest automatic discount of a unit of the outer variant
+    of the rules active now, 0 if none
+
+    Args:
+        variant: the reference to the variant id from the outer query
+    """
+    return Coalesce(
+        ActiveRulesSubquery(
+            DiscountEntitlement.objects.filter(
+                variant=OuterRef(variant), automatic=True
+            )
+            .order_by("-discount")
+            .values("discount")[:1]
+        ),
+        Value(Decimal(0)),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def sale_price(price: Decimal | None, discount: Decimal | None) -> Decimal | None:
+    """The price of a unit with its discount"""
+    if price is None:
+        return None
+    return max(price - (discount or 0), Decimal(0))
+
+
+def variant_discount(variant_id) -> Decimal:
+    """The current discount of a variant which wasn't annotated with `current_discount`"""
+    return DiscountEntitlement.objects.filter(
+        variant_id=variant_id,
+        automatic=True,
+        discount_rule_id__in=get_schedule().active,
+    ).aggregate(discount=Max("discount"))["discount"] or Decimal(0)
@@ -0,0 +1,43 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from discount.codes import BATCH_SIZE, DEFAULT_ALPHABET, DEFAULT_LENGTH, generate_codes
+from discount.models import DiscountRule
+
+
+class Command(BaseCommand):
+    help = "Generates unique random discount codes for a discount rule"
+
+    def add_arguments(self, parser):
+        parser.add_argument("rule", help="The id of the discount rule")
+        parser.add_argument("count", type=int, help="The number of codes")
+        parser.add_argument("--length", type=int, default=DEFAULT_LENGTH)
+        parser.add_argument("--alphabet", default=DEFAULT_ALPHABET)
+        parser.add_argument("--prefix", default="")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            "--output", help="A file to write the generated codes to, one per line"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            rule = DiscountRule.objects.get(pk=options["rule"])
+        except (DiscountRule.DoesNotExist, ValidationError):
+            raise CommandError(f"Unknown discount rule: {options['rule']}")
+        try:
+            codes = generate_codes(
+                rule,
+                options["count"],
+                length=options["length"],
+                alphabet=options["alphabet"],
+                prefix=options["prefix"],
+                batch_size=options["batch_size"],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.writelines(code + "\n" for code in codes)
+        self.stdout.write(
+            self.style.SUCCESS(f"Generated {len(codes)} codes for {rule}")
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from discount.entitlements import refresh_entitlements
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the entitlements of all the discount rules which haven't expired"
+
+    def handle(self, *args, **options):
+        count = refresh_entitlements()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} discount entitlements"))
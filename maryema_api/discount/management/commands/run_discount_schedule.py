@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from discount.schedule import run_schedule, run_scheduler
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves the discount rules and codes which started or ended since the last run"
+        " (run it from cron, or with --loop to wake up at each start or end)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep running, sleeping until the next start or end of a rule",
+        )
+
+    def handle(self, *args, **options):
+        if options["loop"]:
+            run_scheduler(on_run=self.report)
+        else:
+            self.report(run_schedule())
+
+    def report(self, transitions):
+        schedule = transitions.schedule
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(schedule.active)} active discount rules"
+                f" ({len(transitions.started)} started, {len(transitions.ended)} ended,"
+                f" {len(transitions.expired)} expired),"
+                f" {len(schedule.active_codes)} active discount codes"
+                f" ({len(transitions.started_codes)} started,"
+                f" {len(transitions.ended_codes)} ended), next change at {schedule.until}"
+            )
+        )
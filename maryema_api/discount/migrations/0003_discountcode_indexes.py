@@ -0,0 +1,19 @@
+# Generated by Django 5.1.15 on 2026-10-18 12:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("discount", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="discountcode",
+            index=models.Index(
+                fields=["code", "ends_at"], name="discount_code_validity_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.1.15 on 2026-10-18 13:13
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("discount", "0003_discountcode_indexes"),
+        ("profile", "0003_alter_profile_wishlist"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DiscountRedemption",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "once_per_customer",
+                    models.BooleanField(
+                        default=False,
+                        help_text="The once per customer setting of the rule when the code was redeemed.",
+                    ),
+                ),
+                (
+                    "discount_code",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="redemptions",
+                        related_query_name="redemption",
+                        to="discount.discountcode",
+                    ),
+                ),
+                (
+                    "discount_rule",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="redemptions",
+                        related_query_name="redemption",
+                        to="discount.discountrule",
+                    ),
+                ),
+                (
+                    "profile",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="discount_redemptions",
+                        related_query_name="discount_redemption",
+                        to="profile.profile",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Discount Redemption",
+                "verbose_name_plural": "Discount Redemptions",
+                "db_table": "discount_redemption",
+                "constraints": [
+                    models.UniqueConstraint(
+                        condition=models.Q(("once_per_customer", True)),
+                        fields=("discount_rule", "profile"),
+                        name="unique_once_per_customer_redemption",
+                    )
+                ],
+            },
+        ),
+    ]
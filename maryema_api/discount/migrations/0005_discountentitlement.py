@@ -0,0 +1,81 @@
+# Generated by Django 5.1.15 on 2026-10-18 13:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("discount", "0004_discountredemption"),
+        ("product", "0018_productlisting_ratings"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DiscountEntitlement",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("starts_at", models.DateTimeField()),
+                ("ends_at", models.DateTimeField()),
+                (
+                    "automatic",
+                    models.BooleanField(
+                        default=False,
+                        help_text="The rule discounts a single unit of the variant without a code or another condition (the discount shown on the product cards).",
+                    ),
+                ),
+                (
+                    "discount",
+                    models.DecimalField(
+                        decimal_places=2,
+                        help_text="The discount of a unit of the variant at its current price.",
+                        max_digits=10,
+                    ),
+                ),
+                (
+                    "discount_rule",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="entitlements",
+                        related_query_name="entitlement",
+                        to="discount.discountrule",
+                    ),
+                ),
+                (
+                    "variant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="discount_entitlements",
+                        related_query_name="discount_entitlement",
+                        to="product.productvariant",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Discount Entitlement",
+                "verbose_name_plural": "Discount Entitlements",
+                "db_table": "discount_entitlement",
+                "indexes": [
+                    models.Index(
+                        fields=["variant", "automatic", "-discount"],
+                        name="discount_entitlement_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("variant", "discount_rule"),
+                        name="unique_discount_entitlement",
+                    )
+                ],
+            },
+        ),
+    ]
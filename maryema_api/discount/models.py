@@ -2,14 +2,16 @@
     DiscountRule model : Which defines the rule of the discount.
     PrerequisiteToEntitlementQuantityRatio model : holds more information for Buy X Get Y type
     DiscountCode model : codes generated for a certain rule.
+    DiscountRedemption model : each use of a code by a customer.
+    DiscountEntitlement model : the variants each rule discounts (see discount/entitlements.py).
 """
 
-from datetime import datetime
 from profile.models import Profile
 
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.utils import timezone
 
 from core.models import BaseModel
 from product.models import Collection, Product, ProductVariant
@@ -169,29 +171,34 @@ class DiscountRule(BaseModel):
         ):
             raise ValidationError("Percentage value should be between 0 and 100")
 
+        # the many-to-many fields are only set once the rule is saved
+        if not self._state.adding:
+            self.clean_relations()
+
+        return super().clean(*args, **kwargs)
+
+    def clean_relations(self) -> None:
+        """validates the many-to-many fields of a saved rule"""
+
         # Check if the targeted customers are provided if the customer selection is selected
         if (
             self.customer_selection == self.SelectionChoices.SELECTED
-            and not self.selected_customers
+            and not self.selected_customers.exists()
         ):
             raise ValidationError("Selected customers should be provided")
 
         # Check if the entitled items are provided if the target selection is selected
         if self.target_selection == self.SelectionChoices.SELECTED:
-            if not any(
-                [
-                    self.entitled_collection,
-                    self.entitled_products,
-                    self.entitled_variants,
-                ]
-            ):
+            entitled_collections = self.entitled_collection.exists()
+            entitled_items = (
+                self.entitled_products.exists() or self.entitled_variants.exists()
+            )
+            if not entitled_collections and not entitled_items:
                 raise ValidationError("Entitled items should be provided")
 
             # ensures that entitled collections can't be used
             # in combination with entitled_products or entitled_variants.
-            if self.entitled_collection and any(
-                [self.entitled_products, self.entitled_variants]
-            ):
+            if entitled_collections and entitled_items:
                 raise ValidationError(
                     (
                         "Entitled collections can't be used in combination with"
@@ -202,22 +209,20 @@ class DiscountRule(BaseModel):
             # ensures that entitled variants do not include any variant
             # that is associated with a product in entitled products
             if variants_included_in_products := self.entitled_variants.filter(
-                product__in=self.entitled_products
+                product__in=self.entitled_products.all()
             ):
                 raise ValidationError(
                     (
                         "The following variants are already included in the entitled products:\n"
-                        f"\t- {'\n\t- '.join(str(variants_included_in_products))}"
+                        f"\t- {'\n\t- '.join(map(str, variants_included_in_products))}"
                     )
                 )
 
         # validates the prerequisites for the discount rule if it is a Buy X Get Y type discount
-        if any(
-            [
-                self.prerequisite_collections,
-                self.prerequisite_products,
-                self.prerequisite_variants,
-            ]
+        if (
+            self.prerequisite_collections.exists()
+            or self.prerequisite_products.exists()
+            or self.prerequisite_variants.exists()
         ):
             if self.target_selection != self.SelectionChoices.SELECTED:
                 raise ValidationError(
@@ -228,12 +233,6 @@ class DiscountRule(BaseModel):
                     "Prerequisites can only be used with each allocation method"
                 )
 
-        return super().clean(*args, **kwargs)
-
-    def save(self, *args, **kwargs) -> None:
-        self.full_clean()
-        return super().save(*args, **kwargs)
-
 
 class PrerequisiteToEntitlementQuantityRatio(BaseModel):
     """a Model that holds the ratio between the prerequisite quantity and the entitlement quantity"""
@@ -308,6 +307,10 @@ class DiscountCode(BaseModel):
 
     class Meta:
         db_table = "discount_code"
+        indexes = [
+            # the lookup of a code that has not expired yet
+            models.Index(fields=["code", "ends_at"], name="discount_code_validity_idx"),
+        ]
         verbose_name = "Discount Code"
         verbose_name_plural = "Discount Codes"
 
@@ -323,16 +326,118 @@ class DiscountCode(BaseModel):
             raise ValidationError("Usage limit has been reached for this discount code")
         return super().clean(*args, **kwargs)
 
-    def save(self, *args, **kwargs) -> None:
-        """berform a full clean before saving it to the database"""
-
-        self.full_clean()
-        return super().save(*args, **kwargs)
-
     @property
     def is_active(self) -> bool:
-        """returns true if the code is still eligable to use"""
+        """
+        returns true if the code is still eligable to use
+
+        The codes are redeemed with `discount.redemption.redeem_code`,
+        this is only a hint for the codes already loaded with their rules.
+        """
         return (
-            self.starts_at <= datetime.now() <= self.ends_at
+            self.starts_at <= timezone.now() <= self.ends_at
             and self.usage_count < self.discount_rule.usage_limit
         )
+
+
+class DiscountRedemption(BaseModel):
+    """a Model that records each use of a discount code by a customer"""
+
+    discount_code = models.ForeignKey(
+        DiscountCode,
+        on_delete=models.CASCADE,
+        related_name="redemptions",
+        related_query_name="redemption",
+    )
+    # the rule of the code, to redeem the once per customer rules once whatever the code
+    discount_rule = models.ForeignKey(
+        DiscountRule,
+        on_delete=models.CASCADE,
+        related_name="redemptions",
+        related_query_name="redemption",
+    )
+    profile = models.ForeignKey(
+        Profile,
+        on_delete=models.CASCADE,
+        related_name="discount_redemptions",
+        related_query_name="discount_redemption",
+    )
+    once_per_customer = models.BooleanField(
+        default=False,
+        help_text="The once per customer setting of the rule when the code was redeemed.",
+    )
+
+    class Meta:
+        db_table = "discount_redemption"
+        constraints = [
+            # a customer redeems a once per customer rule once
+            models.UniqueConstraint(
+                fields=["discount_rule", "profile"],
+                condition=models.Q(once_per_customer=True),
+                name="unique_once_per_customer_redemption",
+            )
+        ]
+        verbose_name = "Discount Redemption"
+        verbose_name_plural = "Discount Redemptions"
+
+    def __str__(self) -> str:
+        return f"{self.discount_code} redeemed by {self.profile}"
+
+
+class DiscountEntitlement(models.Model):
+    """
+    A denormalized read model holding a variant entitled to the discount of a rule
+
+    It is kept up to date by the signals of the discount app
+    (see `discount.entitlements.refresh_entitlements`),
+    so the discounted prices are read without expanding the rules per variant.
+    """
+
+    discount_rule = models.ForeignKey(
+        DiscountRule,
+        on_delete=models.CASCADE,
+        related_name="entitlements",
+        related_query_name="entitlement",
+    )
+    variant = models.ForeignKey(
+        ProductVariant,
+        on_delete=models.CASCADE,
+        related_name="discount_entitlements",
+        related_query_name="discount_entitlement",
+    )
+    # the time window of the rule
+    starts_at = models.DateTimeField()
+    ends_at = models.DateTimeField()
+    automatic = models.BooleanField(
+        default=False,
+        help_text=(
+            "The rule discounts a single unit of the variant without a code"
+            " or another condition (the discount shown on the product cards)."
+        ),
+    )
+    discount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        help_text="The discount of a unit of the variant at its current price.",
+    )
+
+    class Meta:
+        db_table = "discount_entitlement"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["variant", "discount_rule"],
+                name="unique_discount_entitlement",
+            )
+        ]
+        indexes = [
+            # the largest current discount of a variant
+            models.Index(
+                fields=["variant", "automatic", "-discount"],
+                name="discount_entitlement_idx",
+            ),
+        ]
+        verbose_name = "Discount Entitlement"
+        verbose_name_plural = "Discount Entitlements"
+
+    def __str__(self) -> str:
+        return f"{self.variant} entitled to {self.discount_rule}"
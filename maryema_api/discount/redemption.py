@@ -0,0 +1,89 @@
+"""
+This module contains the redemption of the discount codes
+
+A code is redeemed with one conditional
+`UPDATE ... SET usage_count = usage_count + 1 WHERE usage_count < <limit of its rule>
+AND starts_at <= now AND ends_at >= now`, so a code can't be used past its limit
+whatever the number of concurrent redemptions: the row lock makes them
+update the count one after the other, each checking the count left by the previous one.
+
+Each redemption is recorded in `DiscountRedemption`, in the same transaction.
+A rule used once per customer is enforced by a unique constraint on its redemptions
+(instead of looking for a previous redemption first), so two concurrent
+redemptions of the same customer can't both succeed.
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+
+from core.validation import SKIP
+from discount.models import DiscountCode, DiscountRedemption, DiscountRule
+
+
+class RedemptionError(Exception):
+    """Raised when a code can't be redeemed"""
+
+    def __init__(self, code: str, reason: str) -> None:
+        self.code = code
+        super().__init__(reason)
+
+
+def usage_limit() -> Subquery:
+    """The usage limit of the rule of the outer code"""
+    return Subquery(
+        DiscountRule.objects.filter(pk=OuterRef("discount_rule_id")).values(
+            "usage_limit"
+        )[:1]
+    )
+
+
+@transaction.atomic
+def redeem_code(code: str, profile_id, now=None) -> DiscountRedemption:
+    """
+    Redeems a code for a customer
+
+    Returns:
+        the recorded redemption
+    Raises:
+        RedemptionError: the code doesn't exist, is out of its time window,
+        reached its usage limit or was already used once by the customer
+    """
+    now = now or timezone.now()
+    found = (
+        DiscountCode.objects.filter(code=code)
+        .values_list("pk", "discount_rule_id", "discount_rule__once_per_customer")
+        .first()
+    )
+    if found is None:
+        raise RedemptionError(code, "Unknown discount code")
+    code_id, rule_id, once_per_customer = found
+    redemption = DiscountRedemption(
+        discount_code_id=code_id,
+        discount_rule_id=rule_id,
+        profile_id=profile_id,
+        once_per_customer=once_per_customer,
+    )
+    try:
+        # in a savepoint, so a duplicate doesn't break the outer transaction
+        with transaction.atomic():
+            redemption.save(force_insert=True, validation=SKIP)
+    except IntegrityError:
+        raise RedemptionError(code, "This discount can only be used once")
+    if not DiscountCode.objects.filter(
+        pk=code_id,
+        starts_at__lte=now,
+        ends_at__gte=now,
+        usage_count__lt=usage_limit(),
+    ).update(usage_count=F("usage_count") + 1, updated_at=now):
+        # the redemption is rolled back with the transaction
+        raise RedemptionError(code, "This discount code is not available")
+    return redemption
+
+
+def redeem_codes(codes, profile_id, now=None) -> list[DiscountRedemption]:
+    """Redeems several codes for a customer, all of them or none"""
+    now = now or timezone.now()
+    with transaction.atomic():
+        # in the order of the codes, so concurrent redemptions lock them in the same order
+        return [redeem_code(code, profile_id, now) for code in sorted(set(codes))]
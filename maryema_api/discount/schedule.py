@@ -0,0 +1,132 @@
+"""
+This module contains the scheduler moving the discount rules across their time windows
+
+The requests read the rules active now from the precomputed schedule
+(see `discount.engine.get_schedule`), the scheduler does what a rule
+starting or ending changes for the rest of the caches:
+
+- the products entitled to the rules which started or ended show a new sale price,
+  so their cached responses are invalidated
+- the codes usable now are read from the schedule too, the cached responses
+  of the products of the rules whose codes started or ended are invalidated
+- the entitlements of the expired rules are removed
+  and every process compiles the rules again without them
+- the new schedule is stored for the requests (warming the cache)
+
+It runs from cron or in a loop sleeping until the next boundary
+(see the `run_discount_schedule` command).
+"""
+
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from discount.engine import (
+    SCHEDULE_KEY,
+    Schedule,
+    compute_schedule,
+    invalidate_rule_set,
+)
+from discount.entitlements import forget_entitlements, refresh_entitlements
+from discount.models import DiscountCode, DiscountEntitlement
+
+# the active rules and codes of the last run
+LAST_RUN_KEY = "discount-schedule-last-run"
+LAST_RUN_CODES_KEY = "discount-schedule-last-run-codes"
+# the longest sleep of the loop, so the rules changed meanwhile are moved too
+MAX_INTERVAL = timedelta(minutes=5)
+MIN_INTERVAL = timedelta(seconds=1)
+
+
+@dataclass
+class Transitions:
+    """The rules moved across their boundaries by a run of the scheduler"""
+
+    schedule: Schedule
+    started: list = field(default_factory=list)
+    ended: list = field(default_factory=list)
+    expired: list = field(default_factory=list)
+    started_codes: list = field(default_factory=list)
+    ended_codes: list = field(default_factory=list)
+
+
+def run_schedule(now=None) -> Transitions:
+    """
+    Moves the rules and the codes which started or ended since the last run
+    and stores the new schedule
+
+    The first run moves all the active rules and codes (their products may be cached
+    without their sale price).
+    """
+    now = now or timezone.now()
+    schedule = compute_schedule(now)
+    previous = set(cache.get(LAST_RUN_KEY, ()))
+    previous_codes = set(cache.get(LAST_RUN_CODES_KEY, ()))
+    expired = set(
+        DiscountEntitlement.objects.filter(ends_at__lt=now)
+        .values_list("discount_rule_id", flat=True)
+        .distinct()
+    )
+    transitions = Transitions(
+        schedule,
+        started=sorted(schedule.active - previous, key=str),
+        ended=sorted(previous - schedule.active, key=str),
+        expired=sorted(expired, key=str),
+        started_codes=sorted(schedule.active_codes - previous_codes, key=str),
+        ended_codes=sorted(previous_codes - schedule.active_codes, key=str),
+    )
+    # the codes usable now are read from the stored schedule
+    moved = set(transitions.started) | code_rules(
+        transitions.started_codes + transitions.ended_codes
+    )
+    if moved:
+        forget_entitlements(moved)
+    if expired:
+        refresh_entitlements(expired, now=now)
+    if transitions.ended or expired:
+        # the compiled rules keep the rules which hadn't expired when compiled
+        invalidate_rule_set()
+    cache.set(SCHEDULE_KEY, schedule, timeout=None)
+    cache.set(LAST_RUN_KEY, list(schedule.active), timeout=None)
+    cache.set(LAST_RUN_CODES_KEY, list(schedule.active_codes), timeout=None)
+    return transitions
+
+
+def code_rules(code_ids: list) -> set:
+    """The ids of the rules of the codes"""
+    if not code_ids:
+        return set()
+    return set(
+        DiscountCode.objects.filter(pk__in=code_ids).values_list(
+            "discount_rule_id", flat=True
+        )
+    )
+
+
+def seconds_until_next_run(schedule: Schedule, now=None) -> float:
+    """The time to sleep until the next boundary, within the intervals"""
+    now = now or timezone.now()
+    wait = MAX_INTERVAL if schedule.until is None else schedule.until - now
+    return min(max(wait, MIN_INTERVAL), MAX_INTERVAL).total_seconds()
+
+
+def run_scheduler(runs: int | None = None, sleep=time.sleep, on_run=None) -> None:
+    """
+    Runs the scheduler in a loop, waking up at each boundary
+
+    Args:
+        runs: the number of runs, forever by default
+        on_run: called with the transitions of each run
+    """
+    while runs is None or runs > 0:
+        transitions = run_schedule()
+        if on_run is not None:
+            on_run(transitions)
+        if runs is not None:
+            runs -= 1
+            if not runs:
+                break
+        sleep(seconds_until_next_run(transitions.schedule))
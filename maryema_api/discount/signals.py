@@ -0,0 +1,156 @@
+from django.db.models import signals
+from django.dispatch import receiver
+
+from discount.engine import invalidate_rule_set, invalidate_schedule
+from discount.entitlements import (
+    forget_entitlements,
+    refresh_entitlements,
+    rules_entitling,
+)
+from discount.models import (
+    DiscountCode,
+    DiscountRule,
+    PrerequisiteToEntitlementQuantityRatio,
+)
+from product.models import Collection, ProductVariant
+
+# the many-to-many fields compiled into the matchers of the rules
+COMPILED_RELATIONS = [
+    DiscountRule.selected_customers.through,
+    DiscountRule.entitled_collection.through,
+    DiscountRule.entitled_products.through,
+    DiscountRule.entitled_variants.through,
+    DiscountRule.prerequisite_collections.through,
+    DiscountRule.prerequisite_products.through,
+    DiscountRule.prerequisite_variants.through,
+    Collection.products.through,
+]
+
+
+@receiver([signals.post_save, signals.post_delete], sender=DiscountRule)
+@receiver(
+    [signals.post_save, signals.post_delete],
+    sender=PrerequisiteToEntitlementQuantityRatio,
+)
+@receiver(signals.post_delete, sender=Collection)
+def invalidate_changed_rules(sender, **kwargs):
+    """Compiles the rules again after a change of a rule or of what it's made of"""
+    invalidate_rule_set()
+
+
+@receiver(signals.m2m_changed)
+def invalidate_rules_of_relations(sender, action, **kwargs):
+    """The entitlements, prerequisites, customers and collections of the rules"""
+    if sender in COMPILED_RELATIONS and action.startswith("post_"):
+        invalidate_rule_set()
+
+
+@receiver([signals.post_save, signals.post_delete], sender=DiscountCode)
+@receiver([signals.post_save, signals.post_delete], sender=ProductVariant)
+def invalidate_rules_of_new_objects(sender, instance, **kwargs):
+    """
+    A new or deleted code may make its rule apply only through codes or automatically,
+    a new or deleted variant may belong to the entitled or prerequisite products
+    """
+    if kwargs.get("created", True):
+        invalidate_rule_set(schedule=sender is DiscountCode)
+
+
+@receiver(signals.post_save, sender=DiscountCode)
+def invalidate_schedule_of_codes(sender, instance, created, **kwargs):
+    """The time window of an updated code may have changed (the new codes compile the rules)"""
+    if not created:
+        invalidate_schedule()
+
+
+# the many-to-many fields of the rules changing their entitlements
+ENTITLING_RELATIONS = COMPILED_RELATIONS[:-1]
+
+
+@receiver(signals.post_save, sender=DiscountRule)
+def refresh_rule_entitlements(sender, instance, **kwargs):
+    """Its values and time window are copied into its entitlements"""
+    refresh_entitlements([instance.pk])
+
+
+@receiver(signals.pre_delete, sender=DiscountRule)
+def forget_rule_entitlements(sender, instance, **kwargs):
+    forget_entitlements([instance.pk])
+
+
+@receiver(
+    [signals.post_save, signals.post_delete],
+    sender=PrerequisiteToEntitlementQuantityRatio,
+)
+def refresh_ratio_entitlements(sender, instance, origin=None, **kwargs):
+    """A Buy X Get Y rule isn't automatic"""
+    # not the ratio of a deleted rule
+    if not isinstance(origin, DiscountRule):
+        refresh_entitlements([instance.discount_rule_id])
+
+
+@receiver([signals.post_save, signals.post_delete], sender=DiscountCode)
+def refresh_code_entitlements(sender, instance, origin=None, **kwargs):
+    """A rule with codes isn't automatic, so the first and the last codes change it"""
+    if not kwargs.get("created", True) or isinstance(origin, DiscountRule):
+        # an updated code, or a code of a deleted rule
+        return
+    codes = DiscountCode.objects.filter(discount_rule_id=instance.discount_rule_id)
+    if not codes.exclude(pk=instance.pk).exists():
+        refresh_entitlements([instance.discount_rule_id])
+
+
+@receiver(signals.m2m_changed)
+def refresh_entitlements_of_relations(sender, instance, action, pk_set, **kwargs):
+    """The targets and conditions of the rules and the products of the collections"""
+    if not action.startswith("post_"):
+        return
+    if sender is Collection.products.through:
+        collection_ids = [instance.pk] if isinstance(instance, Collection) else pk_set
+        if collection_ids is None:
+            rules = DiscountRule.objects.filter(entitled_collection__isnull=False)
+        else:
+            rules = DiscountRule.objects.filter(entitled_collection__in=collection_ids)
+        refresh_entitlements(rules.values_list("pk", flat=True).distinct())
+    elif sender in ENTITLING_RELATIONS:
+        # the rules, or the reverse side cleared (all the rules then)
+        refresh_entitlements(
+            [instance.pk] if isinstance(instance, DiscountRule) else pk_set
+        )
+
+
+@receiver(signals.pre_delete, sender=Collection)
+def remember_collection_rules(sender, instance, **kwargs):
+    instance._discount_rule_ids = list(instance.discounts.values_list("pk", flat=True))
+
+
+@receiver(signals.post_delete, sender=Collection)
+def refresh_collection_entitlements(sender, instance, **kwargs):
+    refresh_entitlements(getattr(instance, "_discount_rule_ids", []))
+
+
+@receiver(signals.post_init, sender=ProductVariant)
+def remember_variant_entitlement(sender, instance, **kwargs):
+    """Remembers the product and the price of a loaded variant to detect changing them"""
+    # read through __dict__ to not trigger a query for deferred fields
+    instance._entitled_as = (
+        instance.__dict__.get("product_id"),
+        instance.__dict__.get("price"),
+    )
+
+
+@receiver(signals.post_save, sender=ProductVariant)
+def refresh_variant_entitlements(sender, instance, created, **kwargs):
+    """The rules of a new, repriced or moved variant, in one query when there are none"""
+    entitled_as = (instance.__dict__.get("product_id"), instance.__dict__.get("price"))
+    if created or instance._entitled_as != entitled_as:
+        rule_ids = rules_entitling([instance.product_id], [instance.pk])
+        if not created:
+            # and the rules of its previous product
+            rule_ids.extend(
+                instance.discount_entitlements.values_list(
+                    "discount_rule_id", flat=True
+                )
+            )
+        refresh_entitlements(rule_ids, ProductVariant.objects.filter(pk=instance.pk))
+    instance._entitled_as = entitled_as
@@ -0,0 +1,705 @@
+import io
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from profile.tests.factories import ProfileFactory
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from cart.models import CartItem
+from discount.codes import generate_codes, random_codes
+from discount.engine import (
+    SCHEDULE_KEY,
+    VERSION_KEY,
+    Line,
+    compile_rules,
+    get_rule_set,
+    get_schedule,
+    resolve_codes,
+)
+from discount.models import (
+    DiscountCode,
+    DiscountEntitlement,
+    DiscountRedemption,
+    DiscountRule,
+    PrerequisiteToEntitlementQuantityRatio,
+)
+from discount.redemption import RedemptionError, redeem_code, redeem_codes
+from discount.schedule import MAX_INTERVAL, run_schedule, run_scheduler
+from order.models import Order
+from product.models import Collection, Size
+from product.tests.factories import ProductFactory, VariantFactory
+
+
+def create_rule(**kwargs) -> DiscountRule:
+    now = timezone.now()
+    kwargs = {
+        "title": "Sale",
+        "value": 10,
+        "starts_at": now - timedelta(days=1),
+        "ends_at": now + timedelta(days=1),
+        **kwargs,
+    }
+    return DiscountRule.objects.create(**kwargs)
+
+
+def create_code(rule: DiscountRule, code: str) -> DiscountCode:
+    return DiscountCode.objects.create(
+        discount_rule=rule, code=code, starts_at=rule.starts_at, ends_at=rule.ends_at
+    )
+
+
+class DiscountEngineTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        size = Size.objects.create(name="M")
+        cls.product = ProductFactory()
+        cls.shirt = VariantFactory(
+            product=cls.product, size=size, price=100, cost=10, sort_order=1
+        )
+        cls.other_shirt = VariantFactory(
+            product=cls.product, size=size, price=80, cost=10, sort_order=2
+        )
+        cls.socks = VariantFactory(size=size, price=20, cost=10)
+        cls.collection = Collection.objects.create(name="Summer")
+        cls.collection.products.add(cls.product)
+
+    def setUp(self):
+        cache.clear()
+
+    def lines(self, *items) -> list[Line]:
+        return [
+            Line(variant.pk, quantity, variant.price) for variant, quantity in items
+        ]
+
+    def evaluate(self, *items, **kwargs):
+        return compile_rules().evaluate(self.lines(*items), **kwargs)
+
+    def selected(self, **kwargs) -> DiscountRule:
+        return create_rule(
+            target_selection=DiscountRule.SelectionChoices.SELECTED, **kwargs
+        )
+
+    def test_percentage_on_all_variants(self):
+        create_rule(value_type=DiscountRule.TypeChoices.PERCENTAGE, value=10)
+        evaluation = self.evaluate((self.shirt, 2), (self.socks, 1))
+        self.assertEqual(evaluation.subtotal, Decimal("220"))
+        self.assertEqual(evaluation.discount, Decimal("22"))
+        self.assertEqual(evaluation.total, Decimal("198"))
+
+    def test_collections_are_expanded_to_their_variants(self):
+        rule = self.selected(value=15)
+        rule.entitled_collection.add(self.collection)
+        evaluation = self.evaluate(
+            (self.shirt, 1), (self.other_shirt, 2), (self.socks, 3)
+        )
+        self.assertEqual(
+            evaluation.applied[0].lines,
+            {self.shirt.pk: Decimal("15"), self.other_shirt.pk: Decimal("30")},
+        )
+
+    def test_fixed_across_is_spread_once(self):
+        rule = self.selected(
+            value=18, allocation_method=DiscountRule.AllocationChoices.ACROSS
+        )
+        rule.entitled_products.add(self.product)
+        evaluation = self.evaluate((self.shirt, 1), (self.other_shirt, 1))
+        self.assertEqual(evaluation.discount, Decimal("18"))
+        self.assertEqual(evaluation.applied[0].lines[self.shirt.pk], Decimal("10"))
+
+    def test_allocation_limit_discounts_the_most_expensive_units(self):
+        rule = self.selected(value=50, allocation_limit=2)
+        rule.entitled_products.add(self.product)
+        evaluation = self.evaluate((self.shirt, 1), (self.other_shirt, 3))
+        self.assertEqual(
+            evaluation.applied[0].lines,
+            {self.shirt.pk: Decimal("50"), self.other_shirt.pk: Decimal("50")},
+        )
+
+    def test_thresholds(self):
+        create_rule(prerequisite_subtotal_range=200)
+        self.assertEqual(self.evaluate((self.shirt, 1)).applied, [])
+        self.assertEqual(self.evaluate((self.shirt, 2)).discount, Decimal("20"))
+
+    def test_selected_customers(self):
+        customer = ProfileFactory()
+        rule = create_rule(customer_selection=DiscountRule.SelectionChoices.SELECTED)
+        rule.selected_customers.add(customer)
+        self.assertEqual(self.evaluate((self.socks, 1)).applied, [])
+        evaluation = self.evaluate((self.socks, 1), customer_id=customer.pk)
+        self.assertEqual(evaluation.discount, Decimal("10"))
+
+    def test_buy_x_get_y(self):
+        rule = self.selected(value_type=DiscountRule.TypeChoices.PERCENTAGE, value=100)
+        rule.prerequisite_products.add(self.product)
+        rule.entitled_variants.add(self.socks)
+        PrerequisiteToEntitlementQuantityRatio.objects.create(
+            discount_rule=rule, prerequisite_quantity=2, entitled_quantity=1
+        )
+        self.assertEqual(self.evaluate((self.shirt, 1), (self.socks, 2)).applied, [])
+        evaluation = self.evaluate(
+            (self.shirt, 2), (self.other_shirt, 3), (self.socks, 5)
+        )
+        self.assertEqual(evaluation.applied[0].lines, {self.socks.pk: Decimal("40")})
+
+    def test_buy_x_get_y_of_the_same_variant(self):
+        rule = self.selected(value_type=DiscountRule.TypeChoices.PERCENTAGE, value=100)
+        rule.prerequisite_variants.add(self.socks)
+        rule.entitled_variants.add(self.socks)
+        PrerequisiteToEntitlementQuantityRatio.objects.create(
+            discount_rule=rule, prerequisite_quantity=2, entitled_quantity=1
+        )
+        self.assertEqual(self.evaluate((self.socks, 2)).applied, [])
+        self.assertEqual(self.evaluate((self.socks, 3)).discount, Decimal("20"))
+
+    def test_best_combination(self):
+        everything = create_rule(
+            value_type=DiscountRule.TypeChoices.PERCENTAGE, value=10, title="all"
+        )
+        shirts = self.selected(
+            value=30,
+            title="shirts",
+            allocation_method=DiscountRule.AllocationChoices.ACROSS,
+        )
+        shirts.entitled_products.add(self.product)
+        socks = self.selected(value=5, title="socks")
+        socks.entitled_variants.add(self.socks)
+        evaluation = self.evaluate((self.shirt, 1), (self.socks, 1))
+        # shirts (30) and socks (5) beat all (12)
+        self.assertEqual(
+            {applied.rule.id for applied in evaluation.applied}, {shirts.pk, socks.pk}
+        )
+        self.assertEqual(evaluation.discount, Decimal("35"))
+        # all (52) beats shirts (30) and socks (5)
+        evaluation = self.evaluate((self.shirt, 5), (self.socks, 1))
+        self.assertEqual([a.rule.id for a in evaluation.applied], [everything.pk])
+
+    def test_rules_with_codes_need_one(self):
+        rule = create_rule()
+        create_code(rule, "SUMMER")
+        self.assertEqual(self.evaluate((self.shirt, 1)).applied, [])
+        evaluation = self.evaluate((self.shirt, 1), codes={"SUMMER": rule.pk})
+        self.assertEqual(evaluation.applied[0].code, "SUMMER")
+
+    def test_inactive_rules_are_skipped(self):
+        create_rule(starts_at=timezone.now() + timedelta(hours=1))
+        self.assertEqual(self.evaluate((self.shirt, 1)).applied, [])
+
+    def test_compiled_in_a_fixed_number_of_queries(self):
+        for _ in range(3):
+            rule = self.selected()
+            rule.entitled_collection.add(self.collection)
+            rule.prerequisite_variants.add(self.socks)
+        # the rules, 6 relations, the products of the collections,
+        # the variants of the products, the customers and the codes
+        with self.assertNumQueries(11):
+            compile_rules()
+
+    def test_compiled_again_only_after_a_change(self):
+        rule = self.selected()
+        get_rule_set()
+        with self.assertNumQueries(0):
+            get_rule_set()
+        rule.entitled_collection.add(self.collection)
+        self.assertEqual(
+            get_rule_set().rules[rule.pk].entitled,
+            {self.shirt.pk, self.other_shirt.pk},
+        )
+        self.collection.products.add(self.socks.product)
+        self.assertIn(self.socks.pk, get_rule_set().rules[rule.pk].entitled)
+        new = VariantFactory(
+            product=self.product, size=self.socks.size, cost=10, sort_order=3
+        )
+        self.assertIn(new.pk, get_rule_set().rules[rule.pk].entitled)
+        create_code(rule, "CODE")
+        self.assertTrue(get_rule_set().rules[rule.pk].has_codes)
+
+
+class CartDiscountsViewTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        size = Size.objects.create(name="M")
+        cls.variant = VariantFactory(size=size, price=100, cost=10)
+        cls.customer = ProfileFactory()
+        cls.cart = cls.customer.carts.get(is_active=True)
+        CartItem.objects.create(cart=cls.cart, product_variant=cls.variant, quantity=2)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=self.customer.user)
+
+    def test_evaluates_the_cart(self):
+        rule = create_rule(value=10)
+        create_code(rule, "TEN")
+        create_rule(
+            value_type=DiscountRule.TypeChoices.PERCENTAGE, value=5, title="Automatic"
+        )
+        response = self.client.get("/api/cart/discounts/", {"codes": "TEN,NOPE"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["subtotal"], "200.00")
+        self.assertEqual(response.data["discount"], "20.00")
+        self.assertEqual(response.data["total"], "180.00")
+        self.assertEqual(response.data["discounts"][0]["code"], "TEN")
+        self.assertEqual(response.data["rejected_codes"], ["NOPE"])
+
+    def test_queries_do_not_grow_with_the_items(self):
+        create_rule()
+        for _ in range(5):
+            CartItem.objects.create(
+                cart=self.cart,
+                product_variant=VariantFactory(size=self.variant.size),
+            )
+        self.client.get("/api/cart/discounts/", {"codes": "X"})
+        # the cart, the codes and the items
+        with self.assertNumQueries(3):
+            self.client.get("/api/cart/discounts/", {"codes": "X"})
+
+
+class RedemptionTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.rule = create_rule(usage_limit=2)
+        cls.code = create_code(cls.rule, "TWICE")
+        cls.customers = ProfileFactory.create_batch(3)
+
+    def test_counts_the_uses(self):
+        redemption = redeem_code("TWICE", self.customers[0].pk)
+        self.assertEqual(redemption.discount_rule_id, self.rule.pk)
+        redeem_code("TWICE", self.customers[0].pk)
+        with self.assertRaisesMessage(RedemptionError, "not available"):
+            redeem_code("TWICE", self.customers[1].pk)
+        self.code.refresh_from_db()
+        self.assertEqual(self.code.usage_count, 2)
+        # the refused redemption was rolled back
+        self.assertEqual(DiscountRedemption.objects.count(), 2)
+
+    def test_in_a_fixed_number_of_queries(self):
+        # the code, the redemption and the conditional update, in their savepoints
+        with self.assertNumQueries(7):
+            redeem_code("TWICE", self.customers[0].pk)
+
+    def test_out_of_its_time_window(self):
+        with self.assertRaises(RedemptionError):
+            redeem_code(
+                "TWICE", self.customers[0].pk, now=self.code.ends_at + timedelta(1)
+            )
+        self.assertFalse(DiscountRedemption.objects.exists())
+
+    def test_unknown_code(self):
+        with self.assertRaisesMessage(RedemptionError, "Unknown"):
+            redeem_code("NOPE", self.customers[0].pk)
+
+    def test_once_per_customer(self):
+        self.rule.once_per_customer = True
+        self.rule.usage_limit = 10
+        self.rule.save()
+        other = create_code(self.rule, "OTHER")
+        redeem_code("TWICE", self.customers[0].pk)
+        # whatever the code of the rule
+        with self.assertRaisesMessage(RedemptionError, "only be used once"):
+            redeem_code(other.code, self.customers[0].pk)
+        redeem_code(other.code, self.customers[1].pk)
+        other.refresh_from_db()
+        self.assertEqual(other.usage_count, 1)
+
+    def test_all_codes_or_none(self):
+        single = create_code(create_rule(usage_limit=1), "SINGLE")
+        redeem_code("SINGLE", self.customers[0].pk)
+        with self.assertRaises(RedemptionError):
+            redeem_codes(["TWICE", "SINGLE"], self.customers[1].pk)
+        self.code.refresh_from_db()
+        single.refresh_from_db()
+        self.assertEqual((self.code.usage_count, single.usage_count), (0, 1))
+
+    def test_is_active(self):
+        self.assertTrue(self.code.is_active)
+        self.code.usage_count = 2
+        self.assertFalse(self.code.is_active)
+
+
+class CheckoutWithCodesTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        size = Size.objects.create(name="M")
+        cls.variant = VariantFactory(size=size, price=100, cost=10, quantity=10)
+        cls.rule = create_rule(value=15)
+        create_code(cls.rule, "FIFTEEN")
+        cls.customer = ProfileFactory()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=self.customer.user)
+        CartItem.objects.create(
+            cart=self.customer.carts.get(is_active=True),
+            product_variant=self.variant,
+            quantity=2,
+        )
+
+    def test_redeems_the_codes(self):
+        response = self.client.post(
+            "/api/cart/checkout/", {"codes": ["FIFTEEN"]}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        order = Order.objects.get()
+        self.assertEqual(order.total, Decimal("170"))
+        self.assertEqual(
+            list(order.discount_codes.values_list("code", flat=True)), ["FIFTEEN"]
+        )
+        self.assertEqual(DiscountCode.objects.get().usage_count, 1)
+
+    def test_refuses_the_codes_not_applying(self):
+        response = self.client.post(
+            "/api/cart/checkout/", {"codes": ["NOPE"]}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["codes"], ["NOPE"])
+        self.assertFalse(Order.objects.exists())
+        # the deactivation of the cart is rolled back
+        self.assertTrue(self.customer.carts.get(is_active=True).items.exists())
+
+    def test_used_code_cancels_the_checkout(self):
+        DiscountCode.objects.update(usage_count=1)
+        response = self.client.post(
+            "/api/cart/checkout/", {"codes": ["FIFTEEN"]}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(Order.objects.exists())
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.quantity, 10)
+
+
+class GenerateCodesTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.rule = create_rule()
+
+    def test_random_codes(self):
+        codes = random_codes(500, "AB12", 12, prefix="X-")
+        self.assertEqual(len(codes), 500)
+        for code in codes:
+            self.assertRegex(code, r"^X-[AB12]{12}$")
+
+    def test_creates_unique_codes(self):
+        codes = generate_codes(self.rule, 1200, batch_size=500)
+        self.assertEqual(len(set(codes)), 1200)
+        self.assertEqual(self.rule.discountcode_set.count(), 1200)
+        code = DiscountCode.objects.get(code=codes[0])
+        self.assertEqual(code.starts_at, self.rule.starts_at)
+        self.assertEqual(len(code.code), 10)
+
+    def test_batches_in_a_fixed_number_of_queries(self):
+        # per batch: the taken codes, the insert and the inserted codes (in a savepoint)
+        with patch("discount.codes.refresh_entitlements") as refresh:
+            with self.assertNumQueries(2 * 5):
+                generate_codes(self.rule, 100, batch_size=50)
+        refresh.assert_called_once_with([self.rule.pk])
+
+    def test_taken_codes_are_replaced(self):
+        create_code(self.rule, "TAKEN")
+        batches = iter([{"TAKEN", "FIRST"}, {"SECOND"}])
+        with patch("discount.codes.random_codes", lambda *args: next(batches)):
+            codes = generate_codes(self.rule, 2)
+        self.assertEqual(sorted(codes), ["FIRST", "SECOND"])
+
+    def test_refuses_a_too_small_space(self):
+        with self.assertRaises(ValueError):
+            generate_codes(self.rule, 1000, length=4, alphabet="AB")
+
+    def test_makes_the_rule_need_a_code(self):
+        cache.clear()
+        self.assertFalse(get_rule_set().rules[self.rule.pk].has_codes)
+        generate_codes(self.rule, 1)
+        self.assertTrue(get_rule_set().rules[self.rule.pk].has_codes)
+
+    def test_command(self):
+        out = io.StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "codes.txt")
+            call_command(
+                "generate_discount_codes",
+                str(self.rule.pk),
+                "30",
+                "--prefix=VIP",
+                f"--output={path}",
+                stdout=out,
+            )
+            with open(path) as file:
+                codes = file.read().split()
+        self.assertIn("Generated 30 codes", out.getvalue())
+        self.assertEqual(
+            set(codes), set(DiscountCode.objects.values_list("code", flat=True))
+        )
+        with self.assertRaises(CommandError):
+            call_command(
+                "generate_discount_codes", str(self.rule.pk), "9", "--length=1"
+            )
+
+
+class EntitlementIndexTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.size = Size.objects.create(name="M")
+        cls.product = ProductFactory()
+        cls.shirt = VariantFactory(
+            product=cls.product, size=cls.size, price=100, cost=10, sort_order=1
+        )
+        cls.other_shirt = VariantFactory(
+            product=cls.product, size=cls.size, price=80, cost=10, sort_order=2
+        )
+        cls.socks = VariantFactory(size=cls.size, price=20, cost=10)
+        cls.collection = Collection.objects.create(name="Summer")
+        cls.collection.products.add(cls.product)
+
+    def setUp(self):
+        cache.clear()
+        # precomputed by the scheduler, not by the requests
+        get_schedule()
+
+    def entitlements(self, rule) -> dict:
+        return {
+            entitlement.variant_id: (entitlement.discount, entitlement.automatic)
+            for entitlement in DiscountEntitlement.objects.filter(discount_rule=rule)
+        }
+
+    def collection_rule(self, **kwargs) -> DiscountRule:
+        rule = create_rule(
+            target_selection=DiscountRule.SelectionChoices.SELECTED, **kwargs
+        )
+        rule.entitled_collection.add(self.collection)
+        return rule
+
+    def test_rules_are_expanded_to_their_variants(self):
+        rule = self.collection_rule(
+            value_type=DiscountRule.TypeChoices.PERCENTAGE, value=15
+        )
+        self.assertEqual(
+            self.entitlements(rule),
+            {
+                self.shirt.pk: (Decimal("15.00"), True),
+                self.other_shirt.pk: (Decimal("12.00"), True),
+            },
+        )
+        everything = create_rule(value=30, prerequisite_subtotal_range=50)
+        self.assertEqual(
+            self.entitlements(everything),
+            {
+                self.shirt.pk: (Decimal("30.00"), False),
+                self.other_shirt.pk: (Decimal("30.00"), False),
+                self.socks.pk: (Decimal("20.00"), False),
+            },
+        )
+
+    def test_refreshed_by_the_changes(self):
+        rule = self.collection_rule(
+            value_type=DiscountRule.TypeChoices.PERCENTAGE, value=10
+        )
+        hat = ProductFactory()
+        self.collection.products.add(hat)
+        hat_variant = VariantFactory(product=hat, size=self.size, price=50, cost=10)
+        self.assertIn(hat_variant.pk, self.entitlements(rule))
+        hat.collections.remove(self.collection)
+        self.assertNotIn(hat_variant.pk, self.entitlements(rule))
+
+        self.shirt.price = 50
+        self.shirt.save()
+        self.assertEqual(self.entitlements(rule)[self.shirt.pk], (Decimal("5"), True))
+        socks_rule = create_rule(
+            target_selection=DiscountRule.SelectionChoices.SELECTED, value=5
+        )
+        socks_rule.entitled_variants.add(self.socks)
+        self.assertEqual(self.entitlements(socks_rule), {self.socks.pk: (5, True)})
+
+        code = create_code(rule, "SUMMER")
+        self.assertFalse(
+            any(automatic for _, automatic in self.entitlements(rule).values())
+        )
+        code.delete()
+        self.assertTrue(
+            all(automatic for _, automatic in self.entitlements(rule).values())
+        )
+
+        rule.ends_at = timezone.now() - timedelta(hours=1)
+        rule.save()
+        self.assertEqual(self.entitlements(rule), {})
+        rule.delete()
+        self.assertEqual(
+            set(DiscountEntitlement.objects.values_list("discount_rule", flat=True)),
+            {socks_rule.pk},
+        )
+
+    def test_sale_price_of_the_variants(self):
+        self.client.force_authenticate(user=ProfileFactory(admin=True).user)
+        self.collection_rule(value=10)
+        self.collection_rule(value_type=DiscountRule.TypeChoices.PERCENTAGE, value=20)
+        # not shown: conditional, with codes, or not started
+        create_rule(value=50, prerequisite_quantity_range=2)
+        create_code(create_rule(value=50), "HALF")
+        create_rule(value=50, starts_at=timezone.now() + timedelta(days=1))
+        # precomputed by the scheduler once the rules changed
+        get_schedule()
+        # the count and the page
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/variants/")
+        prices = {
+            variant["id"]: variant["sale_price"] for variant in response.data["results"]
+        }
+        self.assertEqual(
+            prices,
+            {
+                str(self.shirt.pk): "80.00",
+                str(self.other_shirt.pk): "64.00",
+                str(self.socks.pk): "20.00",
+            },
+        )
+        response = self.client.get(f"/api/variants/{self.other_shirt.pk}/")
+        self.assertEqual(response.data["sale_price"], "64.00")
+
+    def test_sale_price_of_a_wishlist(self):
+        admin = ProfileFactory(admin=True).user
+        self.client.force_authenticate(user=admin)
+        customer = ProfileFactory()
+        customer.wishlist.add(self.shirt)
+        self.collection_rule(value=10)
+        url = f"/api/users/{customer.user.pk}/wishlist/"
+        self.client.get(url)
+        # the user, its profile and the variants
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        customer.wishlist.add(self.other_shirt, self.socks)
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(
+            {variant["id"]: variant["sale_price"] for variant in response.data},
+            {
+                str(self.shirt.pk): "90.00",
+                str(self.other_shirt.pk): "70.00",
+                str(self.socks.pk): "20.00",
+            },
+        )
+
+    def test_sale_price_of_the_products(self):
+        self.collection_rule(value=10)
+        response = self.client.get("/api/products/")
+        prices = {
+            product["id"]: (product["price"], product["sale_price"])
+            for product in response.data["results"]
+        }
+        self.assertEqual(prices[str(self.product.pk)], (Decimal(100), Decimal(90)))
+        self.assertEqual(prices[str(self.socks.product_id)], (Decimal(20), Decimal(20)))
+        response = self.client.get(f"/api/products/{self.product.pk}/")
+        self.assertEqual(
+            {
+                variant["id"]: variant["sale_price"]
+                for variant in response.data["variants"]
+            },
+            {str(self.shirt.pk): "90.00", str(self.other_shirt.pk): "70.00"},
+        )
+
+
+class ScheduleTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        size = Size.objects.create(name="M")
+        cls.variant = VariantFactory(size=size, price=100, cost=10)
+        now = timezone.now()
+        cls.active = create_rule(ends_at=now + timedelta(hours=2))
+        cls.future = create_rule(starts_at=now + timedelta(hours=1))
+        cls.expired = create_rule(
+            starts_at=now - timedelta(days=2), ends_at=now - timedelta(days=1)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_computed_once_until_the_next_boundary(self):
+        schedule = get_schedule()
+        self.assertEqual(schedule.active, {self.active.pk})
+        self.assertEqual(schedule.until, self.future.starts_at)
+        with self.assertNumQueries(0):
+            get_schedule()
+        later = get_schedule(self.future.starts_at + timedelta(minutes=1))
+        self.assertEqual(later.active, {self.active.pk, self.future.pk})
+        self.assertEqual(later.until, self.active.ends_at)
+
+    def test_forgotten_by_the_changes_of_the_rules(self):
+        get_schedule()
+        self.active.ends_at = timezone.now() - timedelta(minutes=1)
+        self.active.save()
+        self.assertEqual(get_schedule().active, set())
+
+    def test_evaluation_reads_the_active_rules(self):
+        lines = [Line(self.variant.pk, 1, self.variant.price)]
+        rule_set = compile_rules()
+        self.assertEqual(rule_set.evaluate(lines).discount, Decimal(10))
+        self.assertEqual(rule_set.evaluate(lines, active=frozenset()).discount, 0)
+
+    def test_run_moves_the_rules(self):
+        product_ids = [self.variant.product_id]
+        with patch("discount.entitlements.invalidate_responses") as invalidate:
+            transitions = run_schedule()
+        # the first run moves all the active rules
+        self.assertEqual(transitions.started, [self.active.pk])
+        invalidate.assert_called_once_with("product", set(product_ids))
+
+        now = self.future.starts_at + timedelta(minutes=1)
+        transitions = run_schedule(now)
+        self.assertEqual(transitions.started, [self.future.pk])
+        self.assertEqual(cache.get(SCHEDULE_KEY), transitions.schedule)
+
+        version = cache.get(VERSION_KEY)
+        now = self.active.ends_at + timedelta(minutes=1)
+        transitions = run_schedule(now)
+        self.assertEqual(transitions.ended, [self.active.pk])
+        self.assertEqual(transitions.expired, [self.active.pk])
+        self.assertFalse(self.active.entitlements.exists())
+        self.assertTrue(self.future.entitlements.exists())
+        self.assertNotEqual(cache.get(VERSION_KEY), version)
+        self.assertEqual(get_schedule(now).active, {self.future.pk})
+
+    def test_codes_are_read_from_the_schedule(self):
+        code = create_code(self.active, "LATER")
+        code.starts_at = timezone.now() + timedelta(minutes=30)
+        code.save()
+        self.assertEqual(resolve_codes(["LATER"]), {})
+        schedule = get_schedule()
+        self.assertEqual(schedule.until, code.starts_at)
+        # no time window is checked by the request
+        with self.assertNumQueries(1):
+            resolve_codes(["LATER"])
+        later = code.starts_at + timedelta(minutes=1)
+        self.assertEqual(resolve_codes(["LATER"], later), {"LATER": self.active.pk})
+
+    def test_run_moves_the_codes(self):
+        code = create_code(self.future, "FUTURE")
+        transitions = run_schedule()
+        self.assertEqual(transitions.started_codes, [])
+        with patch("discount.entitlements.invalidate_responses") as invalidate:
+            transitions = run_schedule(code.starts_at + timedelta(minutes=1))
+        self.assertEqual(transitions.started_codes, [code.pk])
+        invalidate.assert_called_once_with("product", {self.variant.product_id})
+        transitions = run_schedule(code.ends_at + timedelta(minutes=1))
+        self.assertEqual(transitions.ended_codes, [code.pk])
+        self.assertEqual(transitions.schedule.active_codes, set())
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command("run_discount_schedule", stdout=out)
+        self.assertIn("1 active discount rules (1 started", out.getvalue())
+
+    def test_loop_sleeps_until_the_next_boundary(self):
+        sleeps = []
+        run_scheduler(runs=2, sleep=sleeps.append)
+        # the future rule starts in an hour
+        self.assertEqual(sleeps, [MAX_INTERVAL.total_seconds()])
+        self.future.starts_at = timezone.now() + timedelta(minutes=1)
+        self.future.save()
+        run_scheduler(runs=2, sleep=sleeps.append)
+        self.assertLessEqual(sleeps[1], 60)
+        self.assertGreater(sleeps[1], 50)
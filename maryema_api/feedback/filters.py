@@ -0,0 +1,27 @@
+from django.db.models import Q
+from django_filters import rest_framework as filters
+
+from feedback.models import Feedback
+
+
+class FeedbackFilter(filters.FilterSet):
+    """
+    The filters of the feedbacks of a product
+
+    The rate filters are served by the timeline index of the feedbacks,
+    `has_comment=true` by its partial index on the commented feedbacks.
+    """
+
+    rate = filters.NumberFilter(help_text="The exact rate (0 for no rate)")
+    min_rate = filters.NumberFilter(
+        field_name="rate", lookup_expr="gte", help_text="The lowest rate"
+    )
+    has_comment = filters.BooleanFilter(method="filter_has_comment")
+
+    class Meta:
+        model = Feedback
+        fields = ["rate", "min_rate", "has_comment"]
+
+    def filter_has_comment(self, queryset, name, value):
+        commented = ~Q(comment="")
+        return queryset.filter(commented if value else ~commented)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from feedback.services import rebuild_product_ratings
+
+
+class Command(BaseCommand):
+    help = "Recomputes the rating aggregates of all the products from their feedbacks"
+
+    def handle(self, *args, **options):
+        count = rebuild_product_ratings()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} product ratings"))
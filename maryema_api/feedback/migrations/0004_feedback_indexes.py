@@ -0,0 +1,21 @@
+# Generated by Django 5.1.15 on 2026-10-18 12:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feedback", "0003_alter_feedback_rate"),
+        ("product", "0016_productvariant_indexes"),
+        ("profile", "0003_alter_profile_wishlist"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="feedback",
+            index=models.Index(
+                fields=["product", "-rate"], name="feedback_product_rate_idx"
+            ),
+        ),
+    ]
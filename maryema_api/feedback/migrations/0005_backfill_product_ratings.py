@@ -0,0 +1,49 @@
+# Generated by Django 5.1.15 on 2026-10-18 12:49
+
+from django.db import migrations
+from django.db.models import Count, F, FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+
+def backfill_product_ratings(apps, schema_editor):
+    """Computes the ratings of the existing listings from their feedbacks"""
+    Feedback = apps.get_model("feedback", "Feedback")
+    ProductListing = apps.get_model("product", "ProductListing")
+
+    def rates(**filters):
+        return (
+            Feedback.objects.filter(
+                product=OuterRef("product_id"), rate__gt=0, **filters
+            )
+            .order_by()
+            .values("product")
+        )
+
+    def count(**filters):
+        return Coalesce(
+            Subquery(rates(**filters).annotate(n=Count("pk")).values("n")), 0
+        )
+
+    ProductListing.objects.update(
+        rating_count=count(),
+        rating_sum=Coalesce(Subquery(rates().annotate(s=Sum("rate")).values("s")), 0),
+        **{f"rating_{rate}": count(rate=rate) for rate in range(1, 6)},
+    )
+    ProductListing.objects.update(
+        rating_average=Coalesce(
+            Cast(F("rating_sum"), FloatField()) / NullIf(F("rating_count"), Value(0)),
+            Value(0.0),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feedback", "0004_feedback_indexes"),
+        ("product", "0018_productlisting_ratings"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_product_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.15 on 2026-10-18 12:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feedback", "0005_backfill_product_ratings"),
+        ("product", "0018_productlisting_ratings"),
+        ("profile", "0003_alter_profile_wishlist"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="feedback",
+            name="feedback_product_rate_idx",
+        ),
+        migrations.AddIndex(
+            model_name="feedback",
+            index=models.Index(
+                fields=["product", "-rate", "-created_at", "-id"],
+                name="feedback_product_timeline_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="feedback",
+            index=models.Index(
+                condition=models.Q(("comment", ""), _negated=True),
+                fields=["product", "-rate", "-created_at", "-id"],
+                name="feedback_commented_idx",
+            ),
+        ),
+    ]
@@ -5,6 +5,7 @@ from profile.models import Profile
 
 from django.core.validators import MaxValueValidator
 from django.db import models
+from django.db.models import Q
 
 from core.models import BaseModel
 from product.models import Product
@@ -54,6 +55,20 @@ class Feedback(BaseModel):
         verbose_name = "Feedback"
         verbose_name_plural = "Feedbacks"
         db_table = "feedback"
+        indexes = [
+            # the feedbacks of a product, best rated then latest first
+            # (the keyset pagination of the product feedbacks)
+            models.Index(
+                fields=["product", "-rate", "-created_at", "-id"],
+                name="feedback_product_timeline_idx",
+            ),
+            # the same for the feedbacks with a comment
+            models.Index(
+                fields=["product", "-rate", "-created_at", "-id"],
+                condition=~Q(comment=""),
+                name="feedback_commented_idx",
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=["customer", "product"], name="unique_feedback"
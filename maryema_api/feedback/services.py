@@ -0,0 +1,117 @@
+"""
+This module contains the maintenance of the rating aggregates of the products
+
+The number, the sum, the average and the count of each star of the rates of a product
+are kept on its listing, so the products are shown and sorted by rating
+without aggregating their feedbacks.
+
+They are adjusted by each change of a feedback in a single UPDATE
+(see `add_to_product_rating`), `rebuild_product_ratings` recomputes them.
+A feedback rated 0 has no rate, so it isn't counted.
+"""
+
+from collections import Counter
+
+from django.db.models import (
+    Count,
+    F,
+    FloatField,
+    OuterRef,
+    QuerySet,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Cast, Coalesce, NullIf
+from django.utils import timezone
+
+from feedback.models import Feedback
+from product.models import ProductListing
+
+STARS = range(1, 6)
+
+
+def average(count, total) -> Coalesce:
+    """The average rate of a count and a sum of rates, 0 without rates"""
+    return Coalesce(
+        Cast(total, FloatField()) / NullIf(count, Value(0)),
+        Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+def add_to_product_rating(product_id, *changes: tuple[int, int]) -> bool:
+    """
+    Applies changes of rates to the rating of a product in a single UPDATE
+
+    Args:
+        changes: (rate, delta) pairs, the delta is 1 for an added rate and -1 for a removed one
+    Returns:
+        False if the changes cancel each other, so nothing was updated
+    """
+    stars = Counter()
+    for rate, delta in changes:
+        if rate:
+            stars[rate] += delta
+    stars = {rate: delta for rate, delta in stars.items() if delta}
+    if not stars:
+        return False
+    count = F("rating_count") + Value(sum(stars.values()))
+    total = F("rating_sum") + Value(sum(rate * delta for rate, delta in stars.items()))
+    ProductListing.objects.filter(product_id=product_id).update(
+        rating_count=count,
+        rating_sum=total,
+        rating_average=average(count, total),
+        updated_at=timezone.now(),
+        **{
+            f"rating_{rate}": F(f"rating_{rate}") + delta
+            for rate, delta in stars.items()
+        },
+    )
+    return True
+
+
+def rates_of_product(**filters) -> QuerySet:
+    """The rates of the product of the outer listing"""
+    return (
+        Feedback.objects.filter(product=OuterRef("product_id"), rate__gt=0, **filters)
+        .order_by()
+        .values("product")
+    )
+
+
+def rating_values() -> dict:
+    """The rating fields of the outer listing computed from its feedbacks"""
+    count = Coalesce(
+        Subquery(rates_of_product().annotate(n=Count("pk")).values("n")), 0
+    )
+    total = Coalesce(
+        Subquery(rates_of_product().annotate(s=Sum("rate")).values("s")), 0
+    )
+    stars = {
+        f"rating_{rate}": Coalesce(
+            Subquery(rates_of_product(rate=rate).annotate(n=Count("pk")).values("n")),
+            0,
+        )
+        for rate in STARS
+    }
+    return {
+        "rating_count": count,
+        "rating_sum": total,
+        "rating_average": average(count, total),
+        **stars,
+    }
+
+
+def rebuild_product_ratings(listings: QuerySet | None = None) -> int:
+    """
+    Recomputes the ratings of the listings from the feedbacks
+
+    Args:
+        listings: the listings to recompute, all of them by default
+    Returns:
+        the number of the listings recomputed
+    """
+    if listings is None:
+        listings = ProductListing.objects.all()
+    return listings.update(updated_at=timezone.now(), **rating_values())
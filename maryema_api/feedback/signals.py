@@ -0,0 +1,53 @@
+from django.db.models import signals
+from django.dispatch import receiver
+
+from core.cache import invalidate_responses
+from feedback.models import Feedback
+from feedback.services import add_to_product_rating
+
+
+@receiver(signals.post_init, sender=Feedback)
+def remember_feedback_rate(sender, instance, **kwargs):
+    """Remembers the loaded product and rate of a feedback to apply the changes"""
+    # read through __dict__ to not trigger a query for deferred fields
+    instance._loaded = (
+        instance.__dict__.get("product_id"),
+        instance.__dict__.get("rate") or 0,
+    )
+
+
+@receiver([signals.post_save, signals.post_delete], sender=Feedback)
+def invalidate_feedback_responses(sender, instance, **kwargs):
+    """
+    Invalidates the cached first pages of the feedbacks of the product (see ProductViewSet)
+
+    Connected before `update_product_rating`, which replaces the loaded product.
+    """
+    product_ids = {instance._loaded[0], instance.product_id} - {None}
+    invalidate_responses("product-feedback", product_ids, list_=False)
+
+
+@receiver(signals.post_save, sender=Feedback)
+def update_product_rating(sender, instance, created, **kwargs):
+    """Applies the change of the rate of the feedback to the rating of its product"""
+    loaded = (instance.product_id, instance.rate)
+    product_id, rate = instance._loaded if not created else (None, 0)
+    instance._loaded = loaded
+    if product_id is None or product_id == instance.product_id:
+        changed = add_to_product_rating(
+            instance.product_id, (rate, -1), (instance.rate, 1)
+        )
+    else:
+        # moved to another product
+        changed = add_to_product_rating(product_id, (rate, -1))
+        changed |= add_to_product_rating(instance.product_id, (instance.rate, 1))
+    if changed:
+        invalidate_responses("product", {product_id, instance.product_id} - {None})
+
+
+@receiver(signals.post_delete, sender=Feedback)
+def remove_from_product_rating(sender, instance, **kwargs):
+    """Removes the rate of a deleted feedback from the rating of its product"""
+    product_id, rate = instance._loaded
+    if add_to_product_rating(product_id, (rate, -1)):
+        invalidate_responses("product", [product_id])
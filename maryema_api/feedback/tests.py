@@ -1,13 +1,18 @@
+import io
 import uuid
 from datetime import datetime
 from profile.models import Profile
+from profile.tests.factories import ProfileFactory
 
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
 from feedback.models import Feedback
-from product.models import Category, Division, Product
+from product.models import Category, Division, Product, ProductListing
 
 
 class FeedbackModelTest(TestCase):
@@ -307,3 +312,80 @@ class FeedbackModelTest(TestCase):
         self.assertEqual(Feedback.objects.count(), 3)
         self.product.delete()
         self.assertEqual(Feedback.objects.count(), 0)
+
+
+class ProductRatingTestCase(TestCase):
+    """A test suit for the rating aggregates kept on the product listings"""
+
+    @classmethod
+    def setUpTestData(cls):
+        division = Division.objects.create(name="test division")
+        category = Category.objects.create(division=division, name="test category")
+        cls.product = Product.objects.create(category=category, name="test product")
+        cls.other = Product.objects.create(category=category, name="other product")
+        cls.customers = ProfileFactory.create_batch(3)
+
+    def rating(self, product=None) -> tuple:
+        listing = ProductListing.objects.get(product=product or self.product)
+        return (
+            listing.rating_count,
+            listing.rating_sum,
+            listing.rating_average,
+            [getattr(listing, f"rating_{stars}") for stars in range(1, 6)],
+        )
+
+    def rate(self, customer, rate, product=None) -> Feedback:
+        return Feedback.objects.create(
+            customer=customer, product=product or self.product, rate=rate
+        )
+
+    def test_created_feedbacks_are_counted(self) -> None:
+        self.rate(self.customers[0], 5)
+        self.rate(self.customers[1], 4)
+        # a feedback rated 0 has no rate
+        self.rate(self.customers[2], 0)
+        self.assertEqual(self.rating(), (2, 9, 4.5, [0, 0, 0, 1, 1]))
+
+    def test_changed_rate(self) -> None:
+        feedback = self.rate(self.customers[0], 5)
+        feedback.rate = 2
+        feedback.save()
+        self.assertEqual(self.rating(), (1, 2, 2.0, [0, 1, 0, 0, 0]))
+        feedback.rate = 0
+        feedback.save()
+        self.assertEqual(self.rating(), (0, 0, 0.0, [0, 0, 0, 0, 0]))
+
+    def test_unchanged_rate_does_not_update_the_listing(self) -> None:
+        feedback = self.rate(self.customers[0], 3)
+        feedback.comment = "changed"
+        with CaptureQueriesContext(connection) as context:
+            feedback.save()
+        self.assertFalse(
+            any(
+                "product_listings" in query["sql"] for query in context.captured_queries
+            )
+        )
+
+    def test_moved_feedback(self) -> None:
+        feedback = self.rate(self.customers[0], 4)
+        feedback.product = self.other
+        feedback.save()
+        self.assertEqual(self.rating(), (0, 0, 0.0, [0, 0, 0, 0, 0]))
+        self.assertEqual(self.rating(self.other), (1, 4, 4.0, [0, 0, 0, 1, 0]))
+
+    def test_deleted_feedbacks(self) -> None:
+        self.rate(self.customers[0], 1).delete()
+        self.rate(self.customers[1], 3)
+        self.assertEqual(self.rating(), (1, 3, 3.0, [0, 0, 1, 0, 0]))
+        self.customers[1].delete()
+        self.assertEqual(self.rating(), (0, 0, 0.0, [0, 0, 0, 0, 0]))
+
+    def test_rebuild(self) -> None:
+        self.rate(self.customers[0], 5)
+        self.rate(self.customers[1], 2)
+        ProductListing.objects.update(rating_count=7, rating_5=0)
+        out = io.StringIO()
+        call_command("rebuild_product_ratings", stdout=out)
+        self.assertIn("Rebuilt 2 product ratings", out.getvalue())
+        self.assertEqual(self.rating(), (2, 7, 3.5, [0, 1, 0, 0, 1]))
+        self.assertEqual(self.rating(self.other), (0, 0, 0.0, [0, 0, 0, 0, 0]))
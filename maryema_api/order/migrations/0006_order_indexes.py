@@ -0,0 +1,27 @@
+# Generated by Django 5.1.15 on 2026-10-18 12:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("order", "0005_alter_order_discount_codes_alter_order_status"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["profile", "-created_at"], name="order_profile_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                condition=models.Q(("status", "pending")),
+                fields=["-created_at"],
+                name="order_pending_idx",
+            ),
+        ),
+    ]
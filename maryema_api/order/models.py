@@ -52,13 +52,16 @@ class Order(BaseModel):
     )
 
     def __str__(self) -> str:
-        return f"Order {self.id} - {self.customer.user.username}"
+        return f"Order {self.id} - {self.profile.user.username}"
 
     def clean(self, *args, **kwargs):
-        """Override the save method check if the order is closed when close reason is not blank"""
+        """Check the order is canceled (by `order.services.cancel_order`) when it has a cancel reason"""
         if self.cancel_reason and self.status != self.StatusChoice.CANCELED:
-            self.status = self.StatusChoice.CANCELED
-        if (self.status == self.StatusChoice.PROSSISSING) and not self.items.exists():
+            # canceling releases the reserved stock of the order
+            raise ValidationError(
+                "Orders with a cancel reason must be canceled with cancel_order"
+            )
+        if (self.status == self.StatusChoice.PROCESSING) and not self.items.exists():
             raise ValidationError("Order must have at least one item to be processed")
         super().clean(*args, **kwargs)
 
@@ -67,6 +70,18 @@ class Order(BaseModel):
         verbose_name = "Order"
         verbose_name_plural = "Orders"
         db_table = "orders"
+        indexes = [
+            # the orders of a customer, newest first
+            models.Index(
+                fields=["profile", "-created_at"], name="order_profile_created_idx"
+            ),
+            # the pending orders the admins work through
+            models.Index(
+                fields=["-created_at"],
+                condition=models.Q(status="pending"),
+                name="order_pending_idx",
+            ),
+        ]
 
 
 class OrderItem(BaseModel):
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 
+from core.validation import TrustedSaveMixin
 from order.models import Order, OrderItem
 
 
@@ -12,7 +13,7 @@ class OrderItemSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "created_at", "updated_at", "order"]
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(TrustedSaveMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     url = serializers.HyperlinkedIdentityField(view_name="order-detail")
 
@@ -0,0 +1,66 @@
+from django.db import transaction
+from django.utils import timezone
+
+from order.models import Order
+from product.inventory import quantities_of, release_stock, reserve_stock
+
+# the statuses of the orders whose stock is still reserved
+OPEN_STATUSES = (Order.StatusChoice.PENDING, Order.StatusChoice.PROCESSING)
+
+
+def cancel_order(order: Order, reason: str = "") -> bool:
+    """
+    Cancels an open order and releases the stock reserved for its items
+
+    The status is changed with a conditional update,
+    so the stock of an order canceled twice concurrently is released once.
+
+    Returns:
+        False if the order was not open (already closed or canceled)
+    """
+    with transaction.atomic():
+        canceled = Order.objects.filter(pk=order.pk, status__in=OPEN_STATUSES).update(
+            status=Order.StatusChoice.CANCELED,
+            cancel_reason=reason,
+            updated_at=timezone.now(),
+        )
+        if canceled:
+            release_stock(
+                quantities_of(order.items.values_list("product_variant_id", "quantity"))
+            )
+    order.refresh_from_db()
+    return bool(canceled)
+
+
+def adjust_order_stock(order: Order, before: dict, after: dict) -> None:
+    """
+    Reserves the stock added to the items of an open order and releases the stock removed
+
+    The order row is locked first, so a concurrent cancellation releases
+    the quantities of the items once they are changed.
+    Nothing is reserved for the orders which aren't open (their stock isn't reserved).
+
+    Args:
+        before: a dict mapping variant ids to the quantities of the items before the change
+        after: the quantities after the change
+
+    Raises:
+        InsufficientStock: if a variant has not enough stock for the added quantity
+    """
+    with transaction.atomic():
+        if not (
+            Order.objects.select_for_update()
+            .filter(pk=order.pk, status__in=OPEN_STATUSES)
+            .exists()
+        ):
+            return
+        difference = {
+            variant_id: after.get(variant_id, 0) - before.get(variant_id, 0)
+            for variant_id in before.keys() | after.keys()
+        }
+        added = {pk: n for pk, n in difference.items() if n > 0}
+        removed = {pk: -n for pk, n in difference.items() if n < 0}
+        if removed:
+            release_stock(removed)
+        if added:
+            reserve_stock(added)
@@ -1,14 +1,31 @@
+import gzip
+import json
 import uuid
 from datetime import datetime
 from profile.models import Profile
+from profile.tests.factories import ProfileFactory
 
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.test import TestCase
+from rest_framework import status
+from rest_framework.test import APITestCase
 
+from cart.models import CartItem
 from core.utils import create_image
 from order.models import Order, OrderItem
-from product.models import Category, Color, Division, Img, Product, ProductVariant, Size
+from order.services import cancel_order
+from product.models import (
+    Category,
+    Color,
+    Division,
+    Img,
+    Product,
+    ProductListing,
+    ProductVariant,
+    Size,
+)
+from product.tests.factories import VariantFactory
 
 
 class OrderTestCase(TestCase):
@@ -312,3 +329,159 @@ class OrderSignalsTestCase(TestCase):
 
 
 # TO DO - Tests for discount_codes
+
+
+class OrderCancelTestCase(APITestCase):
+    """A test suit for the release of the reserved stock of canceled orders"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.variant = VariantFactory(
+            size=Size.objects.create(name="M"), quantity=5, price=100, cost=50
+        )
+
+    def setUp(self) -> None:
+        self.customer = ProfileFactory()
+        self.client.force_authenticate(user=self.customer.user)
+        CartItem.objects.create(
+            cart=self.customer.carts.get(is_active=True),
+            product_variant=self.variant,
+            quantity=2,
+        )
+        response = self.client.post("/api/cart/checkout/")
+        self.order = Order.objects.get(pk=response.data["id"])
+
+    def test_cancel_releases_the_stock(self) -> None:
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.quantity, 3)
+
+        response = self.client.post(
+            f"/api/orders/{self.order.id}/cancel/", {"cancel_reason": "changed mind"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.StatusChoice.CANCELED)
+        self.assertEqual(self.order.cancel_reason, "changed mind")
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.quantity, 5)
+        listing = ProductListing.objects.get(product=self.variant.product)
+        self.assertEqual(listing.in_stock, 5)
+
+    def test_stock_is_released_once(self) -> None:
+        self.assertTrue(cancel_order(self.order))
+        self.assertFalse(cancel_order(self.order))
+        response = self.client.post(f"/api/orders/{self.order.id}/cancel/")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.quantity, 5)
+
+    def test_cancel_reason_releases_the_stock(self) -> None:
+        self.client.force_authenticate(user=ProfileFactory(admin=True).user)
+        response = self.client.patch(
+            f"/api/orders/{self.order.id}/", {"cancel_reason": "changed mind"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.StatusChoice.CANCELED)
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.quantity, 5)
+        # a canceled order isn't canceled again
+        response = self.client.patch(
+            f"/api/orders/{self.order.id}/", {"cancel_reason": "again"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.quantity, 5)
+
+    def test_changed_items_reserve_the_stock(self) -> None:
+        self.client.force_authenticate(user=ProfileFactory(admin=True).user)
+        other = VariantFactory(size=self.variant.size, quantity=4, price=10, cost=5)
+        response = self.client.post(
+            f"/api/orders/{self.order.id}/add-item/",
+            {"product_variant": other.id, "quantity": 3},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        other.refresh_from_db()
+        self.assertEqual(other.quantity, 1)
+
+        item = self.order.items.get(product_variant=self.variant)
+        url = f"/api/order/item/{item.pk}/"
+        response = self.client.patch(url, {"quantity": 6})
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        response = self.client.patch(url, {"quantity": 5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.quantity, 0)
+        response = self.client.patch(url, {"quantity": 1})
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.quantity, 4)
+
+        # canceling releases the changed quantities
+        self.assertTrue(cancel_order(self.order))
+        self.variant.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.variant.quantity, 5)
+        self.assertEqual(other.quantity, 4)
+
+
+class OrderExportTestCase(APITestCase):
+    """A test suit for the streaming export of the order items"""
+
+    url = "/api/orders/export/"
+
+    @classmethod
+    def setUpTestData(cls):
+        Size.objects.create(name="M")
+        cls.variants = VariantFactory.create_batch(3)
+        cls.customer = ProfileFactory()
+        cls.pending = Order.objects.create(profile=cls.customer)
+        cls.closed = Order.objects.create(
+            profile=cls.customer, status=Order.StatusChoice.CLOSED
+        )
+        for order in (cls.pending, cls.closed):
+            for variant in cls.variants:
+                OrderItem.objects.create(order=order, product_variant=variant)
+
+    def setUp(self) -> None:
+        self.client.force_authenticate(user=ProfileFactory(admin=True).user)
+
+    def export(self, **params) -> list[dict]:
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        content = b"".join(response.streaming_content).decode()
+        return [json.loads(line) for line in content.splitlines()]
+
+    def test_export_streams_the_items(self) -> None:
+        rows = self.export()
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[0]["username"], self.customer.user.username)
+        self.assertEqual(
+            {row["order"] for row in rows}, {str(self.pending.id), str(self.closed.id)}
+        )
+
+    def test_export_filters_and_columns(self) -> None:
+        rows = self.export(status="closed", columns="order,quantity")
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0], {"order": str(self.closed.id), "quantity": 1})
+
+    def test_export_csv_gzip(self) -> None:
+        response = self.client.get(
+            self.url, {"output": "csv", "gzip": "true", "columns": "item,status"}
+        )
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Content-Type"], "text/csv")
+        content = gzip.decompress(b"".join(response.streaming_content)).decode()
+        lines = content.splitlines()
+        self.assertEqual(lines[0], "item,status")
+        self.assertEqual(len(lines), 7)
+
+    def test_unknown_column(self) -> None:
+        response = self.client.get(self.url, {"columns": "order,secret"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("secret", response.data["columns"])
+
+    def test_only_admins_export(self) -> None:
+        self.client.force_authenticate(user=self.customer.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
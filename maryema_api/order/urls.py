@@ -3,5 +3,5 @@ from django.urls import path
 from order.views import OrderItemView
 
 urlpatterns = [
-    path("item/<int:pk>/", OrderItemView.as_view(), name="order-item"),
+    path("item/<uuid:pk>/", OrderItemView.as_view(), name="order-item"),
 ]
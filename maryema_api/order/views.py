@@ -1,17 +1,41 @@
+from django.db import transaction
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters, permissions, status, views, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
+from core.export import QuerysetExport
+from core.pagination import PageNumberOrKeysetPagination
 from core.permissions import IsAdmin, IsOwner
 from order.models import Order, OrderItem
 from order.permissions import IsAdminOrOwner
 from order.serializers import OrderItemSerializer, OrderSerializer
+from order.services import adjust_order_stock, cancel_order
+from product.inventory import InsufficientStock
+
+ORDER_ITEM_EXPORT_COLUMNS = {
+    "item": "pk",
+    "order": "order_id",
+    "ordered_at": "order__created_at",
+    "status": "order__status",
+    "total": "order__total",
+    "customer": "order__profile_id",
+    "username": "order__profile__user__username",
+    "product_variant": "product_variant_id",
+    "product": "product_variant__product__name",
+    "color": "product_variant__color__color1_name",
+    "size": "product_variant__size__name",
+    "quantity": "quantity",
+    # the current price of the variant
+    "price": "product_variant__price",
+}
 
 
 class OrderViewSet(viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated, IsAdminOrOwner]
+    pagination_class = PageNumberOrKeysetPagination
     filter_backends = [filters.SearchFilter, DjangoFilterBackend]
     search_fields = ["item__product_variant__product__name"]
     filterset_fields = ["status"]
@@ -36,6 +60,21 @@ class OrderViewSet(viewsets.ModelViewSet):
             return Response(serializer.data, status=201)
         return Response(serializer.errors, status=400)
 
+    def perform_update(self, serializer):
+        """
+        Cancel the order through `cancel_order` when a cancel reason is given,
+        so its stock is released
+        """
+        reason = serializer.validated_data.pop("cancel_reason", "")
+        with transaction.atomic():
+            if reason and not cancel_order(serializer.instance, reason):
+                raise ValidationError(
+                    {
+                        "cancel_reason": "Only pending or processing orders can be canceled"
+                    }
+                )
+            serializer.save()
+
     @action(detail=True, methods=["post"], permission_classes=[IsAdmin])
     def close(self, request, pk=None):
         """
@@ -44,18 +83,20 @@ class OrderViewSet(viewsets.ModelViewSet):
         order = self.get_object()
         order.status = Order.StatusChoice.CLOSED
         order.save()
-        return Response(OrderSerializer(order).data)
+        return Response(self.get_serializer(order).data)
 
     @action(detail=True, methods=["post"], permission_classes=[IsOwner])
     def cancel(self, request, pk=None):
         """
-        Cancel the order
+        Cancel the order and give its items back to the stock
         """
         order = self.get_object()
-        order.cancel_reason = request.data.get("cancel_reason", "")
-        order.status = Order.StatusChoice.CANCELED
-        order.save()
-        return Response(OrderSerializer(order).data)
+        if not cancel_order(order, request.data.get("cancel_reason", "")):
+            return Response(
+                {"error": "Only pending or processing orders can be canceled"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(self.get_serializer(order).data)
 
     @action(detail=True, methods=["post"], permission_classes=[IsAdmin])
     def process(self, request, pk=None):
@@ -65,7 +106,27 @@ class OrderViewSet(viewsets.ModelViewSet):
         order = self.get_object()
         order.status = Order.StatusChoice.PROCESSING
         order.save()
-        return Response(OrderSerializer(order).data)
+        return Response(self.get_serializer(order).data)
+
+    @action(detail=False, methods=["get"], permission_classes=[IsAdmin])
+    def export(self, request):
+        """
+        Stream the items of the orders matching the filters, one item per row
+
+        Query params:
+
+        - `status` and `search`: the filters of the orders list
+        - `columns`: comma separated column names, all of them by default
+        - `output`: `ndjson` (the default) or `csv`
+        - `gzip`: `true` to compress the stream
+        """
+        orders = self.filter_queryset(self.get_queryset())
+        items = OrderItem.objects.filter(order__in=orders.values("pk")).order_by(
+            "order__created_at", "order_id"
+        )
+        return QuerysetExport(items, ORDER_ITEM_EXPORT_COLUMNS, "orders").response(
+            request
+        )
 
     @action(
         detail=True, methods=["post"], permission_classes=[IsAdmin], url_path="add-item"
@@ -76,10 +137,19 @@ class OrderViewSet(viewsets.ModelViewSet):
         """
         order = self.get_object()
         serializer = OrderItemSerializer(data=request.data)
-        if serializer.is_valid():
-            order.items.create(**serializer.validated_data)
-            return Response(OrderSerializer(order).data)
-        return Response(serializer.errors, status=400)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+        try:
+            with transaction.atomic():
+                item = order.items.create(**serializer.validated_data)
+                adjust_order_stock(order, {}, {item.product_variant_id: item.quantity})
+        except InsufficientStock as e:
+            return Response(
+                {"error": str(e), "variants": e.variant_ids},
+                status=status.HTTP_409_CONFLICT,
+            )
+        order.refresh_from_db()
+        return Response(self.get_serializer(order).data)
 
 
 class OrderItemView(views.APIView):
@@ -89,12 +159,28 @@ class OrderItemView(views.APIView):
                 {"error": "You are not allowed to perform this action"},
                 status=status.HTTP_403_FORBIDDEN,
             )
-        order_item = OrderItem.objects.get(pk=pk)
-        serializer = OrderItemSerializer(order_item, data=request.data, partial=True)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data)
-        return Response(serializer.errors, status=400)
+        try:
+            # the item is locked so concurrent changes reserve their differences in turn
+            with transaction.atomic():
+                order_item = OrderItem.objects.select_for_update().get(pk=pk)
+                before = {order_item.product_variant_id: order_item.quantity}
+                serializer = OrderItemSerializer(
+                    order_item, data=request.data, partial=True
+                )
+                if not serializer.is_valid():
+                    return Response(serializer.errors, status=400)
+                serializer.save()
+                adjust_order_stock(
+                    order_item.order,
+                    before,
+                    {order_item.product_variant_id: order_item.quantity},
+                )
+        except InsufficientStock as e:
+            return Response(
+                {"error": str(e), "variants": e.variant_ids},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return Response(serializer.data)
 
     def delete(self, request, pk=None):
         if request.user.profile.role != "admin":
@@ -102,6 +188,12 @@ class OrderItemView(views.APIView):
                 {"error": "You are not allowed to perform this action"},
                 status=status.HTTP_403_FORBIDDEN,
             )
-        order_item = OrderItem.objects.get(pk=pk)
-        order_item.delete()
+        with transaction.atomic():
+            order_item = OrderItem.objects.select_for_update().get(pk=pk)
+            order_item.delete()
+            adjust_order_stock(
+                order_item.order,
+                {order_item.product_variant_id: order_item.quantity},
+                {},
+            )
         return Response(status=204)
@@ -0,0 +1,156 @@
+"""
+This module contains the faceted counts of the products
+
+The counts of all the facets are computed by a single query,
+a `UNION ALL` of one grouped aggregation per facet over the filtered products.
+Each count is the number of distinct products having the facet value.
+The color facet counts the first and the second colors of the variants
+(as the `color_name` filter matches either), in two aggregations
+whose products don't overlap so their counts add up.
+"""
+
+from decimal import Decimal
+from uuid import UUID
+
+from django.db.models import (
+    Case,
+    CharField,
+    Count,
+    Exists,
+    F,
+    OuterRef,
+    QuerySet,
+    Value,
+    When,
+)
+from django.db.models.functions import Cast
+
+from product.models import ProductVariant
+
+# (min, max) price ranges of the price facet, max is excluded and None means no limit
+PRICE_BUCKETS = (
+    (Decimal(0), Decimal(250)),
+    (Decimal(250), Decimal(500)),
+    (Decimal(500), Decimal(1000)),
+    (Decimal(1000), None),
+)
+
+FACETS = ("category", "division", "color", "size", "price")
+
+
+def bucket_label(bucket: tuple) -> str:
+    low, high = bucket
+    return f"{low}-{high}" if high is not None else f"{low}-"
+
+
+def price_bucket() -> Case:
+    """The label of the price bucket a variant falls in"""
+    whens = []
+    for bucket in PRICE_BUCKETS:
+        low, high = bucket
+        condition = {"price__gte": low}
+        if high is not None:
+            condition["price__lt"] = high
+        whens.append(When(**condition, then=Value(bucket_label(bucket))))
+    return Case(*whens, output_field=CharField())
+
+
+def grouped(queryset: QuerySet, facet: str, value, label, product) -> QuerySet:
+    """Groups the queryset by value and counts the distinct products of each value"""
+    return (
+        queryset.order_by()
+        .annotate(
+            facet=Value(facet, output_field=CharField()),
+            value=value,
+            label=label,
+        )
+        .values("facet", "value", "label")
+        .annotate(count=Count(product, distinct=True))
+    )
+
+
+def compute_facets(products: QuerySet) -> dict:
+    """
+    Computes the counts of every facet for the given (already filtered) products
+
+    Returns:
+        a dict mapping each facet to a list of {"value", "label", "count"}
+    """
+    product_ids = products.order_by().values("pk")
+    variants = ProductVariant.objects.filter(product__in=product_ids)
+
+    queries = [
+        grouped(
+            products,
+            "category",
+            Cast("category_id", CharField()),
+            F("category__name"),
+            "pk",
+        ),
+        grouped(
+            products,
+            "division",
+            Cast("category__division_id", CharField()),
+            F("category__division__name"),
+            "pk",
+        ),
+        grouped(
+            variants.filter(color__isnull=False),
+            "color",
+            F("color__color1_name"),
+            F("color__color1_name"),
+            "product",
+        ),
+        # the products counted by the first colors aren't counted again
+        grouped(
+            variants.exclude(color__color2_name__isnull=True)
+            .exclude(color__color2_name="")
+            .exclude(
+                Exists(
+                    ProductVariant.objects.filter(
+                        product=OuterRef("product"),
+                        color__color1_name=OuterRef("color__color2_name"),
+                    )
+                )
+            ),
+            "color",
+            F("color__color2_name"),
+            F("color__color2_name"),
+            "product",
+        ),
+        grouped(
+            variants.filter(size__isnull=False),
+            "size",
+            F("size__name"),
+            F("size__name"),
+            "product",
+        ),
+        grouped(variants, "price", price_bucket(), price_bucket(), "product"),
+    ]
+    rows = queries[0].union(*queries[1:], all=True)
+
+    facets = {facet: {} for facet in FACETS}
+    for row in rows:
+        value = row["value"]
+        if row["facet"] in ("category", "division"):
+            # normalize the ids (SQLite stores them as hex without dashes)
+            value = str(UUID(value))
+        item = facets[row["facet"]].setdefault(
+            value, {"value": value, "label": row["label"], "count": 0}
+        )
+        # a color has a row for its first colors and one for its second colors
+        item["count"] += row["count"]
+    facets = {facet: list(items.values()) for facet, items in facets.items()}
+
+    # keep the price buckets in their range order and show the empty ones
+    prices = {item["value"]: item for item in facets["price"]}
+    facets["price"] = [
+        prices.get(
+            bucket_label(bucket),
+            {"value": bucket_label(bucket), "label": bucket_label(bucket), "count": 0},
+        )
+        for bucket in PRICE_BUCKETS
+    ]
+    for facet in ("category", "division", "color", "size"):
+        facets[facet].sort(key=lambda item: (-item["count"], item["label"]))
+    return facets
@@ -1,10 +1,13 @@
 from uuid import UUID
 
-from django.db.models import Q
+from django.db.models import Exists, OuterRef, Q, QuerySet
 from django.forms import UUIDField
 from django_filters import rest_framework as filters
+from django_filters.constants import EMPTY_VALUES
+from rest_framework.filters import SearchFilter
 
-from product.models import Product
+from product.models import Product, ProductVariant
+from product.search import get_search_backend
 
 
 class CustomUUIDField(UUIDField):
@@ -33,31 +36,56 @@ class CustomUUIDFilter(filters.UUIDFilter):
     field_class = CustomUUIDField
 
 
-class ColorNameFilter(filters.CharFilter):
-    def filter(self, qs, value):
-        if value in ([], (), {}, "", None):
-            return qs
+def variants_exist(condition: Q) -> Exists:
+    """Whether the product has a variant matching the condition"""
+    return Exists(ProductVariant.objects.filter(condition, product=OuterRef("pk")))
 
-        return qs.filter(
-            Q(variant__color__color1_name__icontains=value)
-            | Q(variant__color__color2_name__icontains=value)
-        )
 
+class VariantFilterMixin:
+    """
+    A filter on the variants of the products
+
+    The `field_name` is relative to the ProductVariant model.
+    Used alone, it filters by an `EXISTS` subquery on the variants,
+    within ProductFilter the conditions of all the variant filters are combined
+    into a single `EXISTS`, so they all apply to the same variant.
+    """
+
+    def get_condition(self, value) -> Q:
+        return Q(**{f"{self.field_name}__{self.lookup_expr}": value})
 
-class ColorValueFilter(filters.CharFilter):
     def filter(self, qs, value):
-        if value in ([], (), {}, "", None):
+        if value in EMPTY_VALUES:
             return qs
+        return qs.filter(variants_exist(self.get_condition(value)))
+
+
+class VariantNumberFilter(VariantFilterMixin, filters.NumberFilter):
+    pass
+
 
-        return qs.filter(
-            Q(variant__color__color1_value__exact=value)
-            | Q(variant__color__color2_value__exact=value)
+class VariantCharFilter(VariantFilterMixin, filters.CharFilter):
+    pass
+
+
+class ColorNameFilter(VariantFilterMixin, filters.CharFilter):
+    def get_condition(self, value) -> Q:
+        return Q(color__color1_name__icontains=value) | Q(
+            color__color2_name__icontains=value
         )
 
 
+class ColorValueFilter(VariantFilterMixin, filters.CharFilter):
+    def get_condition(self, value) -> Q:
+        return Q(color__color1_value__exact=value) | Q(color__color2_value__exact=value)
+
+
 class ProductFilter(filters.FilterSet):
     """
     A filter class for the Product model
+
+    The price, size and color filters are combined into one `EXISTS` subquery
+    on the variants instead of joining the variants for each of them.
     """
 
     division = CustomUUIDFilter(
@@ -67,9 +95,9 @@ class ProductFilter(filters.FilterSet):
     color_name = ColorNameFilter()
     color_value = ColorValueFilter()
 
-    min_price = filters.NumberFilter(field_name="variant__price", lookup_expr="gte")
-    max_price = filters.NumberFilter(field_name="variant__price", lookup_expr="lte")
-    size = filters.CharFilter(field_name="variant__size__name", lookup_expr="exact")
+    min_price = VariantNumberFilter(field_name="price", lookup_expr="gte")
+    max_price = VariantNumberFilter(field_name="price", lookup_expr="lte")
+    size = VariantCharFilter(field_name="size__name", lookup_expr="exact")
 
     class Meta:
         model = Product
@@ -77,3 +105,31 @@ class ProductFilter(filters.FilterSet):
             "category": ["exact"],
             "collection": ["exact"],
         }
+
+    def filter_queryset(self, queryset: QuerySet) -> QuerySet:
+        variant_condition = Q()
+        for name, value in self.form.cleaned_data.items():
+            product_filter = self.filters[name]
+            if isinstance(product_filter, VariantFilterMixin):
+                if value not in EMPTY_VALUES:
+                    variant_condition &= product_filter.get_condition(value)
+                continue
+            queryset = product_filter.filter(queryset, value)
+        if variant_condition:
+            queryset = queryset.filter(variants_exist(variant_condition))
+        return queryset
+
+
+class ProductSearchFilter(SearchFilter):
+    """
+    A search filter that uses the full-text search index of the products
+    instead of `icontains` lookups on the `search_fields`
+
+    The results are ordered by their rank unless an explicit ordering is requested.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        search_terms = self.get_search_terms(request)
+        if not search_terms:
+            return queryset
+        return get_search_backend().search(queryset, search_terms)
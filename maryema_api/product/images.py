@@ -0,0 +1,248 @@
+"""
+This module contains the content-addressed storage of the product images and their derivatives
+
+An uploaded file is stored under the hash of its content (`product_images/<digest>.<ext>`),
+so the same photo uploaded for many variants is stored once and shared by their images.
+The images referencing a stored file are its references: a file is deleted,
+with its derivatives, once the last image referencing it is deleted or replaced.
+The references are counted and added under a lock of the row of the file
+(`StoredFile`), so a file isn't deleted while a new upload of the same content
+starts referencing it.
+
+The product cards and the variant galleries shouldn't download the uploaded originals,
+so every image gets resized copies at a few widths in WebP and JPEG:
+
+- the derivatives are generated when an image is uploaded (or its file is replaced),
+  after the transaction commits, on a pool of IMAGE_WORKERS threads
+  (Pillow releases the GIL while resizing and encoding)
+- they are stored with content-hashed names (the hash of the original),
+  so the images sharing an original share its derivatives
+- their names are kept on `Img.derivatives` and on the listings showing the image,
+  and the serializers turn them into `srcset` strings
+"""
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import IO, Iterator
+from uuid import UUID
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from core.cache import invalidate_responses
+from core.media import content_digest
+from product.models import Img, StoredFile
+from product.services import refresh_image_listings
+
+logger = logging.getLogger(__name__)
+
+WIDTHS = (160, 320, 640, 1280)
+# the width of the derivative shown on the product cards
+CARD_WIDTH = 320
+DERIVATIVES_DIR = "product_images/derivatives"
+# format: (Pillow format, extension, save options)
+FORMATS = {
+    "webp": ("WEBP", "webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "jpg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+
+def lock_file(name: str) -> None:
+    """Locks the row of a stored original until the end of the transaction"""
+    StoredFile.objects.select_for_update().get_or_create(name=name)
+
+
+def store_original(img: Img) -> None:
+    """
+    Stores the uploaded file of an image under the hash of its content
+
+    The upload isn't stored again when a file of the same content already is,
+    the image references that file instead.
+    """
+    file = img.src.file
+    digest = content_digest(file.chunks())
+    basename = digest + os.path.splitext(img.src.name)[1].lower()
+    name = img.src.field.generate_filename(img, basename)
+    lock_file(name)
+    if img.src.storage.exists(name):
+        img.src.name = name
+        img.src._committed = True
+    else:
+        img.src.save(basename, file, save=False)
+
+
+def shared_derivatives(name: str) -> dict:
+    """The derivatives already generated for a stored original (by another image)"""
+    derivatives = (
+        Img.objects.filter(src=name)
+        .exclude(derivatives={})
+        .values_list("derivatives", flat=True)
+        .first()
+    )
+    return derivatives or {}
+
+
+def release_files(name: str, derivatives: dict) -> None:
+    """
+    Deletes a stored original and its derivatives once no image references them
+
+    The derivatives are checked on their own as the images stored before
+    the content addressing may have different originals of the same content.
+    """
+    with transaction.atomic():
+        if name:
+            # an upload of the same content waits for the file to be deleted
+            lock_file(name)
+            if not Img.objects.filter(src=name).exists():
+                default_storage.delete(name)
+                StoredFile.objects.filter(name=name).delete()
+        if derivatives and not Img.objects.filter(derivatives=derivatives).exists():
+            for sizes in derivatives.values():
+                for derivative in sizes.values():
+                    default_storage.delete(derivative)
+
+
+def flatten(image: Image.Image) -> Image.Image:
+    """Drops the transparency of an image on a white background (JPEG has no alpha)"""
+    if image.mode != "RGBA":
+        return image
+    background = Image.new("RGB", image.size, "white")
+    background.paste(image, mask=image.getchannel("A"))
+    return background
+
+
+def render_derivatives(file: IO[bytes]) -> Iterator[tuple[str, int, bytes]]:
+    """
+    Resizes an image to the derivative widths in each format
+
+    The widths larger than the image are skipped (it is never upscaled),
+    an image narrower than all of them gets one derivative at its own width.
+
+    Yields:
+        (format, width, encoded bytes) of each derivative
+    """
+    with Image.open(file) as original:
+        image = ImageOps.exif_transpose(original)
+        transparent = "A" in image.getbands() or "transparency" in image.info
+        image = image.convert("RGBA" if transparent else "RGB")
+    widths = [width for width in WIDTHS if width < image.width] or [image.width]
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize(
+            (width, height), Image.Resampling.LANCZOS, reducing_gap=3.0
+        )
+        for format, (pil_format, _, options) in FORMATS.items():
+            frame = flatten(resized) if format == "jpeg" else resized
+            buffer = BytesIO()
+            frame.save(buffer, pil_format, **options)
+            yield format, width, buffer.getvalue()
+
+
+def generate_derivatives(img: Img) -> dict:
+    """
+    Generates and stores the derivatives of an image
+
+    Returns:
+        the stored names of the derivatives ({format: {width: name}})
+    """
+    with img.src.open("rb") as file:
+        content = file.read()
+    digest = content_digest([content])
+    derivatives = {}
+    for format, width, data in render_derivatives(BytesIO(content)):
+        name = f"{DERIVATIVES_DIR}/{digest}-{width}w.{FORMATS[format][1]}"
+        if not default_storage.exists(name):
+            name = default_storage.save(name, ContentFile(data))
+        derivatives.setdefault(format, {})[str(width)] = name
+    return derivatives
+
+
+def process_image(img_id: UUID) -> dict | None:
+    """
+    Generates the derivatives of an image and shows them where the image is shown
+
+    Returns:
+        the derivatives, None if the image was deleted or its file was replaced meanwhile
+    """
+    img = Img.objects.filter(pk=img_id).first()
+    if img is None or not img.src:
+        return None
+    with transaction.atomic():
+        # the derivatives shared with a released image aren't deleted meanwhile
+        lock_file(img.src.name)
+        derivatives = generate_derivatives(img)
+        # the file may have been replaced while the derivatives were generated
+        if not Img.objects.filter(pk=img.pk, src=img.src.name).update(
+            derivatives=derivatives, updated_at=timezone.now()
+        ):
+            return None
+    img.derivatives = derivatives
+    refresh_image_listings(img)
+    invalidate_responses("img", [img.pk])
+    invalidate_responses(
+        "product", img.variants.values_list("product_id", flat=True).distinct()
+    )
+    return derivatives
+
+
+_executor: ThreadPoolExecutor | None = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS, thread_name_prefix="image"
+        )
+    return _executor
+
+
+def run_in_worker(img_id: UUID) -> None:
+    try:
+        process_image(img_id)
+    except Exception:
+        logger.exception("Generating the derivatives of the image %s failed", img_id)
+    finally:
+        # the threads of the pool don't go through the request cycle that closes them
+        connection.close()
+
+
+def schedule_derivatives(img_id: UUID) -> None:
+    """Generates the derivatives of an image on the worker pool (or right away without one)"""
+    if settings.IMAGE_WORKERS <= 0:
+        process_image(img_id)
+        return
+    get_executor().submit(run_in_worker, img_id)
+
+
+def build_srcset(sizes: dict) -> str:
+    """Builds a srcset attribute from the derivatives of one format ({width: name})"""
+    return ", ".join(
+        f"{default_storage.url(name)} {width}w"
+        for width, name in sorted(sizes.items(), key=lambda item: int(item[0]))
+    )
+
+
+def srcset_map(derivatives: dict) -> dict:
+    """The srcset of each format of the derivatives of an image"""
+    return {format: build_srcset(sizes) for format, sizes in derivatives.items()}
+
+
+def card_image(derivatives: dict, fallback: str) -> str:
+    """
+    The name of the JPEG derivative shown on a product card,
+    the smallest one at least CARD_WIDTH wide (or the widest one),
+    the original (fallback) until the derivatives are generated
+    """
+    sizes = derivatives.get("jpeg")
+    if not sizes:
+        return fallback
+    widths = sorted(int(width) for width in sizes)
+    width = next((w for w in widths if w >= CARD_WIDTH), widths[-1])
+    return sizes[str(width)]
@@ -0,0 +1,412 @@
+"""
+This module contains the bulk import of the catalog from CSV or JSONL files
+
+Each row of a file is a variant with its product (see `CatalogRowSerializer`).
+The rows are read as a stream and imported in chunks, each in its own transaction:
+
+- the divisions, categories, colors and sizes are resolved by their natural keys
+  from in-memory maps, the missing ones are created
+- the images are resolved by the path of their files, the missing ones are created
+  and their derivatives generated once the chunk commits
+- the products are resolved by their name in their category,
+  the new ones and the variants are created with `bulk_create`
+- the listings, the search documents and the cached responses
+  of the products of the chunk are refreshed, and the discount rules compiled again
+
+A row that can't be imported is reported with its errors and skipped,
+the other rows are imported anyway.
+"""
+
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+from functools import partial
+from itertools import islice
+from typing import IO, Iterable, Iterator
+
+from django.core.exceptions import SuspiciousOperation, ValidationError
+from django.core.files.storage import default_storage
+from django.db import DatabaseError, transaction
+from rest_framework import serializers
+
+from core.cache import invalidate_responses
+from core.validation import BulkValidationError, bulk_full_clean
+from discount.engine import invalidate_rule_set
+from discount.entitlements import refresh_entitlements, rules_entitling
+from product.images import schedule_derivatives
+from product.models import (
+    Category,
+    Color,
+    Division,
+    Img,
+    Product,
+    ProductListing,
+    ProductVariant,
+    Size,
+)
+from product.search import refresh_search_documents
+from product.serializers.catalog_import import FORMATS, CatalogRowSerializer
+from product.services import refresh_product_listing
+
+CHUNK_SIZE = 1000
+# the errors of the rows past this number are counted but not reported
+MAX_REPORTED_ERRORS = 1000
+
+
+@dataclass
+class RowError:
+    line: int
+    errors: dict
+
+
+@dataclass
+class ImportReport:
+    rows: int = 0
+    products: int = 0
+    variants: int = 0
+    error_count: int = 0
+    errors: list[RowError] = field(default_factory=list)
+
+    def add_error(self, line: int, errors) -> None:
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            if not isinstance(errors, dict):
+                errors = {"non_field_errors": errors}
+            self.errors.append(RowError(line, errors))
+
+    def to_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "products": self.products,
+            "variants": self.variants,
+            "error_count": self.error_count,
+            "errors": [{"line": e.line, "errors": e.errors} for e in self.errors],
+        }
+
+
+def guess_format(name: str) -> str:
+    extension = name.rsplit(".", 1)[-1].lower()
+    if extension == "ndjson":
+        return "jsonl"
+    if extension not in FORMATS:
+        raise ValueError(f"Unknown catalog format: {extension}")
+    return extension
+
+
+def messages_of(error: ValidationError) -> dict | list:
+    if hasattr(error, "error_dict"):
+        return error.message_dict
+    return error.messages
+
+
+@dataclass
+class Row:
+    line: int
+    data: dict
+    category: Category | None = None
+    color: Color | None = None
+    size: Size | None = None
+    image: Img | None = None
+    product_id: object = None
+
+
+class CatalogImporter:
+    """
+    Imports the rows of catalog files
+
+    The lookup maps are kept between the chunks (and the files) of an importer,
+    they only hold the divisions, categories, colors and sizes which are few.
+    """
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE) -> None:
+        self.chunk_size = chunk_size
+        self.report = ImportReport()
+        # one serializer validates all the rows, as building its fields is costly
+        self.row_serializer = CatalogRowSerializer()
+        self.load_lookups()
+
+    def load_lookups(self) -> None:
+        self.divisions = {d.name: d for d in Division.objects.all()}
+        self.categories = {c.name: c for c in Category.objects.all()}
+        self.colors = {self.color_key(vars(c)): c for c in Color.objects.all()}
+        self.sizes = {s.name: s for s in Size.objects.all()}
+
+    @staticmethod
+    def color_key(data: dict) -> tuple:
+        return tuple(
+            data.get(name) or None
+            for name in ("color1_name", "color1_value", "color2_name", "color2_value")
+        )
+
+    # reading
+
+    def read(self, file: IO[str], format: str) -> Iterator[tuple[int, dict]]:
+        """Yields the rows of a text file with their line numbers"""
+        if format == "csv":
+            reader = csv.DictReader(file)
+            for data in reader:
+                yield reader.line_num, data
+            return
+        for line, text in enumerate(file, start=1):
+            if not text.strip():
+                continue
+            try:
+                data = json.loads(text)
+            except ValueError as e:
+                self.report.add_error(line, [f"Invalid JSON: {e}"])
+                continue
+            if not isinstance(data, dict):
+                self.report.add_error(line, ["A row must be a JSON object"])
+                continue
+            yield line, data
+
+    def import_file(self, file: IO, format: str) -> ImportReport:
+        """Imports a text or binary file of the given format"""
+        if isinstance(file, (io.TextIOBase, io.StringIO)):
+            text = file
+        else:
+            text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+        return self.import_rows(self.read(text, format))
+
+    def import_rows(self, rows: Iterable[tuple[int, dict]]) -> ImportReport:
+        rows = iter(rows)
+        while chunk := list(islice(rows, self.chunk_size)):
+            self.report.rows += len(chunk)
+            self.import_chunk(chunk)
+        return self.report
+
+    # importing
+
+    def import_chunk(self, chunk: list[tuple[int, dict]]) -> None:
+        rows = []
+        for line, data in chunk:
+            try:
+                rows.append(Row(line, self.row_serializer.run_validation(data)))
+            except serializers.ValidationError as e:
+                self.report.add_error(line, e.detail)
+        if not rows:
+            return
+        try:
+            with transaction.atomic():
+                rows = self.resolve_lookups(rows)
+                rows = self.resolve_images(rows)
+                rows, created = self.resolve_products(rows)
+                variants = self.create_variants(rows)
+                self.refresh_products(created, {v.product_id for v in variants})
+        except DatabaseError as e:
+            for row in rows:
+                self.report.add_error(row.line, [f"Not imported: {e}"])
+            # the objects created in the chunk were rolled back
+            self.load_lookups()
+            return
+        self.report.products += len(created)
+        self.report.variants += len(variants)
+
+    def failed(self, row: Row, error: ValidationError | dict | list) -> None:
+        errors = messages_of(error) if isinstance(error, ValidationError) else error
+        self.report.add_error(row.line, errors)
+
+    def get_or_create(self, lookup: dict, key, build) -> object:
+        """Gets an object from a lookup map or creates it (validated) and maps it"""
+        if key not in lookup:
+            instance = build()
+            # in a savepoint, so a failed object doesn't break the chunk
+            with transaction.atomic():
+                instance.save()
+            lookup[key] = instance
+        return lookup[key]
+
+    def get_category(self, data: dict) -> Category:
+        name = data["category"]
+        if name in self.categories:
+            return self.categories[name]
+        division_name = data.get("division", "").strip().capitalize()
+        if not division_name:
+            raise ValidationError(
+                {"division": "The division is required to create a new category"}
+            )
+        division = self.get_or_create(
+            self.divisions, division_name, lambda: Division(name=division_name)
+        )
+        return self.get_or_create(
+            self.categories, name, lambda: Category(name=name, division=division)
+        )
+
+    def resolve_lookups(self, rows: list[Row]) -> list[Row]:
+        resolved = []
+        for row in rows:
+            data = row.data
+            color_key = self.color_key(data)
+            try:
+                row.category = self.get_category(data)
+                row.color = self.get_or_create(
+                    self.colors,
+                    color_key,
+                    lambda: Color(
+                        color1_name=color_key[0],
+                        color1_value=color_key[1],
+                        color2_name=color_key[2],
+                        color2_value=color_key[3],
+                    ),
+                )
+                row.size = self.get_or_create(
+                    self.sizes, data["size"], lambda: Size(name=data["size"])
+                )
+            except ValidationError as e:
+                self.failed(row, e)
+                continue
+            resolved.append(row)
+        return resolved
+
+    def resolve_images(self, rows: list[Row]) -> list[Row]:
+        """Resolves the images of the chunk by their paths, creating the missing ones"""
+        paths = {row.data["image"] for row in rows}
+        images = {img.src.name: img for img in Img.objects.filter(src__in=paths)}
+        missing, invalid = {}, set()
+        for row in rows:
+            path = row.data["image"]
+            if path in images or path in missing or path in invalid:
+                continue
+            try:
+                exists = default_storage.exists(path)
+            except SuspiciousOperation:
+                # a path out of the media storage
+                invalid.add(path)
+                continue
+            missing[path] = Img(src=path, alt=row.data["alt"]) if exists else None
+        created = Img.objects.bulk_create(
+            [img for img in missing.values() if img is not None]
+        )
+        for img in created:
+            transaction.on_commit(partial(schedule_derivatives, img.pk))
+        images.update((img.src.name, img) for img in created)
+        resolved = []
+        for row in rows:
+            if row.data["image"] in invalid:
+                self.failed(
+                    row, {"image": "The image path is out of the media storage"}
+                )
+                continue
+            row.image = images.get(row.data["image"])
+            if row.image is None:
+                self.failed(row, {"image": "The image file does not exist"})
+                continue
+            resolved.append(row)
+        return resolved
+
+    def resolve_products(self, rows: list[Row]) -> tuple[list[Row], list[Product]]:
+        """
+        Resolves the products of the rows by their names in their categories,
+        creating the missing ones from their first rows
+        """
+        keys = {(row.category.pk, row.data["product"]) for row in rows}
+        products = {}
+        existing = Product.objects.filter(
+            category_id__in={category_id for category_id, _ in keys},
+            name__in={name for _, name in keys},
+        ).order_by("created_at")
+        for product_id, category_id, name in existing.values_list(
+            "pk", "category_id", "name"
+        ):
+            products.setdefault((category_id, name), product_id)
+
+        new = {}
+        for row in rows:
+            key = (row.category.pk, row.data["product"])
+            if key not in products and key not in new:
+                new[key] = Product(
+                    category=row.category,
+                    name=row.data["product"],
+                    description=row.data["description"],
+                    tags=row.data["tags"],
+                )
+        created, invalid = self.validated(list(new.values()))
+        Product.objects.bulk_create(created)
+        products.update(((p.category_id, p.name), p.pk) for p in created)
+
+        resolved = []
+        for row in rows:
+            key = (row.category.pk, row.data["product"])
+            if key not in products:
+                self.failed(row, invalid[new[key]])
+                continue
+            row.product_id = products[key]
+            resolved.append(row)
+        return resolved, created
+
+    def validated(self, instances: list) -> tuple[list, dict]:
+        """Splits the instances into the valid ones and the errors of the others"""
+        try:
+            bulk_full_clean(instances)
+        except BulkValidationError as e:
+            invalid = {
+                instances[index]: ValidationError(instance_errors).message_dict
+                for index, instance_errors in e.by_index.items()
+            }
+            return [i for i in instances if i not in invalid], invalid
+        return instances, {}
+
+    def create_variants(self, rows: list[Row]) -> list[ProductVariant]:
+        """Creates the variants of the rows, the existing variants are reported"""
+        product_ids = {row.product_id for row in rows}
+        taken = set()
+        sort_orders = {}
+        for product_id, color_id, size_id, sort_order in ProductVariant.objects.filter(
+            product_id__in=product_ids
+        ).values_list("product_id", "color_id", "size_id", "sort_order"):
+            taken.add((product_id, color_id, size_id))
+            taken.add((product_id, sort_order))
+            sort_orders[product_id] = max(sort_orders.get(product_id, 0), sort_order)
+
+        variants, variant_rows = [], {}
+        for row in rows:
+            key = (row.product_id, row.color.pk, row.size.pk)
+            if key in taken:
+                self.failed(row, ["The variant of this color and size already exists"])
+                continue
+            sort_order = row.data.get("sort_order")
+            if sort_order is None:
+                sort_order = sort_orders.get(row.product_id, 0) + 1
+            if (row.product_id, sort_order) in taken:
+                self.failed(row, {"sort_order": "This sort order is already taken"})
+                continue
+            taken.update((key, (row.product_id, sort_order)))
+            sort_orders[row.product_id] = max(
+                sort_orders.get(row.product_id, 0), sort_order
+            )
+            variant = ProductVariant(
+                product_id=row.product_id,
+                color=row.color,
+                size=row.size,
+                image=row.image,
+                cost=row.data["cost"],
+                price=row.data["price"],
+                quantity=row.data["quantity"],
+                sort_order=sort_order,
+            )
+            variants.append(variant)
+            variant_rows[variant] = row
+
+        variants, invalid = self.validated(variants)
+        for variant, errors in invalid.items():
+            self.failed(variant_rows[variant], errors)
+        return ProductVariant.objects.bulk_create(variants)
+
+    def refresh_products(self, created: list[Product], product_ids: set) -> None:
+        """Does what the signals of the saves do for the bulk created objects"""
+        ProductListing.objects.bulk_create(
+            [ProductListing(product_id=product.pk) for product in created]
+        )
+        product_ids |= {product.pk for product in created}
+        for product_id in product_ids:
+            refresh_product_listing(product_id)
+        refresh_search_documents(product_ids)
+        invalidate_responses("product", product_ids)
+        if product_ids:
+            # the new variants may belong to the products of the discount rules
+            invalidate_rule_set(schedule=False)
+            refresh_entitlements(
+                rules_entitling(product_ids),
+                ProductVariant.objects.filter(product_id__in=product_ids),
+            )
@@ -0,0 +1,90 @@
+"""
+This module contains the stock reservation of the product variants
+
+The stock is decremented with one conditional `UPDATE ... WHERE quantity >= n`
+per variant, so a unit can never be sold twice whatever the number of concurrent
+checkouts, without reading the quantities first.
+
+The variants are updated in the order of their ids, so two transactions
+reserving the same variants lock their rows in the same order and can't deadlock.
+The listings of the products are adjusted the same way once all the variants are.
+"""
+
+from collections import Counter
+from typing import Iterable
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.cache import invalidate_responses
+from product.models import ProductListing, ProductVariant
+
+
+class InsufficientStock(Exception):
+    """Raised when a variant has not enough stock for a reservation"""
+
+    def __init__(self, variant_ids: list) -> None:
+        self.variant_ids = variant_ids
+        super().__init__("Not enough stock")
+
+
+def quantities_of(items: Iterable[tuple]) -> dict:
+    """Sums the (variant id, quantity) pairs by variant"""
+    quantities = Counter()
+    for variant_id, quantity in items:
+        quantities[variant_id] += quantity
+    return dict(quantities)
+
+
+def adjust_listings(quantities: dict, sign: int) -> None:
+    """Adjusts the in stock counts of the listings of the variants products"""
+    by_product = Counter()
+    variants = ProductVariant.objects.filter(pk__in=quantities.keys()).values_list(
+        "pk", "product_id"
+    )
+    for variant_id, product_id in variants:
+        by_product[product_id] += quantities[variant_id]
+    for product_id in sorted(by_product, key=str):
+        ProductListing.objects.filter(product_id=product_id).update(
+            in_stock=F("in_stock") + sign * by_product[product_id],
+            updated_at=timezone.now(),
+        )
+    invalidate_responses("product", by_product.keys())
+
+
+def reserve_stock(quantities: dict) -> None:
+    """
+    Decrements the stock of the variants by the given quantities
+
+    Args:
+        quantities: a dict mapping variant ids to the quantities to reserve
+
+    Raises:
+        InsufficientStock: if any variant has not enough stock,
+            nothing is reserved then (the transaction is rolled back)
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        short = []
+        for variant_id in sorted(quantities, key=str):
+            quantity = quantities[variant_id]
+            updated = ProductVariant.objects.filter(
+                pk=variant_id, quantity__gte=quantity
+            ).update(quantity=F("quantity") - quantity, updated_at=now)
+            if not updated:
+                short.append(variant_id)
+        if short:
+            raise InsufficientStock(short)
+        adjust_listings(quantities, -1)
+
+
+def release_stock(quantities: dict) -> None:
+    """Gives back the reserved quantities of the variants to their stock"""
+    now = timezone.now()
+    with transaction.atomic():
+        for variant_id in sorted(quantities, key=str):
+            ProductVariant.objects.filter(pk=variant_id).update(
+                quantity=F("quantity") + quantities[variant_id], updated_at=now
+            )
+        adjust_listings(quantities, 1)
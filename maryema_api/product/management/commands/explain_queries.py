@@ -0,0 +1,177 @@
+from dataclasses import dataclass, field
+from profile.models import Profile
+from typing import Callable
+from uuid import uuid4
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from cart.models import CartItem
+from core.pagination import KeysetPagination
+from discount.models import DiscountCode
+from feedback.models import Feedback
+from order.views import OrderViewSet
+from product.models import Product, ProductVariant
+from product.views import ProductViewSet
+
+
+@dataclass(frozen=True)
+class EndpointQuery:
+    """
+    A query run by an endpoint
+
+    Either the queryset of a viewset action (with the given query params and role)
+    or a queryset built by `build` for the queries run outside of `get_queryset`.
+    """
+
+    name: str
+    viewset: type | None = None
+    action: str = "list"
+    params: dict = field(default_factory=dict)
+    role: str | None = None
+    build: Callable[[], QuerySet] | None = None
+
+    def get_user(self) -> User | None:
+        if self.role is None:
+            return None
+        profile = Profile.objects.filter(role=self.role).select_related("user").first()
+        if profile is None:
+            raise LookupError(f"no {self.role} profile to run the query as")
+        return profile.user
+
+    def queryset(self) -> QuerySet:
+        if self.build is not None:
+            return self.build()
+        request = APIRequestFactory().get("/", self.params)
+        user = self.get_user()
+        if user is not None:
+            force_authenticate(request, user=user)
+        view = self.viewset(
+            action_map={"get": self.action}, format_kwarg=None, args=(), kwargs={}
+        )
+        view.request = view.initialize_request(request)
+        queryset = view.filter_queryset(view.get_queryset())
+        if self.action == "list" and view.paginator is not None:
+            # the first page, the way the paginator slices it
+            queryset = queryset[: view.paginator.page_size]
+        return queryset
+
+
+def sample_product_id():
+    return Product.objects.values_list("pk", flat=True).first() or uuid4()
+
+
+def feedback_page(*conditions: Q) -> QuerySet:
+    """The first page of the feedbacks of a product, the way the feedback action gets it"""
+    return Feedback.objects.filter(*conditions, product=sample_product_id()).order_by(
+        *ProductViewSet.feedback_ordering
+    )[: KeysetPagination.page_size]
+
+
+ENDPOINT_QUERIES = [
+    EndpointQuery("products", ProductViewSet),
+    EndpointQuery(
+        "products-filtered",
+        ProductViewSet,
+        params={"min_price": 100, "max_price": 500, "size": "M", "color_name": "red"},
+    ),
+    EndpointQuery(
+        "products-by-price", ProductViewSet, params={"ordering": "variant__price"}
+    ),
+    EndpointQuery("products-search", ProductViewSet, params={"search": "dress"}),
+    EndpointQuery(
+        "product-variants",
+        build=lambda: ProductVariant.objects.filter(
+            product=sample_product_id()
+        ).select_related("color", "size", "image"),
+    ),
+    EndpointQuery(
+        "products-by-rating",
+        ProductViewSet,
+        params={"ordering": "-rating,-rating_count"},
+    ),
+    EndpointQuery(
+        "product-feedback",
+        build=feedback_page,
+    ),
+    EndpointQuery(
+        "product-feedback-commented",
+        build=lambda: feedback_page(~Q(comment="")),
+    ),
+    EndpointQuery("orders", OrderViewSet, role=Profile.RoleChoices.CUSTOMER),
+    EndpointQuery(
+        "orders-pending",
+        OrderViewSet,
+        params={"status": "pending"},
+        role=Profile.RoleChoices.ADMIN,
+    ),
+    EndpointQuery(
+        "cart-items",
+        build=lambda: CartItem.objects.filter(
+            cart__customer__role=Profile.RoleChoices.CUSTOMER, cart__is_active=True
+        ).select_related("product_variant"),
+    ),
+    EndpointQuery(
+        "discount-code",
+        build=lambda: DiscountCode.objects.filter(
+            code="SAMPLE", ends_at__gte=timezone.now()
+        ),
+    ),
+]
+
+
+class Command(BaseCommand):
+    help = "Prints the EXPLAIN plans of the queries run by the API endpoints"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "names",
+            nargs="*",
+            help="Only explain these queries (all of them by default)",
+        )
+        parser.add_argument(
+            "--analyze",
+            action="store_true",
+            help="Run the queries and show the actual timings (PostgreSQL only)",
+        )
+        parser.add_argument(
+            "--sql", action="store_true", help="Print the SQL of the queries too"
+        )
+        parser.add_argument(
+            "--list", action="store_true", help="List the registered queries"
+        )
+
+    def handle(self, *args, **options):
+        queries = ENDPOINT_QUERIES
+        if options["list"]:
+            for query in queries:
+                self.stdout.write(query.name)
+            return
+
+        if options["names"]:
+            unknown = set(options["names"]) - {query.name for query in queries}
+            if unknown:
+                raise CommandError(f"Unknown queries: {', '.join(sorted(unknown))}")
+            queries = [query for query in queries if query.name in options["names"]]
+
+        explain_options = {}
+        if options["analyze"]:
+            if connection.vendor != "postgresql":
+                raise CommandError("--analyze is only supported on PostgreSQL")
+            explain_options = {"analyze": True, "buffers": True}
+
+        for query in queries:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"== {query.name}"))
+            try:
+                queryset = query.queryset()
+            except LookupError as e:
+                self.stdout.write(self.style.WARNING(f"skipped: {e}"))
+                continue
+            if options["sql"]:
+                self.stdout.write(str(queryset.query))
+            self.stdout.write(queryset.explain(**explain_options))
+            self.stdout.write("")
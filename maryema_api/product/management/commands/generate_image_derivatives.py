@@ -0,0 +1,48 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from product.images import process_image
+from product.models import Img
+
+
+class Command(BaseCommand):
+    help = "Generates the resized derivatives of the images missing them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Regenerate the derivatives of all the images",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=max(settings.IMAGE_WORKERS, 1),
+            help="The number of images processed at once",
+        )
+
+    def process(self, img_id):
+        try:
+            return process_image(img_id)
+        except Exception as e:
+            self.stderr.write(f"{img_id}: {e}")
+        finally:
+            connection.close()
+
+    def handle(self, *args, **options):
+        images = Img.objects.all()
+        if not options["all"]:
+            images = images.filter(derivatives={})
+        ids = list(images.values_list("pk", flat=True))
+        if options["workers"] > 1:
+            with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+                results = list(executor.map(self.process, ids))
+        else:
+            results = [process_image(img_id) for img_id in ids]
+        count = sum(result is not None for result in results)
+        self.stdout.write(
+            self.style.SUCCESS(f"Generated the derivatives of {count} images")
+        )
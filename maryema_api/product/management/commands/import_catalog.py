@@ -0,0 +1,50 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from product.importer import CHUNK_SIZE, CatalogImporter, ImportReport, guess_format
+from product.serializers.catalog_import import FORMATS
+
+
+class Command(BaseCommand):
+    help = "Imports products and variants from CSV or JSONL files"
+
+    def add_arguments(self, parser):
+        parser.add_argument("files", nargs="+", help="The paths of the files")
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="The format of the files, guessed from their extensions by default",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=CHUNK_SIZE,
+            help="The number of rows imported per transaction",
+        )
+
+    def handle(self, *args, **options):
+        for path in options["files"]:
+            try:
+                format = options["format"] or guess_format(path)
+            except ValueError as e:
+                raise CommandError(e)
+            importer = CatalogImporter(chunk_size=options["chunk_size"])
+            with open(path, encoding="utf-8-sig", newline="") as file:
+                report = importer.import_file(file, format)
+            self.write_report(path, report)
+
+    def write_report(self, path: str, report: ImportReport) -> None:
+        for error in report.errors:
+            self.stderr.write(f"{path}:{error.line}: {json.dumps(error.errors)}")
+        if report.error_count > len(report.errors):
+            self.stderr.write(
+                f"... and {report.error_count - len(report.errors)} more errors"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{path}: imported {report.products} products and"
+                f" {report.variants} variants from {report.rows} rows,"
+                f" {report.error_count} rows failed"
+            )
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from product.services import rebuild_product_listings
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the denormalized listings of all the products"
+
+    def handle(self, *args, **options):
+        count = rebuild_product_listings()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} product listings"))
@@ -0,0 +1,115 @@
+# Generated by Django 5.1.15 on 2026-10-18 11:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+
+
+def create_listings(apps, schema_editor):
+    """Builds the listings of the already existing products"""
+    Product = apps.get_model("product", "Product")
+    ProductListing = apps.get_model("product", "ProductListing")
+    ProductVariant = apps.get_model("product", "ProductVariant")
+
+    for product in Product.objects.all().iterator():
+        variants = ProductVariant.objects.filter(product=product)
+        values = variants.aggregate(
+            min_price=Min("price"),
+            max_price=Max("price"),
+            in_stock=Sum("quantity"),
+            variant_count=Count("pk"),
+        )
+        lead_variant = variants.select_related("image").order_by("sort_order").first()
+        ProductListing.objects.create(
+            product=product,
+            lead_variant=lead_variant,
+            image=lead_variant.image.src.name if lead_variant else "",
+            price=lead_variant.price if lead_variant else None,
+            min_price=values["min_price"],
+            max_price=values["max_price"],
+            in_stock=values["in_stock"] or 0,
+            variant_count=values["variant_count"],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("product", "0013_alter_color_options_alter_product_options_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductListing",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="listing",
+                        related_query_name="listing",
+                        serialize=False,
+                        to="product.product",
+                    ),
+                ),
+                (
+                    "image",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        help_text="The stored name of the lead variant image.",
+                        max_length=255,
+                    ),
+                ),
+                (
+                    "price",
+                    models.DecimalField(
+                        blank=True,
+                        decimal_places=2,
+                        help_text="The price of the lead variant.",
+                        max_digits=10,
+                        null=True,
+                    ),
+                ),
+                (
+                    "min_price",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=10, null=True
+                    ),
+                ),
+                (
+                    "max_price",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=10, null=True
+                    ),
+                ),
+                (
+                    "in_stock",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="The total quantity of all the variants of the product.",
+                    ),
+                ),
+                ("variant_count", models.PositiveIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "lead_variant",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="The variant with the lowest sort order (shown on the product card).",
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="product.productvariant",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Product Listing",
+                "verbose_name_plural": "Product Listings",
+                "db_table": "product_listings",
+            },
+        ),
+        migrations.RunPython(create_listings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.1.15 on 2026-10-18 11:51
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+SEARCH_VECTOR_SQL = " || ".join(
+    f"setweight(to_tsvector('simple', coalesce(search_document->>'{weight}', ''))"
+    f", '{weight}')"
+    for weight in "ABCD"
+)
+
+
+def build_search_documents(apps, schema_editor):
+    """Builds the search documents of the existing listings"""
+    ProductListing = apps.get_model("product", "ProductListing")
+    ProductVariant = apps.get_model("product", "ProductVariant")
+
+    listings = ProductListing.objects.select_related("product__category")
+    for listing in listings.iterator():
+        product = listing.product
+        colors = set()
+        variants = ProductVariant.objects.filter(product=product, color__isnull=False)
+        for color1, color2 in variants.values_list(
+            "color__color1_name", "color__color2_name"
+        ):
+            colors.update(name for name in (color1, color2) if name)
+        collections = product.collections.values_list("name", flat=True)
+        listing.search_document = {
+            "A": product.name,
+            "B": " ".join(tag.strip() for tag in product.tags.split(",")),
+            "C": " ".join([product.category.name, *sorted(collections)]),
+            "D": " ".join(sorted(colors)),
+        }
+        listing.save(update_fields=["search_document"])
+
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            f"UPDATE product_listings SET search_vector = {SEARCH_VECTOR_SQL}"
+        )
+
+
+def create_search_index(apps, schema_editor):
+    """Creates the GIN index of the search vectors (PostgreSQL only)"""
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE INDEX product_listings_search_idx "
+            "ON product_listings USING gin (search_vector)"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS product_listings_search_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("product", "0014_productlisting"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productlisting",
+            name="search_document",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                help_text="The weighted text the product is searched by ({weight: text}).",
+            ),
+        ),
+        migrations.AddField(
+            model_name="productlisting",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                blank=True,
+                editable=False,
+                help_text="The search document compiled for PostgreSQL full-text search.",
+                null=True,
+            ),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(build_search_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-18 12:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("product", "0015_productlisting_search"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="productvariant",
+            index=models.Index(
+                fields=["product", "sort_order"], name="variant_product_order_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productvariant",
+            index=models.Index(fields=["price"], name="variant_price_idx"),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.15 on 2026-10-18 12:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("product", "0016_productvariant_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="img",
+            name="derivatives",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                editable=False,
+                help_text="The stored names of the resized copies of the image ({format: {width: name}}).",
+            ),
+        ),
+        migrations.AddField(
+            model_name="productlisting",
+            name="image_derivatives",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                help_text="The resized copies of the lead variant image (see Img.derivatives).",
+            ),
+        ),
+    ]
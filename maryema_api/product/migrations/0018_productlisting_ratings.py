@@ -0,0 +1,66 @@
+# Generated by Django 5.1.15 on 2026-10-18 12:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("product", "0017_img_derivatives"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productlisting",
+            name="rating_1",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="productlisting",
+            name="rating_2",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="productlisting",
+            name="rating_3",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="productlisting",
+            name="rating_4",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="productlisting",
+            name="rating_5",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="productlisting",
+            name="rating_average",
+            field=models.FloatField(
+                default=0,
+                help_text="The average rate, 0 while the product has no rates.",
+            ),
+        ),
+        migrations.AddField(
+            model_name="productlisting",
+            name="rating_count",
+            field=models.PositiveIntegerField(
+                default=0, help_text="The number of the feedbacks rating the product."
+            ),
+        ),
+        migrations.AddField(
+            model_name="productlisting",
+            name="rating_sum",
+            field=models.PositiveIntegerField(
+                default=0, help_text="The sum of the rates of the feedbacks."
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productlisting",
+            index=models.Index(
+                fields=["-rating_average", "-rating_count"], name="listing_rating_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.15 on 2026-10-18 14:00
+
+import uuid
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("product", "0018_productlisting_ratings"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StoredFile",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("name", models.CharField(max_length=255, unique=True)),
+            ],
+            options={
+                "verbose_name": "Stored file",
+                "verbose_name_plural": "Stored files",
+                "db_table": "stored_files",
+            },
+        ),
+    ]
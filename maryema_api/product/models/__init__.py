@@ -1,8 +1,9 @@
 from product.models.division import Division
 from product.models.category import Category
 from product.models.product import Product
-from product.models.image import Img
+from product.models.image import Img, StoredFile
 from product.models.collection import Collection
 from product.models.color import Color
 from product.models.size import Size
 from product.models.variant import ProductVariant
+from product.models.listing import ProductListing
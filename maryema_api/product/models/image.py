@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 
 from core.models import BaseModel
 
@@ -8,6 +8,12 @@ class Img(BaseModel):
 
     src = models.ImageField(upload_to="product_images")
     alt = models.CharField(max_length=255, blank=True, default="")
+    derivatives = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="The stored names of the resized copies of the image ({format: {width: name}}).",
+    )
 
     class Meta:
         verbose_name = "Image"
@@ -16,3 +22,22 @@ class Img(BaseModel):
 
     def __str__(self) -> str:
         return self.alt
+
+    def save(self, *args, **kwargs) -> None:
+        # the stored file is locked (see product.images) until the image references it
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class StoredFile(BaseModel):
+    """The row locked while the images referencing a stored original are counted or changed"""
+
+    name = models.CharField(max_length=255, unique=True)
+
+    class Meta:
+        verbose_name = "Stored file"
+        verbose_name_plural = "Stored files"
+        db_table = "stored_files"
+
+    def __str__(self) -> str:
+        return self.name
@@ -0,0 +1,98 @@
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models
+
+from product.models import Product, ProductVariant
+
+
+class ProductListing(models.Model):
+    """A denormalized read model holding what the public products list shows for a product
+
+    It is kept up to date by the signals of the product app
+    whenever a variant or an image of the product is written,
+    and its ratings by the signals of the feedback app (`rating_<n>` counts the n stars rates).
+    """
+
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="listing",
+        related_query_name="listing",
+    )
+    lead_variant = models.ForeignKey(
+        ProductVariant,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+        help_text="The variant with the lowest sort order (shown on the product card).",
+    )
+    image = models.CharField(
+        max_length=255,
+        blank=True,
+        default="",
+        help_text="The stored name of the lead variant image.",
+    )
+    image_derivatives = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="The resized copies of the lead variant image (see Img.derivatives).",
+    )
+    price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        help_text="The price of the lead variant.",
+    )
+    min_price = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True
+    )
+    max_price = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True
+    )
+    in_stock = models.PositiveIntegerField(
+        default=0, help_text="The total quantity of all the variants of the product."
+    )
+    variant_count = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(
+        default=0, help_text="The number of the feedbacks rating the product."
+    )
+    rating_sum = models.PositiveIntegerField(
+        default=0, help_text="The sum of the rates of the feedbacks."
+    )
+    rating_average = models.FloatField(
+        default=0, help_text="The average rate, 0 while the product has no rates."
+    )
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
+    search_document = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="The weighted text the product is searched by ({weight: text}).",
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="The search document compiled for PostgreSQL full-text search.",
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Product Listing"
+        verbose_name_plural = "Product Listings"
+        db_table = "product_listings"
+        indexes = [
+            # the products sorted by rating
+            models.Index(
+                fields=["-rating_average", "-rating_count"],
+                name="listing_rating_idx",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{str(self.product)} listing"
@@ -64,6 +64,14 @@ class ProductVariant(BaseModel):
                 fields=["sort_order", "product"], name="unique_sort_order"
             ),
         ]
+        indexes = [
+            # the variants of a product in order (product details, lead variant)
+            models.Index(
+                fields=["product", "sort_order"], name="variant_product_order_idx"
+            ),
+            # the price filters and ordering
+            models.Index(fields=["price"], name="variant_price_idx"),
+        ]
 
     def clean(self, *args, **kwargs) -> None:
         """Override the clean method to ensure price is greater than cost"""
@@ -0,0 +1,236 @@
+"""
+This module contains the full-text search of the products
+
+Each product listing holds a weighted search document built from:
+
+- A: the name of the product
+- B: the tags of the product (comma separated)
+- C: the names of its category and collections
+- D: the names of the colors of its variants
+
+On PostgreSQL the document is compiled into an indexed `tsvector` and searched with
+ranked prefix queries, on the other databases (SQLite for the test runs)
+an in-process inverted index is built from the documents instead.
+"""
+
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from itertools import islice
+from typing import Iterable
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import Case, Count, F, FloatField, Max, QuerySet, Value, When
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from product.models import Collection, Product, ProductListing, ProductVariant
+
+WEIGHTS = {"A": 1.0, "B": 0.4, "C": 0.2, "D": 0.1}
+SEARCH_CONFIG = "simple"
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Splits a text into lower case word tokens"""
+    return TOKEN_RE.findall(text.lower())
+
+
+def build_search_documents(product_ids: Iterable) -> dict:
+    """
+    Builds the weighted search documents of the given products
+
+    It runs a constant number of queries whatever the number of products.
+
+    Returns:
+        a dict mapping each product id to its document {weight: text}
+    """
+    product_ids = list(product_ids)
+    documents = {}
+    products = Product.objects.filter(pk__in=product_ids).values_list(
+        "pk", "name", "tags", "category__name"
+    )
+    for pk, name, tags, category in products:
+        documents[pk] = {
+            "A": name,
+            "B": " ".join(tag.strip() for tag in tags.split(",")),
+            "C": category,
+            "D": "",
+        }
+
+    related = defaultdict(lambda: {"C": set(), "D": set()})
+    collections = Collection.products.through.objects.filter(
+        product_id__in=product_ids
+    ).values_list("product_id", "collection__name")
+    for product_id, name in collections:
+        related[product_id]["C"].add(name)
+    colors = (
+        ProductVariant.objects.filter(product_id__in=product_ids, color__isnull=False)
+        .values_list("product_id", "color__color1_name", "color__color2_name")
+        .distinct()
+    )
+    for product_id, color1, color2 in colors:
+        related[product_id]["D"].update(name for name in (color1, color2) if name)
+
+    for product_id, names in related.items():
+        if product_id in documents:
+            documents[product_id]["C"] = " ".join(
+                [documents[product_id]["C"], *sorted(names["C"])]
+            )
+            documents[product_id]["D"] = " ".join(sorted(names["D"]))
+    return documents
+
+
+def search_vector() -> SearchVector:
+    """The tsvector expression compiled from the search document of a listing"""
+    vector = None
+    for weight in WEIGHTS:
+        part = SearchVector(
+            Coalesce(KeyTextTransform(weight, "search_document"), Value("")),
+            weight=weight,
+            config=SEARCH_CONFIG,
+        )
+        vector = part if vector is None else vector + part
+    return vector
+
+
+def refresh_search_documents(product_ids: Iterable) -> None:
+    """Rebuilds the search documents (and vectors) of the listings of the given products"""
+    documents = build_search_documents(product_ids)
+    listings = list(ProductListing.objects.filter(product_id__in=documents.keys()))
+    now = timezone.now()
+    for listing in listings:
+        listing.search_document = documents[listing.product_id]
+        listing.updated_at = now
+    ProductListing.objects.bulk_update(
+        listings, ["search_document", "updated_at"], batch_size=500
+    )
+    if connection.vendor == "postgresql":
+        ProductListing.objects.filter(product_id__in=documents.keys()).update(
+            search_vector=search_vector()
+        )
+
+
+class PostgresSearchBackend:
+    """Searches the indexed tsvector of the listings with ranked prefix queries"""
+
+    def search(self, queryset: QuerySet, terms: list[str]) -> QuerySet:
+        tokens = [token for term in terms for token in tokenize(term)]
+        if not tokens:
+            return queryset
+        query = SearchQuery(
+            " & ".join(f"{token}:*" for token in tokens),
+            search_type="raw",
+            config=SEARCH_CONFIG,
+        )
+        return (
+            queryset.filter(listing__search_vector=query)
+            .annotate(
+                search_rank=SearchRank(
+                    F("listing__search_vector"),
+                    query,
+                    weights=[WEIGHTS[weight] for weight in "DCBA"],
+                )
+            )
+            .order_by("-search_rank", "-created_at")
+        )
+
+
+class InvertedIndexSearchBackend:
+    """
+    Searches an in-process inverted index built from the search documents
+
+    The index maps each token to the best weight it has in each product,
+    it is rebuilt when the listings change (checked with one query per search).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._version = None
+        self._postings: dict[str, dict] = {}
+        self._tokens: list[str] = []
+
+    def _current_version(self) -> tuple:
+        state = ProductListing.objects.aggregate(
+            count=Count("pk"), updated_at=Max("updated_at")
+        )
+        return state["count"], state["updated_at"]
+
+    def _build(self) -> None:
+        postings = defaultdict(dict)
+        documents = ProductListing.objects.values_list("product_id", "search_document")
+        for product_id, document in documents.iterator(chunk_size=2000):
+            for weight, text in (document or {}).items():
+                for token in tokenize(text):
+                    score = postings[token].get(product_id, 0)
+                    postings[token][product_id] = max(score, WEIGHTS[weight])
+        self._postings = dict(postings)
+        self._tokens = sorted(postings)
+
+    def _ensure_index(self) -> None:
+        version = self._current_version()
+        with self._lock:
+            if version != self._version:
+                self._build()
+                self._version = version
+
+    def _match(self, prefix: str) -> dict:
+        """Returns the best score of each product having a token starting with prefix"""
+        matches = {}
+        start = bisect_left(self._tokens, prefix)
+        for token in islice(self._tokens, start, None):
+            if not token.startswith(prefix):
+                break
+            for product_id, score in self._postings[token].items():
+                matches[product_id] = max(score, matches.get(product_id, 0))
+        return matches
+
+    def rank(self, terms: list[str]) -> list[tuple]:
+        """Returns the (product id, score) pairs matching all the terms, best first"""
+        tokens = [token for term in terms for token in tokenize(term)]
+        if not tokens:
+            return []
+        self._ensure_index()
+        scores = None
+        for token in tokens:
+            matches = self._match(token)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {
+                    pk: score + matches[pk]
+                    for pk, score in scores.items()
+                    if pk in matches
+                }
+            if not scores:
+                return []
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+    def search(self, queryset: QuerySet, terms: list[str]) -> QuerySet:
+        if not any(tokenize(term) for term in terms):
+            return queryset
+        ranked = self.rank(terms)
+        rank = Case(
+            *[When(pk=pk, then=Value(score)) for pk, score in ranked],
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+        return (
+            queryset.filter(pk__in=[pk for pk, _ in ranked])
+            .annotate(search_rank=rank)
+            .order_by("-search_rank", "-created_at")
+        )
+
+
+_inverted_index_backend = InvertedIndexSearchBackend()
+
+
+def get_search_backend():
+    """Returns the search backend suitable for the database in use"""
+    if connection.vendor == "postgresql":
+        return PostgresSearchBackend()
+    return _inverted_index_backend
@@ -1,3 +1,7 @@
+from product.serializers.catalog_import import (
+    CatalogImportSerializer,
+    CatalogRowSerializer,
+)
 from product.serializers.category import (
     CategorySerializer,
     DivisionNestedCategorySerializer,
@@ -19,4 +23,5 @@ from product.serializers.size import SizeSerializer
 from product.serializers.variant import (
     ProductDetailVariantSerializer,
     VariantSerializer,
+    WishlistUpdateSerializer,
 )
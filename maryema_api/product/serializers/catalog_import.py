@@ -0,0 +1,75 @@
+from rest_framework import serializers
+
+from product.models.color import validate_color
+from product.models.size import validate_size
+
+FORMATS = ["csv", "jsonl"]
+
+
+class CatalogRowSerializer(serializers.Serializer):
+    """
+    A row of a catalog import, one variant with its product
+
+    The product is identified by its name in its category,
+    its description and tags are read from its first row.
+    The division is only needed to create a new category.
+    """
+
+    product = serializers.CharField(max_length=64)
+    description = serializers.CharField(required=False, allow_blank=True, default="")
+    tags = serializers.CharField(required=False, allow_blank=True, default="")
+    category = serializers.CharField(max_length=64)
+    division = serializers.CharField(max_length=64, required=False, allow_blank=True)
+    color1_name = serializers.CharField(max_length=20)
+    color1_value = serializers.CharField(
+        max_length=7, required=False, allow_blank=True, validators=[validate_color]
+    )
+    color2_name = serializers.CharField(max_length=20, required=False, allow_blank=True)
+    color2_value = serializers.CharField(
+        max_length=7, required=False, allow_blank=True, validators=[validate_color]
+    )
+    size = serializers.CharField(max_length=3, validators=[validate_size])
+    image = serializers.CharField(
+        max_length=100, help_text="The path of the image in the media storage"
+    )
+    alt = serializers.CharField(
+        max_length=255, required=False, allow_blank=True, default=""
+    )
+    cost = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+    quantity = serializers.IntegerField(min_value=0, max_value=32767)
+    sort_order = serializers.IntegerField(
+        min_value=1, max_value=32767, required=False, allow_null=True
+    )
+
+    def to_internal_value(self, data):
+        # the empty cells of a CSV are omitted, so they get their defaults
+        if isinstance(data, dict):
+            data = {key: value for key, value in data.items() if value != ""}
+        return super().to_internal_value(data)
+
+    def validate_image(self, value):
+        parts = value.replace("\\", "/").split("/")
+        if value.startswith(("/", "\\")) or ".." in parts:
+            raise serializers.ValidationError(
+                "The path must be relative to the media storage, without '..'"
+            )
+        return value
+
+    def validate(self, attrs):
+        if attrs["price"] < attrs["cost"]:
+            raise serializers.ValidationError(
+                {"price": "Price cannot be less than cost"}
+            )
+        return attrs
+
+
+class CatalogImportSerializer(serializers.Serializer):
+    """The upload of a catalog file to import"""
+
+    file = serializers.FileField()
+    format = serializers.ChoiceField(
+        choices=FORMATS,
+        required=False,
+        help_text="Guessed from the extension of the file if not given",
+    )
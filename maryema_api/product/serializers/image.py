@@ -1,19 +1,31 @@
 from rest_framework import serializers
 
+from product.images import srcset_map
 from product.models import Img
 
 
 class ImgSerializer(serializers.ModelSerializer):
     url = serializers.HyperlinkedIdentityField(view_name="img-detail", read_only=True)
+    srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Img
         fields = "__all__"
         read_only_fields = ["id", "created_at", "updated_at"]
 
+    def get_srcset(self, obj) -> dict:
+        return srcset_map(obj.derivatives)
+
 
 class NestedImgSerializer(serializers.ModelSerializer):
+    """The image of a variant with the srcset of its derivatives ({format: srcset})"""
+
+    srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = Img
-        exclude = ["created_at", "updated_at"]
+        exclude = ["created_at", "updated_at", "derivatives"]
         read_only_fields = ["id", "src", "alt"]
+
+    def get_srcset(self, obj) -> dict:
+        return srcset_map(obj.derivatives)
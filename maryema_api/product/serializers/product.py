@@ -1,8 +1,10 @@
 from profile.models import Profile
 
-from django.db.models import Sum
+from django.core.files.storage import default_storage
 from rest_framework import serializers
 
+from discount.entitlements import sale_price, variant_discount
+from product.images import card_image, srcset_map
 from product.models import Product
 from product.serializers.category import NestedCategorySerializer
 from product.serializers.variant import ProductDetailVariantSerializer
@@ -33,15 +35,25 @@ class ProductSerializer(serializers.ModelSerializer):
 
 
 class ProductListPublicSerializer(serializers.ModelSerializer):
-    """A serializer for Product model specific to public and for list action"""
+    """A serializer for Product model specific to public and for list action
+
+    The card values (image, price and stock) are read from the product listing
+    so the view should select it along with the product.
+    The sale price is the price of the lead variant with its current automatic discount
+    (annotated as `sale_discount`, see `discount.entitlements.current_discount`).
+    The image is a card-sized derivative of the lead variant image once it is generated.
+    """
 
     url = serializers.HyperlinkedIdentityField(
         view_name="product-detail", read_only=True
     )
     category = NestedCategorySerializer(read_only=True)
     image = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
     price = serializers.SerializerMethodField()
+    sale_price = serializers.SerializerMethodField()
     in_stock = serializers.SerializerMethodField()
+    rating = serializers.SerializerMethodField()
     feedback = serializers.HyperlinkedIdentityField(
         view_name="product-feedback", read_only=True
     )
@@ -59,25 +71,50 @@ class ProductListPublicSerializer(serializers.ModelSerializer):
         ]
 
     def get_image(self, obj):
-        if obj.variants.count() == 0:
+        listing = getattr(obj, "listing", None)
+        if listing is None or not listing.image:
             return None
-        return obj.variants.get(sort_order=1).image.src.url
+        return default_storage.url(card_image(listing.image_derivatives, listing.image))
+
+    def get_srcset(self, obj):
+        listing = getattr(obj, "listing", None)
+        return srcset_map(listing.image_derivatives) if listing else {}
 
     def get_price(self, obj):
-        if obj.variants.count() == 0:
+        listing = getattr(obj, "listing", None)
+        return listing.price if listing else None
+
+    def get_sale_price(self, obj):
+        listing = getattr(obj, "listing", None)
+        if listing is None:
             return None
-        return obj.variants.get(sort_order=1).price
+        discount = getattr(obj, "sale_discount", None)
+        if discount is None:
+            discount = variant_discount(listing.lead_variant_id)
+        return sale_price(listing.price, discount)
 
     def get_in_stock(self, obj):
-        if obj.variants.count() == 0:
-            return 0
-        return obj.variants.all().aggregate(in_stock=Sum("quantity"))["in_stock"]
+        listing = getattr(obj, "listing", None)
+        return listing.in_stock if listing else 0
+
+    def get_rating(self, obj):
+        listing = getattr(obj, "listing", None)
+        if listing is None:
+            return {"average": 0, "count": 0}
+        return {
+            "average": round(listing.rating_average, 2),
+            "count": listing.rating_count,
+        }
 
 
 class ProductDetailPublicSerializer(serializers.ModelSerializer):
-    """A serializer for Product model specific to public and for retrieve action"""
+    """A serializer for Product model specific to public and for retrieve action
+
+    The rating is read from the product listing, with the count of each star ({stars: count}).
+    """
 
     variants = ProductDetailVariantSerializer(many=True, read_only=True)
+    rating = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
@@ -91,3 +128,16 @@ class ProductDetailPublicSerializer(serializers.ModelSerializer):
             "description",
             "category",
         ]
+
+    def get_rating(self, obj):
+        listing = getattr(obj, "listing", None)
+        if listing is None:
+            return {"average": 0, "count": 0, "sum": 0, "histogram": {}}
+        return {
+            "average": round(listing.rating_average, 2),
+            "count": listing.rating_count,
+            "sum": listing.rating_sum,
+            "histogram": {
+                str(stars): getattr(listing, f"rating_{stars}") for stars in range(1, 6)
+            },
+        }
@@ -1,20 +1,42 @@
 from rest_framework import serializers
 
+from core.validation import TrustedSaveMixin
+from discount.entitlements import sale_price, variant_discount
 from product.models import ProductVariant
 from product.serializers.color import NestedColorSerializer
 from product.serializers.image import NestedImgSerializer
 from product.serializers.size import NestedSizeSerializer
 
 
-class VariantSerializer(serializers.ModelSerializer):
+def get_sale_price(serializer, obj):
+    """
+    The price of a variant with its current automatic discount, rendered as its price
+
+    The discount is annotated on the querysets of the views
+    (see `discount.entitlements.current_discount`).
+    """
+    discount = getattr(obj, "sale_discount", None)
+    if discount is None:
+        discount = variant_discount(obj.pk)
+    price = sale_price(obj.price, discount)
+    return serializer.fields["price"].to_representation(price)
+
+
+class VariantSerializer(TrustedSaveMixin, serializers.ModelSerializer):
     url = serializers.HyperlinkedIdentityField(
         view_name="variant-detail",
         read_only=True,
     )
     wished_by = serializers.SerializerMethodField()
+    sale_price = serializers.SerializerMethodField()
 
     def get_wished_by(self, obj):
-        return obj.wished_by.count()
+        # annotated on the querysets of the views (see `profile.wishlist.wished_by_count`)
+        count = getattr(obj, "wished_by_count", None)
+        return obj.wished_by.count() if count is None else count
+
+    def get_sale_price(self, obj):
+        return get_sale_price(self, obj)
 
     class Meta:
         model = ProductVariant
@@ -22,12 +44,48 @@ class VariantSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "created_at", "updated_at"]
 
 
+class WishlistUpdateSerializer(serializers.Serializer):
+    """The variants to add to and remove from the wishlist of the current user"""
+
+    MAX_VARIANTS = 100
+
+    add = serializers.ListField(
+        child=serializers.UUIDField(), max_length=MAX_VARIANTS, default=list
+    )
+    remove = serializers.ListField(
+        child=serializers.UUIDField(), max_length=MAX_VARIANTS, default=list
+    )
+
+    def validate(self, attrs):
+        add, remove = set(attrs["add"]), set(attrs["remove"])
+        if not add and not remove:
+            raise serializers.ValidationError("No variants to add or remove")
+        if add & remove:
+            raise serializers.ValidationError(
+                "A variant can't be both added and removed"
+            )
+        existing = set(
+            ProductVariant.objects.filter(pk__in=add | remove).values_list(
+                "pk", flat=True
+            )
+        )
+        errors = {
+            name: [f"Unknown variant: {pk}" for pk in attrs[name] if pk not in existing]
+            for name in ("add", "remove")
+        }
+        errors = {name: messages for name, messages in errors.items() if messages}
+        if errors:
+            raise serializers.ValidationError(errors)
+        return attrs
+
+
 class ProductDetailVariantSerializer(serializers.ModelSerializer):
     """A serializer for ProductVariant model specific to product-detail public view"""
 
     color = NestedColorSerializer(read_only=True)
     size = NestedSizeSerializer(read_only=True)
     image = NestedImgSerializer(read_only=True)
+    sale_price = serializers.SerializerMethodField()
 
     class Meta:
         model = ProductVariant
@@ -41,3 +99,6 @@ class ProductDetailVariantSerializer(serializers.ModelSerializer):
             "quantity",
             "sort_order",
         ]
+
+    def get_sale_price(self, obj):
+        return get_sale_price(self, obj)
@@ -0,0 +1,75 @@
+"""
+This module contains the services that keep the denormalized product listings up to date
+"""
+
+from uuid import UUID
+
+from django.db.models import Count, Max, Min, Sum
+from django.utils import timezone
+
+from product.models import Img, Product, ProductListing, ProductVariant
+from product.search import refresh_search_documents
+
+
+def compute_product_listing(product_id: UUID) -> dict:
+    """
+    Computes the listing values of a product from its variants
+
+    Args:
+        product_id: the id of the product
+    Returns:
+        a dict of the ProductListing fields (except the product itself)
+    """
+    variants = ProductVariant.objects.filter(product_id=product_id)
+    values = variants.aggregate(
+        min_price=Min("price"),
+        max_price=Max("price"),
+        in_stock=Sum("quantity"),
+        variant_count=Count("pk"),
+    )
+    values["in_stock"] = values["in_stock"] or 0
+    lead_variant = variants.select_related("image").order_by("sort_order").first()
+    values["lead_variant"] = lead_variant
+    values["price"] = lead_variant.price if lead_variant else None
+    values["image"] = lead_variant.image.src.name if lead_variant else ""
+    values["image_derivatives"] = lead_variant.image.derivatives if lead_variant else {}
+    return values
+
+
+def refresh_product_listing(product_id: UUID) -> None:
+    """
+    Recomputes the listing of a single product
+
+    Only existing listings are updated, listings are created with their products,
+    so this is safe to call while a product is being deleted.
+    """
+    ProductListing.objects.filter(product_id=product_id).update(
+        updated_at=timezone.now(), **compute_product_listing(product_id)
+    )
+
+
+def refresh_image_listings(img: Img) -> None:
+    """Updates the image of the listings whose lead variant uses this image"""
+    ProductListing.objects.filter(lead_variant__image=img).update(
+        image=img.src.name,
+        image_derivatives=img.derivatives,
+        updated_at=timezone.now(),
+    )
+
+
+def rebuild_product_listings() -> int:
+    """
+    Creates the missing listings and recomputes all the existing ones
+
+    Returns:
+        the number of the listings rebuilt
+    """
+    product_ids = list(Product.objects.values_list("pk", flat=True))
+    existing = set(ProductListing.objects.values_list("product_id", flat=True))
+    ProductListing.objects.bulk_create(
+        [ProductListing(product_id=pk) for pk in product_ids if pk not in existing]
+    )
+    for product_id in product_ids:
+        refresh_product_listing(product_id)
+    refresh_search_documents(product_ids)
+    return len(product_ids)
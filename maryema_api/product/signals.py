@@ -0,0 +1,222 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models import signals
+from django.dispatch import receiver
+
+from core.cache import invalidate_responses
+from product.images import (
+    lock_file,
+    release_files,
+    schedule_derivatives,
+    shared_derivatives,
+    store_original,
+)
+from product.models import (
+    Category,
+    Collection,
+    Color,
+    Division,
+    Img,
+    Product,
+    ProductListing,
+    ProductVariant,
+    Size,
+)
+from product.search import refresh_search_documents
+from product.services import refresh_image_listings, refresh_product_listing
+
+
+@receiver(signals.post_save, sender=Product)
+def create_product_listing(sender, instance, created, **kwargs):
+    """Creates the listing of a new product and refreshes its search document"""
+    if created:
+        # created by id to not cache the still empty listing on the product instance
+        ProductListing.objects.create(product_id=instance.pk)
+    refresh_search_documents([instance.pk])
+
+
+@receiver(signals.post_init, sender=ProductVariant)
+def remember_variant_product(sender, instance, **kwargs):
+    """Remembers the product of a loaded variant to detect moving it to another product"""
+    # read through __dict__ to not trigger a query for deferred fields
+    instance._loaded_product_id = instance.__dict__.get("product_id")
+
+
+@receiver([signals.post_save, signals.post_delete], sender=ProductVariant)
+def update_product_listing(sender, instance, **kwargs):
+    """Refreshes the listing of the product when a variant is created or updated or removed"""
+    product_ids = {instance.product_id}
+    if instance._loaded_product_id is not None:
+        product_ids.add(instance._loaded_product_id)
+    for product_id in product_ids:
+        refresh_product_listing(product_id)
+    refresh_search_documents(product_ids)
+    invalidate_responses("product", product_ids)
+    instance._loaded_product_id = instance.product_id
+
+
+@receiver(signals.post_init, sender=Img)
+def remember_image_file(sender, instance, **kwargs):
+    """Remembers the file of a loaded image to detect replacing it"""
+    src = instance.__dict__.get("src")
+    instance._loaded_src = getattr(src, "name", src)
+    instance._loaded_derivatives = instance.__dict__.get("derivatives")
+
+
+@receiver(signals.pre_save, sender=Img)
+def store_image_file(sender, instance, **kwargs):
+    """
+    Stores a new upload by the hash of its content and sets the derivatives of a new file,
+    the ones already generated for the same content or none until they are generated
+    """
+    if instance.src and not instance.src._committed:
+        store_original(instance)
+    elif instance.src and instance.src.name != instance._loaded_src:
+        # an image starts referencing a stored file
+        lock_file(instance.src.name)
+    instance._src_changed = (
+        instance._state.adding or instance.src.name != instance._loaded_src
+    )
+    if instance._src_changed and not (instance._state.adding and instance.derivatives):
+        instance.derivatives = shared_derivatives(instance.src.name)
+
+
+@receiver(signals.post_save, sender=Img)
+def generate_image_derivatives(sender, instance, created, **kwargs):
+    """
+    Generates the derivatives of a new file once it is committed,
+    and releases the replaced file
+    """
+    if instance._src_changed and not instance.derivatives:
+        transaction.on_commit(partial(schedule_derivatives, instance.pk))
+    if instance._src_changed and not created:
+        transaction.on_commit(
+            partial(release_files, instance._loaded_src, instance._loaded_derivatives)
+        )
+    instance._loaded_src = instance.src.name
+    instance._loaded_derivatives = instance.derivatives
+
+
+@receiver(signals.post_delete, sender=Img)
+def release_image_files(sender, instance, **kwargs):
+    """Deletes the file of a deleted image (once committed) if no other image uses it"""
+    transaction.on_commit(
+        partial(release_files, instance.src.name, instance.derivatives)
+    )
+
+
+@receiver(signals.post_save, sender=Img)
+def update_listing_image(sender, instance, created, **kwargs):
+    """Updates the listings showing this image when it is changed"""
+    if not created:
+        refresh_image_listings(instance)
+
+
+@receiver(signals.post_save, sender=Category)
+def update_category_search_documents(sender, instance, created, **kwargs):
+    """Refreshes the search documents of the products of a renamed category"""
+    if not created:
+        refresh_search_documents(instance.products.values_list("pk", flat=True))
+
+
+@receiver(signals.post_save, sender=Color)
+def update_color_search_documents(sender, instance, created, **kwargs):
+    """Refreshes the search documents of the products having a renamed color"""
+    if not created:
+        refresh_search_documents(
+            instance.variants.values_list("product_id", flat=True).distinct()
+        )
+
+
+@receiver(signals.post_save, sender=Collection)
+def update_collection_search_documents(sender, instance, created, **kwargs):
+    """Refreshes the search documents of the products of a renamed collection"""
+    if not created:
+        refresh_search_documents(instance.products.values_list("pk", flat=True))
+
+
+@receiver(signals.m2m_changed, sender=Collection.products.through)
+def update_collection_products_search_documents(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    """Refreshes the search documents of the products added to or removed from a collection"""
+    if reverse:
+        # the products were changed from the product side
+        if action in ("post_add", "post_remove", "post_clear"):
+            refresh_search_documents([instance.pk])
+        return
+    if action == "pre_clear":
+        instance._cleared_product_ids = list(
+            instance.products.values_list("pk", flat=True)
+        )
+    elif action == "post_clear":
+        refresh_search_documents(instance._cleared_product_ids)
+    elif action in ("post_add", "post_remove"):
+        refresh_search_documents(pk_set)
+
+
+# response cache invalidation
+#
+# the relations are read before the deletes, as the cascades remove them
+
+
+@receiver([signals.post_save, signals.post_delete], sender=Division)
+def invalidate_division_responses(sender, instance, **kwargs):
+    invalidate_responses("division", [instance.pk])
+    # the product facets show the division names
+    invalidate_responses("product")
+
+
+@receiver([signals.post_save, signals.pre_delete], sender=Category)
+def invalidate_category_responses(sender, instance, **kwargs):
+    invalidate_responses("category", [instance.pk])
+    # the product cards, the facets and the collection products show the category name
+    invalidate_responses("product")
+    invalidate_responses(
+        "collection",
+        Collection.objects.filter(products__category=instance)
+        .values_list("pk", flat=True)
+        .distinct(),
+    )
+
+
+@receiver([signals.post_save, signals.pre_delete], sender=Color)
+@receiver([signals.post_save, signals.pre_delete], sender=Size)
+@receiver([signals.post_save, signals.pre_delete], sender=Img)
+def invalidate_variant_attribute_responses(sender, instance, **kwargs):
+    """The colors, sizes and images are shown in the variants of the product details"""
+    invalidate_responses(sender._meta.model_name, [instance.pk])
+    invalidate_responses(
+        "product",
+        instance.variants.values_list("product_id", flat=True).distinct(),
+    )
+
+
+@receiver([signals.post_save, signals.pre_delete], sender=Product)
+def invalidate_product_responses(sender, instance, **kwargs):
+    invalidate_responses("product", [instance.pk])
+    invalidate_responses(
+        "collection", instance.collections.values_list("pk", flat=True)
+    )
+
+
+@receiver([signals.post_save, signals.post_delete], sender=Collection)
+def invalidate_collection_responses(sender, instance, **kwargs):
+    invalidate_responses("collection", [instance.pk])
+    # the products can be filtered by collection
+    invalidate_responses("product")
+
+
+@receiver(signals.m2m_changed, sender=Collection.products.through)
+def invalidate_collection_products_responses(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        # pk_set is None when all the collections of the product are cleared
+        invalidate_responses("collection", pk_set or ())
+    else:
+        invalidate_responses("collection", [instance.pk])
+    invalidate_responses("product")
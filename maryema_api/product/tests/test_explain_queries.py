@@ -0,0 +1,38 @@
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from product.models import Size
+from product.tests.factories import ProductFactory, VariantFactory
+
+
+class ExplainQueriesCommandTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        VariantFactory(product=ProductFactory(), size=Size.objects.create(name="M"))
+
+    def explain(self, *args) -> str:
+        out = StringIO()
+        call_command("explain_queries", *args, stdout=out)
+        return out.getvalue()
+
+    def test_explains_every_registered_query(self) -> None:
+        output = self.explain()
+        for name in ("products", "products-filtered", "orders", "discount-code"):
+            self.assertIn(f"== {name}\n", output)
+        # there are no profiles to run the orders queries as
+        self.assertIn("skipped", output)
+
+    def test_plans_use_the_indexes(self) -> None:
+        output = self.explain(
+            "product-variants", "product-feedback", "product-feedback-commented"
+        )
+        self.assertIn("variant_product_order_idx", output)
+        self.assertIn("feedback_product_timeline_idx", output)
+        self.assertIn("feedback_commented_idx", output)
+        self.assertNotIn("== products\n", output)
+
+    def test_unknown_query(self) -> None:
+        with self.assertRaises(CommandError):
+            self.explain("nope")
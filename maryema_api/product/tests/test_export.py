@@ -0,0 +1,54 @@
+import csv
+import io
+import json
+from profile.tests.factories import ProfileFactory
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from product.importer import CatalogImporter
+from product.models import Product, ProductVariant, Size
+from product.tests.factories import ProductFactory, VariantFactory
+
+
+class CatalogExportTestCase(APITestCase):
+    url = "/api/products/export/"
+
+    @classmethod
+    def setUpTestData(cls):
+        size = Size.objects.create(name="M")
+        cls.product = ProductFactory()
+        cls.variants = [
+            VariantFactory(product=cls.product, size=size, sort_order=order)
+            for order in (1, 2)
+        ]
+
+    def setUp(self) -> None:
+        self.client.force_authenticate(user=ProfileFactory(admin=True).user)
+
+    def content(self, **params) -> str:
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b"".join(response.streaming_content).decode()
+
+    def test_export_one_variant_per_row(self) -> None:
+        rows = [json.loads(line) for line in self.content().splitlines()]
+        self.assertEqual(
+            [row["variant"] for row in rows], [str(v.id) for v in self.variants]
+        )
+        self.assertEqual(rows[0]["product"], self.product.name)
+        self.assertEqual(rows[0]["category"], self.product.category.name)
+        self.assertEqual(rows[0]["price"], f"{self.variants[0].price:.2f}")
+
+    def test_csv_export_can_be_imported_back(self) -> None:
+        content = self.content(output="csv")
+        self.assertEqual(len(list(csv.DictReader(io.StringIO(content)))), 2)
+        ProductVariant.objects.all().delete()
+        Product.objects.all().delete()
+        report = CatalogImporter().import_file(io.StringIO(content), "csv")
+        self.assertEqual((report.products, report.variants), (1, 2))
+
+    def test_only_admins_export(self) -> None:
+        self.client.force_authenticate(user=ProfileFactory().user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
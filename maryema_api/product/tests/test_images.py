@@ -0,0 +1,267 @@
+import io
+import os
+import shutil
+import tempfile
+
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.cache import CACHE_ALIAS
+from core.utils import create_image
+from product.images import (
+    CARD_WIDTH,
+    WIDTHS,
+    process_image,
+    render_derivatives,
+    schedule_derivatives,
+)
+from product.models import Img, ProductListing, Size, StoredFile
+from product.tests.factories import ImgFactory, VariantFactory
+
+
+def image_file(size=(2000, 1000), mode="RGB", format="png", name="photo.png"):
+    file = io.BytesIO()
+    Image.new(mode, size, (200, 30, 30, 128)[: len(mode)]).save(file, format)
+    return SimpleUploadedFile(name, file.getvalue(), content_type="image/png")
+
+
+class MediaRootMixin:
+    """Stores the files of the tests in a temporary media root"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+
+class RenderDerivativesTestCase(TestCase):
+    def test_renders_each_width_in_each_format(self) -> None:
+        derivatives = list(render_derivatives(image_file()))
+        self.assertEqual(
+            [(format, width) for format, width, _ in derivatives],
+            [(format, width) for width in WIDTHS for format in ("webp", "jpeg")],
+        )
+        for format, width, data in derivatives:
+            with Image.open(io.BytesIO(data)) as image:
+                self.assertEqual(image.format, format.upper())
+                self.assertEqual(image.size, (width, width // 2))
+
+    def test_never_upscales(self) -> None:
+        derivatives = list(render_derivatives(image_file(size=(100, 50))))
+        self.assertEqual({width for _, width, _ in derivatives}, {100})
+
+    def test_flattens_transparency_for_jpeg(self) -> None:
+        derivatives = {
+            format: data
+            for format, width, data in render_derivatives(
+                image_file(size=(200, 200), mode="RGBA")
+            )
+        }
+        with Image.open(io.BytesIO(derivatives["jpeg"])) as image:
+            self.assertEqual(image.mode, "RGB")
+        with Image.open(io.BytesIO(derivatives["webp"])) as image:
+            self.assertEqual(image.mode, "RGBA")
+
+
+@override_settings(IMAGE_WORKERS=0)
+class ImageDerivativesTestCase(MediaRootMixin, TestCase):
+    def create_img(self, **kwargs) -> Img:
+        with self.captureOnCommitCallbacks(execute=True):
+            img = ImgFactory(src=image_file(), **kwargs)
+        img.refresh_from_db()
+        return img
+
+    def test_generated_when_uploaded(self) -> None:
+        img = self.create_img()
+        self.assertEqual(set(img.derivatives), {"webp", "jpeg"})
+        self.assertEqual(
+            list(img.derivatives["jpeg"]), [str(width) for width in WIDTHS]
+        )
+        name = img.derivatives["webp"][str(CARD_WIDTH)]
+        self.assertTrue(name.startswith("product_images/derivatives/"))
+        self.assertTrue(name.endswith(f"-{CARD_WIDTH}w.webp"))
+
+    def test_the_same_original_shares_its_derivatives(self) -> None:
+        self.assertEqual(self.create_img().derivatives, self.create_img().derivatives)
+
+    def test_replacing_the_file_regenerates_them(self) -> None:
+        img = self.create_img()
+        old = img.derivatives
+        img.src = image_file(size=(800, 800), name="other.png")
+        with self.captureOnCommitCallbacks() as callbacks:
+            img.save()
+        img.refresh_from_db()
+        self.assertEqual(img.derivatives, {})
+        for callback in callbacks:
+            callback()
+        img.refresh_from_db()
+        self.assertNotEqual(img.derivatives, old)
+        self.assertEqual(list(img.derivatives["jpeg"]), ["160", "320", "640"])
+
+    def test_saving_other_fields_keeps_them(self) -> None:
+        img = self.create_img()
+        img.alt = "changed"
+        with self.captureOnCommitCallbacks() as callbacks:
+            img.save()
+        self.assertFalse(
+            any(getattr(c, "func", None) is schedule_derivatives for c in callbacks)
+        )
+        img.refresh_from_db()
+        self.assertNotEqual(img.derivatives, {})
+
+    def test_deleted_image_is_skipped(self) -> None:
+        img = ImgFactory()
+        img.delete()
+        self.assertIsNone(process_image(img.pk))
+
+    def test_updates_the_listing(self) -> None:
+        Size.objects.create(name="M")
+        img = ImgFactory(src=image_file())
+        variant = VariantFactory(image=img)
+        self.assertEqual(
+            ProductListing.objects.get(product=variant.product).image_derivatives, {}
+        )
+        derivatives = process_image(img.pk)
+        listing = ProductListing.objects.get(product=variant.product)
+        self.assertEqual(listing.image_derivatives, derivatives)
+
+    def test_command(self) -> None:
+        img = ImgFactory(src=image_file())
+        out = io.StringIO()
+        call_command("generate_image_derivatives", "--workers=1", stdout=out)
+        self.assertIn("Generated the derivatives of 1 images", out.getvalue())
+        img.refresh_from_db()
+        self.assertNotEqual(img.derivatives, {})
+
+
+@override_settings(IMAGE_WORKERS=0)
+class ContentAddressedStorageTestCase(MediaRootMixin, TestCase):
+    def create_img(self, **kwargs) -> Img:
+        with self.captureOnCommitCallbacks(execute=True):
+            img = ImgFactory(**kwargs)
+        img.refresh_from_db()
+        return img
+
+    def stored_files(self) -> list[str]:
+        return sorted(default_storage.listdir("product_images")[1])
+
+    def test_stored_under_the_hash_of_the_content(self) -> None:
+        img = self.create_img(src=image_file(name="Photo.PNG"))
+        self.assertRegex(img.src.name, r"^product_images/[0-9a-f]{32}\.png$")
+
+    def test_identical_uploads_share_one_file(self) -> None:
+        first = self.create_img(src=image_file(name="a.png"))
+        second = Img(src=image_file(name="b.png"))
+        second.save()
+        self.assertEqual(first.src.name, second.src.name)
+        self.assertEqual(second.derivatives, first.derivatives)
+        self.assertEqual(self.stored_files(), [os.path.basename(first.src.name)])
+
+    def test_deleting_removes_the_file_with_its_last_reference(self) -> None:
+        first = self.create_img(src=image_file())
+        second = self.create_img(src=image_file())
+        derivative = first.derivatives["jpeg"]["160"]
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(default_storage.exists(second.src.name))
+        self.assertTrue(default_storage.exists(derivative))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(default_storage.exists(second.src.name))
+        self.assertFalse(default_storage.exists(derivative))
+
+    def test_uploading_the_content_of_a_released_file_keeps_it(self) -> None:
+        first = self.create_img(src=image_file())
+        derivative = first.derivatives["jpeg"]["160"]
+        with self.captureOnCommitCallbacks() as callbacks:
+            first.delete()
+        # the same content is uploaded before the release runs
+        second = self.create_img(src=image_file())
+        for callback in callbacks:
+            callback()
+        self.assertTrue(default_storage.exists(second.src.name))
+        self.assertTrue(default_storage.exists(derivative))
+        self.assertTrue(StoredFile.objects.filter(name=second.src.name).exists())
+
+    def test_releasing_the_last_reference_removes_the_stored_file(self) -> None:
+        img = self.create_img(src=image_file())
+        self.assertTrue(StoredFile.objects.filter(name=img.src.name).exists())
+        with self.captureOnCommitCallbacks(execute=True):
+            img.delete()
+        self.assertFalse(StoredFile.objects.filter(name=img.src.name).exists())
+
+    def test_replacing_releases_the_old_file(self) -> None:
+        img = self.create_img(src=image_file())
+        old = img.src.name
+        img.src = image_file(size=(300, 300))
+        with self.captureOnCommitCallbacks(execute=True):
+            img.save()
+        self.assertNotEqual(img.src.name, old)
+        self.assertFalse(default_storage.exists(old))
+        self.assertTrue(default_storage.exists(img.src.name))
+
+    def test_reuploading_the_same_content_changes_nothing(self) -> None:
+        img = self.create_img(src=image_file())
+        derivatives = img.derivatives
+        img.src = image_file(name="again.png")
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            img.save()
+        self.assertFalse(
+            any(getattr(c, "func", None) is schedule_derivatives for c in callbacks)
+        )
+        self.assertEqual(img.derivatives, derivatives)
+        self.assertTrue(default_storage.exists(img.src.name))
+
+
+@override_settings(IMAGE_WORKERS=0)
+class ImageSrcsetViewTestCase(MediaRootMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Size.objects.create(name="M")
+        cls.img = ImgFactory(src=image_file())
+        cls.variant = VariantFactory(image=cls.img)
+
+    def setUp(self) -> None:
+        # the responses cached by the other tests may show their derivatives
+        caches[CACHE_ALIAS].clear()
+
+    def test_card_shows_the_original_until_generated(self) -> None:
+        response = self.client.get("/api/products/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        card = response.data["results"][0]
+        self.assertTrue(card["image"].endswith(self.img.src.name))
+        self.assertEqual(card["srcset"], {})
+
+    def test_card_shows_a_derivative(self) -> None:
+        derivatives = process_image(self.img.pk)
+        card = self.client.get("/api/products/").data["results"][0]
+        self.assertTrue(card["image"].endswith(derivatives["jpeg"][str(CARD_WIDTH)]))
+        self.assertEqual(
+            card["srcset"]["webp"].split(", ")[0],
+            f"/media/{derivatives['webp']['160']} 160w",
+        )
+
+    def test_variant_image_has_a_srcset(self) -> None:
+        process_image(self.img.pk)
+        response = self.client.get(f"/api/products/{self.variant.product.pk}/")
+        image = response.data["variants"][0]["image"]
+        self.assertNotIn("derivatives", image)
+        self.assertEqual(len(image["srcset"]["jpeg"].split(", ")), len(WIDTHS))
+
+    def test_small_images_are_not_resized(self) -> None:
+        img = ImgFactory(src=create_image())
+        self.assertEqual(list(process_image(img.pk)["jpeg"]), ["100"])
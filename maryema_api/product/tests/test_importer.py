@@ -0,0 +1,233 @@
+import csv
+import io
+import json
+import os
+import tempfile
+from profile.tests.factories import ProfileFactory
+
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.utils import create_image
+from product.importer import CatalogImporter, Row
+from product.models import (
+    Category,
+    Color,
+    Division,
+    Img,
+    Product,
+    ProductListing,
+    ProductVariant,
+    Size,
+)
+from product.tests.factories import CategoryFactory
+
+COLUMNS = [
+    "product",
+    "category",
+    "division",
+    "color1_name",
+    "color1_value",
+    "size",
+    "image",
+    "cost",
+    "price",
+    "quantity",
+]
+
+
+def row(product="Dress", size="M", color="Red", **values) -> dict:
+    data = {
+        "product": product,
+        "category": "Dresses",
+        "division": "clothes",
+        "color1_name": color,
+        "color1_value": "#ff0000",
+        "size": size,
+        "image": ImporterTestCase.image_path,
+        "cost": "10",
+        "price": "20",
+        "quantity": "5",
+    }
+    data.update(values)
+    return data
+
+
+def as_csv(rows: list[dict]) -> str:
+    file = io.StringIO()
+    writer = csv.DictWriter(file, fieldnames=COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    writer.writerows(rows)
+    return file.getvalue()
+
+
+class ImporterTestCase(TestCase):
+    image_path = ""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        ImporterTestCase.image_path = default_storage.save(
+            "product_images/import.jpg", create_image()
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        default_storage.delete(ImporterTestCase.image_path)
+        super().tearDownClass()
+
+    def import_csv(self, rows: list[dict], chunk_size: int = 1000):
+        importer = CatalogImporter(chunk_size=chunk_size)
+        return importer.import_file(io.StringIO(as_csv(rows)), "csv")
+
+    def test_imports_the_products_and_variants(self) -> None:
+        report = self.import_csv(
+            [row(size="M"), row(size="L"), row(product="Skirt", color="Blue")]
+        )
+        self.assertEqual((report.rows, report.error_count), (3, 0))
+        self.assertEqual((report.products, report.variants), (2, 3))
+
+        division = Division.objects.get()
+        self.assertEqual(division.name, "Clothes")
+        self.assertEqual(Category.objects.get().division, division)
+        self.assertEqual(Color.objects.count(), 2)
+        self.assertEqual(Size.objects.count(), 2)
+        self.assertEqual(Img.objects.get().src.name, self.image_path)
+
+        dress = Product.objects.get(name="Dress")
+        self.assertEqual(
+            list(dress.variants.values_list("size__name", "sort_order")),
+            [("M", 1), ("L", 2)],
+        )
+        listing = ProductListing.objects.get(product=dress)
+        self.assertEqual(listing.variant_count, 2)
+        self.assertEqual(listing.in_stock, 10)
+        self.assertEqual(listing.search_document["A"], "Dress")
+
+    def test_reports_the_invalid_rows_without_aborting(self) -> None:
+        report = self.import_csv(
+            [
+                row(size="M"),
+                row(size="MM"),
+                row(size="L", price="5"),
+                row(size="S", image="product_images/missing.jpg"),
+                row(size="XL", category="Scarves", division=""),
+                row(size="M"),
+            ]
+        )
+        self.assertEqual((report.variants, report.error_count), (1, 5))
+        errors = {error.line: error.errors for error in report.errors}
+        self.assertEqual(set(errors), {3, 4, 5, 6, 7})
+        self.assertIn("size", errors[3])
+        self.assertIn("price", errors[4])
+        self.assertIn("image", errors[5])
+        self.assertIn("division", errors[6])
+        # the same color and size as the first row
+        self.assertIn("non_field_errors", errors[7])
+        self.assertEqual(ProductVariant.objects.count(), 1)
+
+    def test_reports_the_paths_out_of_the_media_storage(self) -> None:
+        report = self.import_csv(
+            [
+                row(size="M", image="../../etc/passwd"),
+                row(size="L", image="/etc/passwd"),
+                row(size="S"),
+            ]
+        )
+        self.assertEqual((report.variants, report.error_count), (1, 2))
+        errors = {error.line: error.errors for error in report.errors}
+        self.assertEqual(set(errors), {2, 3})
+        self.assertIn("image", errors[2])
+        self.assertIn("image", errors[3])
+
+    def test_resolving_a_path_out_of_the_media_storage_fails_the_row(self) -> None:
+        importer = CatalogImporter()
+        rows = [
+            Row(2, {"image": "../../etc/passwd", "alt": ""}),
+            Row(3, {"image": self.image_path, "alt": ""}),
+        ]
+        resolved = importer.resolve_images(rows)
+        self.assertEqual([r.line for r in resolved], [3])
+        self.assertEqual(importer.report.errors[0].line, 2)
+        self.assertEqual(
+            importer.report.errors[0].errors,
+            {"image": "The image path is out of the media storage"},
+        )
+
+    def test_products_span_the_chunks(self) -> None:
+        sizes = ["XS", "S", "M", "L", "XL"]
+        report = self.import_csv([row(size=size) for size in sizes], chunk_size=2)
+        self.assertEqual((report.products, report.variants), (1, 5))
+        product = Product.objects.get()
+        self.assertEqual(
+            list(product.variants.values_list("sort_order", flat=True)),
+            [1, 2, 3, 4, 5],
+        )
+
+    def test_adds_variants_to_existing_products(self) -> None:
+        category = CategoryFactory(name="Dresses")
+        self.import_csv([row(size="M")])
+        report = self.import_csv([row(size="M"), row(size="L")])
+        self.assertEqual((report.products, report.variants), (0, 1))
+        self.assertEqual(Product.objects.get().category, category)
+        self.assertEqual(ProductListing.objects.get().variant_count, 2)
+
+    def test_jsonl(self) -> None:
+        lines = [json.dumps(row(size="M")), "{not json", "", json.dumps([1])]
+        report = CatalogImporter().import_file(io.StringIO("\n".join(lines)), "jsonl")
+        self.assertEqual(report.variants, 1)
+        self.assertEqual([error.line for error in report.errors], [2, 4])
+
+    def test_command(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "catalog.csv")
+            with open(path, "w", newline="") as file:
+                file.write(as_csv([row(size="M"), row(size="MM")]))
+            out, err = io.StringIO(), io.StringIO()
+            call_command("import_catalog", path, stdout=out, stderr=err)
+        self.assertIn("1 variants from 2 rows, 1 rows failed", out.getvalue())
+        self.assertIn("catalog.csv:3:", err.getvalue())
+
+
+class ImportCatalogViewTestCase(APITestCase):
+    url = "/api/products/import/"
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.image_path = default_storage.save(
+            "product_images/import.jpg", create_image()
+        )
+        ImporterTestCase.image_path = cls.image_path
+
+    @classmethod
+    def tearDownClass(cls):
+        default_storage.delete(cls.image_path)
+        super().tearDownClass()
+
+    def upload(self, name: str, content: str):
+        file = io.BytesIO(content.encode())
+        file.name = name
+        return self.client.post(self.url, {"file": file}, format="multipart")
+
+    def test_admin_imports_a_file(self) -> None:
+        self.client.force_authenticate(user=ProfileFactory(admin=True).user)
+        response = self.upload("catalog.csv", as_csv([row(), row(size="MM")]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["variants"], 1)
+        self.assertEqual(response.data["errors"][0]["line"], 3)
+
+    def test_unknown_format(self) -> None:
+        self.client.force_authenticate(user=ProfileFactory(admin=True).user)
+        response = self.upload("catalog.xlsx", "data")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("format", response.data)
+
+    def test_only_admins_import(self) -> None:
+        self.client.force_authenticate(user=ProfileFactory().user)
+        response = self.upload("catalog.csv", as_csv([row()]))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(ProductVariant.objects.exists())
@@ -0,0 +1,82 @@
+from django.core.files.storage import default_storage
+from django.test import TestCase
+
+from core.utils import create_image
+from product.models import Img, ProductListing, Size
+from product.services import rebuild_product_listings
+from product.tests.factories import ProductFactory, VariantFactory
+
+
+class ProductListingTestCase(TestCase):
+    """A test suit for the ProductListing read model and the signals maintaining it"""
+
+    def setUp(self) -> None:
+        self.product = ProductFactory()
+        self.size = Size.objects.create(name="M")
+
+    def test_listing_is_created_with_the_product(self) -> None:
+        listing = ProductListing.objects.get(product=self.product)
+        self.assertIsNone(listing.lead_variant)
+        self.assertIsNone(listing.price)
+        self.assertEqual(listing.image, "")
+        self.assertEqual(listing.in_stock, 0)
+        self.assertEqual(listing.variant_count, 0)
+
+    def test_listing_follows_the_variants(self) -> None:
+        lead = VariantFactory(
+            product=self.product, size=self.size, sort_order=1, quantity=5
+        )
+        other = VariantFactory(
+            product=self.product, size=self.size, sort_order=2, quantity=7
+        )
+        listing = ProductListing.objects.get(product=self.product)
+        self.assertEqual(listing.lead_variant, lead)
+        self.assertEqual(listing.price, lead.price)
+        self.assertEqual(listing.image, lead.image.src.name)
+        self.assertEqual(listing.min_price, min(lead.price, other.price))
+        self.assertEqual(listing.max_price, max(lead.price, other.price))
+        self.assertEqual(listing.in_stock, 12)
+        self.assertEqual(listing.variant_count, 2)
+
+        other.quantity = 1
+        other.save()
+        listing.refresh_from_db()
+        self.assertEqual(listing.in_stock, 6)
+
+        lead.delete()
+        listing.refresh_from_db()
+        self.assertEqual(listing.lead_variant, other)
+        self.assertEqual(listing.price, other.price)
+        self.assertEqual(listing.variant_count, 1)
+
+    def test_listing_follows_moved_variants(self) -> None:
+        variant = VariantFactory(
+            product=self.product, size=self.size, sort_order=1, quantity=3
+        )
+        new_product = ProductFactory()
+        variant.product = new_product
+        variant.save()
+        self.assertEqual(ProductListing.objects.get(product=self.product).in_stock, 0)
+        self.assertEqual(ProductListing.objects.get(product=new_product).in_stock, 3)
+
+    def test_listing_follows_the_lead_image(self) -> None:
+        variant = VariantFactory(product=self.product, size=self.size, sort_order=1)
+        img = Img.objects.get(pk=variant.image_id)
+        img.src = create_image(name="new_image.jpg")
+        img.save()
+        listing = ProductListing.objects.get(product=self.product)
+        self.assertEqual(listing.image, img.src.name)
+        self.assertTrue(default_storage.url(listing.image).endswith(".jpg"))
+
+    def test_listing_is_deleted_with_the_product(self) -> None:
+        VariantFactory(product=self.product, size=self.size, sort_order=1)
+        self.product.delete()
+        self.assertFalse(ProductListing.objects.exists())
+
+    def test_rebuild_product_listings(self) -> None:
+        VariantFactory(product=self.product, size=self.size, sort_order=1, quantity=4)
+        ProductListing.objects.all().delete()
+        self.assertEqual(rebuild_product_listings(), 1)
+        listing = ProductListing.objects.get(product=self.product)
+        self.assertEqual(listing.in_stock, 4)
+        self.assertEqual(listing.variant_count, 1)
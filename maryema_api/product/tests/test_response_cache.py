@@ -0,0 +1,203 @@
+import threading
+import time
+from profile.tests.factories import ProfileFactory
+from unittest.mock import patch
+
+from django.core.cache import caches
+from django.test import override_settings
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APITestCase
+
+from core.cache import CACHE_ALIAS, get_version, invalidate_responses
+from feedback.models import Feedback
+from product.models import Size
+from product.tests.factories import (
+    CategoryFactory,
+    ColorFactory,
+    DivisionFactory,
+    ProductFactory,
+    VariantFactory,
+)
+from product.views import DivisionViewSet
+
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    CACHE_ALIAS: {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "responses",
+    },
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ResponseCacheTestCase(APITestCase):
+    """A test suit for the response cache of the catalog endpoints"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.size = Size.objects.create(name="M")
+        cls.color = ColorFactory(color1_name="Red")
+        cls.product = ProductFactory()
+        cls.other = ProductFactory()
+        for product in (cls.product, cls.other):
+            VariantFactory(product=product, size=cls.size, color=cls.color)
+
+    def setUp(self) -> None:
+        caches[CACHE_ALIAS].clear()
+
+    def get(self, url: str, params: dict | None = None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_responses_are_cached(self) -> None:
+        self.assertEqual(self.get("/api/divisions/")["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            response = self.get("/api/divisions/")
+        self.assertEqual(response["X-Cache"], "HIT")
+
+    def test_key_uses_sorted_query_params(self) -> None:
+        self.get("/api/products/", {"size": "M", "ordering": "created_at"})
+        response = self.get("/api/products/?ordering=created_at&size=M")
+        self.assertEqual(response["X-Cache"], "HIT")
+        response = self.get("/api/products/", {"size": "L"})
+        self.assertEqual(response["X-Cache"], "MISS")
+
+    def test_key_uses_the_role(self) -> None:
+        self.get("/api/products/")
+        self.client.force_authenticate(user=ProfileFactory(admin=True).user)
+        response = self.get("/api/products/")
+        self.assertEqual(response["X-Cache"], "MISS")
+        # the admin serializer is used
+        self.assertIn("provider", response.data["results"][0])
+
+    def test_write_invalidates_the_object_and_the_list(self) -> None:
+        division = DivisionFactory()
+        other = DivisionFactory()
+        for url in ("/api/divisions/", f"/api/divisions/{division.id}/"):
+            self.get(url)
+        self.get(f"/api/divisions/{other.id}/")
+
+        division.name = "Renamed"
+        division.save()
+        response = self.get(f"/api/divisions/{division.id}/")
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["name"], "Renamed")
+        self.assertEqual(self.get("/api/divisions/")["X-Cache"], "MISS")
+        # the other divisions are still cached
+        self.assertEqual(self.get(f"/api/divisions/{other.id}/")["X-Cache"], "HIT")
+
+    def test_dependencies_invalidate_only_the_affected_products(self) -> None:
+        lonely = ProductFactory()
+        VariantFactory(product=lonely, size=self.size)
+        self.get(f"/api/products/{self.product.id}/")
+        self.get(f"/api/products/{lonely.id}/")
+        self.get("/api/products/facets/")
+
+        self.color.color1_name = "Crimson"
+        self.color.save()
+        response = self.get(f"/api/products/{self.product.id}/")
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(
+            response.data["variants"][0]["color"]["color1_name"], "Crimson"
+        )
+        self.assertEqual(self.get(f"/api/products/{lonely.id}/")["X-Cache"], "HIT")
+
+        # the category name shows in the cards and facets
+        self.get("/api/products/")
+        category = self.product.category
+        category.name = "Renamed"
+        category.save()
+        self.assertEqual(self.get("/api/products/")["X-Cache"], "MISS")
+        self.assertEqual(self.get("/api/products/facets/")["X-Cache"], "MISS")
+
+    def test_variant_changes_invalidate_the_product(self) -> None:
+        self.get(f"/api/products/{self.product.id}/")
+        VariantFactory(product=self.product, size=self.size)
+        response = self.get(f"/api/products/{self.product.id}/")
+        self.assertEqual(len(response.data["variants"]), 2)
+
+    def test_first_feedback_page_is_cached_per_product(self) -> None:
+        url = f"/api/products/{self.product.id}/feedback/"
+        Feedback.objects.create(customer=ProfileFactory(), product=self.product, rate=4)
+        self.assertEqual(self.get(url)["X-Cache"], "MISS")
+        self.assertEqual(self.get(url)["X-Cache"], "HIT")
+        # the feedbacks of another product don't invalidate it
+        Feedback.objects.create(customer=ProfileFactory(), product=self.other)
+        self.assertEqual(self.get(url)["X-Cache"], "HIT")
+        Feedback.objects.create(customer=ProfileFactory(), product=self.product)
+        response = self.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_next_feedback_pages_are_not_cached(self) -> None:
+        url = f"/api/products/{self.product.id}/feedback/"
+        for rate in (1, 2):
+            Feedback.objects.create(
+                customer=ProfileFactory(), product=self.product, rate=rate
+            )
+        next_url = self.get(url, {"page_size": 1}).data["next"]
+        self.get(next_url)
+        self.assertNotIn("X-Cache", self.get(next_url))
+
+    def test_comment_changes_keep_the_product_cached(self) -> None:
+        feedback = Feedback.objects.create(
+            customer=ProfileFactory(), product=self.product, rate=4
+        )
+        self.get(f"/api/products/{self.product.id}/")
+        feedback.comment = "Nice"
+        feedback.save()
+        response = self.get(f"/api/products/{self.product.id}/")
+        self.assertEqual(response["X-Cache"], "HIT")
+
+    def test_new_category_shows_in_the_list(self) -> None:
+        self.get("/api/categories/")
+        CategoryFactory()
+        response = self.get("/api/categories/")
+        self.assertEqual(response.data["count"], 3)
+
+    def test_errors_are_not_cached(self) -> None:
+        response = self.client.get("/api/products/", {"cursor": "invalid"})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get("/api/products/", {"cursor": "invalid"})
+        self.assertNotEqual(response.get("X-Cache"), "HIT")
+
+    def test_versions(self) -> None:
+        version = get_version("product", "list")
+        self.assertEqual(get_version("product", "list"), version)
+        invalidate_responses("product", [self.product.pk], list_=False)
+        self.assertEqual(get_version("product", "list"), version)
+        invalidate_responses("product")
+        self.assertNotEqual(get_version("product", "list"), version)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ResponseCacheStampedeTestCase(APITestCase):
+    def setUp(self) -> None:
+        caches[CACHE_ALIAS].clear()
+
+    def test_cold_key_is_computed_once(self) -> None:
+        calls = []
+
+        def slow_list(view, request, *args, **kwargs):
+            # no database access from the threads
+            calls.append(1)
+            time.sleep(0.3)
+            return Response([])
+
+        responses = []
+
+        def request():
+            responses.append(APIClient().get("/api/divisions/"))
+
+        with patch.object(DivisionViewSet, "list", slow_list):
+            threads = [threading.Thread(target=request) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(
+            sorted(response["X-Cache"] for response in responses),
+            ["HIT", "HIT", "HIT", "MISS"],
+        )
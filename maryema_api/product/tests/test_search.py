@@ -0,0 +1,94 @@
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from product.models import ProductListing, Size
+from product.search import get_search_backend, tokenize
+from product.tests.factories import (
+    CategoryFactory,
+    CollectionFactory,
+    ColorFactory,
+    ProductFactory,
+    VariantFactory,
+)
+
+
+class ProductSearchTestCase(APITestCase):
+    """A test suit for the full-text search of the products"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.size = Size.objects.create(name="M")
+        cls.category = CategoryFactory(name="Scarves")
+        cls.dress = ProductFactory(name="Summer dress", tags="cotton, floral")
+        cls.scarf = ProductFactory(
+            name="Silk scarf", tags="summer, light", category=cls.category
+        )
+        cls.shirt = ProductFactory(name="Linen shirt", tags="casual")
+        for product in (cls.dress, cls.scarf, cls.shirt):
+            VariantFactory(product=product, size=cls.size, sort_order=1)
+        cls.collection = CollectionFactory(name="Holiday")
+        cls.collection.products.add(cls.shirt)
+        VariantFactory(
+            product=cls.shirt,
+            size=cls.size,
+            sort_order=2,
+            color=ColorFactory(color1_name="Turquoise"),
+        )
+
+    def search(self, term: str) -> list:
+        response = self.client.get("/api/products/", {"search": term})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item["id"] for item in response.data["results"]]
+
+    def test_tokenize(self) -> None:
+        self.assertEqual(
+            tokenize("Summer-Dress, floral"), ["summer", "dress", "floral"]
+        )
+
+    def test_search_document(self) -> None:
+        document = ProductListing.objects.get(product=self.shirt).search_document
+        self.assertEqual(document["A"], "Linen shirt")
+        self.assertEqual(document["B"], "casual")
+        self.assertIn("Holiday", document["C"])
+        self.assertIn(self.shirt.category.name, document["C"])
+        self.assertIn("Turquoise", document["D"])
+
+    def test_results_are_ranked_by_weight(self) -> None:
+        # "summer" is in the name of the dress but only in the tags of the scarf
+        self.assertEqual(
+            self.search("summer"), [str(self.dress.id), str(self.scarf.id)]
+        )
+
+    def test_prefix_matching(self) -> None:
+        self.assertEqual(self.search("flo"), [str(self.dress.id)])
+        self.assertEqual(self.search("turq"), [str(self.shirt.id)])
+
+    def test_all_terms_must_match(self) -> None:
+        self.assertEqual(self.search("summer silk"), [str(self.scarf.id)])
+        self.assertEqual(self.search("summer linen"), [])
+
+    def test_search_by_collection_and_category(self) -> None:
+        self.assertEqual(self.search("holiday"), [str(self.shirt.id)])
+        self.assertEqual(self.search("scarves"), [str(self.scarf.id)])
+
+    def test_search_follows_renames_and_collection_changes(self) -> None:
+        self.category.name = "Shawls"
+        self.category.save()
+        self.assertEqual(self.search("shawls"), [str(self.scarf.id)])
+
+        self.collection.products.add(self.dress)
+        self.assertEqual(len(self.search("holiday")), 2)
+        self.collection.products.clear()
+        self.assertEqual(self.search("holiday"), [])
+
+    def test_no_duplicated_results(self) -> None:
+        # the shirt has two variants and a collection
+        self.assertEqual(self.search("shirt"), [str(self.shirt.id)])
+
+    def test_empty_search_returns_everything(self) -> None:
+        self.assertEqual(len(self.search(" ")), 3)
+
+    def test_backend_rank(self) -> None:
+        ranked = get_search_backend().rank(["summer"])
+        self.assertEqual([pk for pk, _ in ranked], [self.dress.id, self.scarf.id])
+        self.assertGreater(ranked[0][1], ranked[1][1])
@@ -26,7 +26,16 @@ class ImgSerializerTest(TestCase):
 
     def test_contains_expected_fields(self) -> None:
         data = self.serializer.data
-        expected_fields = {"id", "url", "src", "alt", "created_at", "updated_at"}
+        expected_fields = {
+            "id",
+            "url",
+            "src",
+            "alt",
+            "derivatives",
+            "srcset",
+            "created_at",
+            "updated_at",
+        }
         self.assertEqual(set(data.keys()), expected_fields)
 
     def test_serialization_many(self) -> None:
@@ -35,7 +44,16 @@ class ImgSerializerTest(TestCase):
             Img.objects.all(), many=True, context={"request": self.request}
         )
         self.assertEqual(len(serializer.data), 4)
-        expected_fields = {"id", "url", "src", "alt", "created_at", "updated_at"}
+        expected_fields = {
+            "id",
+            "url",
+            "src",
+            "alt",
+            "derivatives",
+            "srcset",
+            "created_at",
+            "updated_at",
+        }
         for data in serializer.data:
             self.assertEqual(set(data.keys()), expected_fields)
 
@@ -112,14 +130,14 @@ class NestedImgSerializerTest(TestCase):
 
     def test_contains_expected_fields(self) -> None:
         data = self.serializer.data
-        expected_fields = {"id", "src", "alt"}
+        expected_fields = {"id", "src", "alt", "srcset"}
         self.assertEqual(set(data.keys()), expected_fields)
 
     def test_serialization_many(self) -> None:
         ImgFactory.create_batch(3)
         serializer = NestedImgSerializer(Img.objects.all(), many=True)
         self.assertEqual(len(serializer.data), 4)
-        expected_fields = {"id", "src", "alt"}
+        expected_fields = {"id", "src", "alt", "srcset"}
         for data in serializer.data:
             self.assertEqual(set(data.keys()), expected_fields)
 
@@ -4,6 +4,8 @@ from profile.tests.factories import ProfileFactory
 from django.db.models import Sum
 from django.test import RequestFactory, TestCase
 
+from feedback.models import Feedback
+from product.models import Product
 from product.serializers import (
     ProductDetailPublicSerializer,
     ProductListPublicSerializer,
@@ -193,25 +195,25 @@ class ProductPublicSerializerTestCase(TestCase):
 
         # create suffecient variants for each product and reset the squence each time
         # to start sort_order field for the variants of each product from 1
-        VariantFactory.reset_sequence(1)
+        VariantFactory.reset_sequence(0)
         VariantFactory.create_batch(12, product=cls.products[0])
-        VariantFactory.reset_sequence(1)
+        VariantFactory.reset_sequence(0)
         VariantFactory.create_batch(12, product=cls.products[1])
-        VariantFactory.reset_sequence(1)
+        VariantFactory.reset_sequence(0)
         VariantFactory.create_batch(10, product=cls.products[2])
-        VariantFactory.reset_sequence(1)
+        VariantFactory.reset_sequence(0)
         VariantFactory.create_batch(7, product=cls.products[3])
-        VariantFactory.reset_sequence(1)
+        VariantFactory.reset_sequence(0)
         VariantFactory.create_batch(5, product=cls.products[4])
-        VariantFactory.reset_sequence(1)
+        VariantFactory.reset_sequence(0)
         VariantFactory.create_batch(1, product=cls.products[5])
-        VariantFactory.reset_sequence(1)
+        VariantFactory.reset_sequence(0)
         VariantFactory.create_batch(3, product=cls.products[6])
-        VariantFactory.reset_sequence(1)
+        VariantFactory.reset_sequence(0)
         VariantFactory.create_batch(2, product=cls.products[7])
-        VariantFactory.reset_sequence(1)
+        VariantFactory.reset_sequence(0)
         VariantFactory.create_batch(9, product=cls.products[8])
-        VariantFactory.reset_sequence(1)
+        VariantFactory.reset_sequence(0)
         VariantFactory.create_batch(9, product=cls.products[9])
         cls.serialized_products = ProductListPublicSerializer(
             cls.products, many=True, context={"request": cls.request}
@@ -279,13 +281,43 @@ class ProductPublicSerializerTestCase(TestCase):
             "tags",
             "description",
             "category",
-            "feedbacks",
             "variants",
+            "rating",
         ]
         self.assertEqual(set(self.serialized_product.keys()), set(fields))
         self.assertEqual(len(self.serialized_product["variants"]), 12)
         # may add more assertions for variants fields after creating the test for its serializer
 
+    def test_product_detail_public_rating(self) -> None:
+        """Ensures the rating aggregates are read from the listing"""
+        product = self.products[1]
+        for rate in (5, 4, 4, 1):
+            Feedback.objects.create(
+                customer=ProfileFactory(), product=product, rate=rate
+            )
+        product = Product.objects.select_related("listing").get(pk=product.pk)
+        data = ProductDetailPublicSerializer(
+            product, context={"request": self.request}
+        ).data
+        self.assertEqual(
+            data["rating"],
+            {
+                "average": 3.5,
+                "count": 4,
+                "sum": 14,
+                "histogram": {"1": 1, "2": 0, "3": 0, "4": 2, "5": 1},
+            },
+        )
+        self.assertEqual(
+            self.serialized_product["rating"],
+            {
+                "average": 0,
+                "count": 0,
+                "sum": 0,
+                "histogram": {str(stars): 0 for stars in range(1, 6)},
+            },
+        )
+
     def test_product_detail_public_deserialization(self) -> None:
         """Ensures this serializer is read only (no deserialization)"""
         data = {
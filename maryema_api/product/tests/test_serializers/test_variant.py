@@ -45,6 +45,7 @@ class VariantSerializerTestCase(TestCase):
             "quantity",
             "url",
             "wished_by",
+            "sale_price",
             "sort_order",
         ]
 
@@ -393,6 +394,7 @@ class NestedVariantSerializerTestCase(TestCase):
             "id": str(self.variants[0].image.id),
             "src": self.request.build_absolute_uri(self.variants[0].image.src.url),
             "alt": self.variants[0].image.alt,
+            "srcset": {},
         }
         fields = [
             "id",
@@ -403,6 +405,7 @@ class NestedVariantSerializerTestCase(TestCase):
             "image",
             "price",
             "cost",
+            "sale_price",
             "sort_order",
             "quantity",
         ]
@@ -438,6 +441,7 @@ class NestedVariantSerializerTestCase(TestCase):
                 "id": str(variant.image.id),
                 "src": self.request.build_absolute_uri(variant.image.src.url),
                 "alt": variant.image.alt,
+                "srcset": {},
             }
             self.assertEqual(serialized["size"], nested_size)
             self.assertEqual(serialized["color"], nested_color)
@@ -0,0 +1,458 @@
+from profile.tests.factories import ProfileFactory
+
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.testing import QueryBudgetMixin
+from discount.engine import get_schedule
+from feedback.models import Feedback
+from product.models import Product, ProductVariant, Size
+from product.tests.factories import ColorFactory, ProductFactory, VariantFactory
+
+
+class ProductViewSetTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = ProductFactory.create_batch(5)
+        size = Size.objects.create(name="M")
+        for product in cls.products[:4]:
+            VariantFactory(product=product, size=size, sort_order=1, quantity=2)
+            VariantFactory(product=product, size=size, sort_order=2, quantity=3)
+
+    def setUp(self) -> None:
+        # the discount schedule is precomputed by the scheduler, not by the requests
+        get_schedule()
+
+    def test_public_list_only_products_with_variants(self) -> None:
+        response = self.client.get("/api/products/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 4)
+        ids = {str(product.id) for product in self.products[:4]}
+        self.assertEqual({item["id"] for item in response.data["results"]}, ids)
+
+    def test_public_list_is_served_from_the_listing(self) -> None:
+        # one query for the count and one for the page
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/products/")
+        for item in response.data["results"]:
+            variant = ProductVariant.objects.get(product_id=item["id"], sort_order=1)
+            self.assertEqual(item["price"], variant.price)
+            self.assertEqual(item["image"], default_storage.url(variant.image.src.name))
+            self.assertEqual(item["in_stock"], 5)
+
+    def test_public_detail(self) -> None:
+        product = self.products[0]
+        response = self.client.get(f"/api/products/{product.id}/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["variants"]), 2)
+        self.assertEqual(response.data["variants"][0]["sort_order"], 1)
+        self.assertIn("color1_name", response.data["variants"][0]["color"])
+        self.assertEqual(response.data["variants"][0]["size"]["name"], "M")
+
+    def test_public_detail_of_product_without_variants(self) -> None:
+        response = self.client.get(f"/api/products/{self.products[4].id}/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ProductViewSetQueryBudgetTestCase(QueryBudgetMixin, APITestCase):
+    """Ensures the product endpoints run a constant number of queries"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = ProfileFactory(admin=True).user
+        cls.size = Size.objects.create(name="M")
+        cls.product = cls.create_products(3)[0]
+
+    @classmethod
+    def create_products(cls, count: int) -> list:
+        products = ProductFactory.create_batch(count)
+        for product in products:
+            for sort_order in range(1, 4):
+                VariantFactory(
+                    product=product,
+                    size=cls.size,
+                    color=ColorFactory(dual=True),
+                    sort_order=sort_order,
+                )
+        return products
+
+    def setUp(self) -> None:
+        # the discount schedule is precomputed by the scheduler, not by the requests
+        get_schedule()
+
+    def test_public_list_budget(self) -> None:
+        with self.assertQueryBudget(2):
+            self.client.get("/api/products/")
+        self.create_products(7)
+        with self.assertQueryBudget(2):
+            response = self.client.get("/api/products/")
+        self.assertEqual(len(response.data["results"]), 10)
+
+    def test_public_detail_budget(self) -> None:
+        # the product with its listing and its variants with their color, size and image
+        with self.assertQueryBudget(2):
+            response = self.client.get(f"/api/products/{self.product.id}/")
+        self.assertEqual(len(response.data["variants"]), 3)
+
+    def test_admin_list_budget(self) -> None:
+        self.client.force_authenticate(user=self.admin)
+        # the profile of the user, the count and the page
+        with self.assertQueryBudget(3):
+            self.client.get("/api/products/")
+        self.create_products(7)
+        with self.assertQueryBudget(3):
+            response = self.client.get("/api/products/")
+        self.assertEqual(len(response.data["results"]), 10)
+
+    def test_admin_detail_budget(self) -> None:
+        self.client.force_authenticate(user=self.admin)
+        with self.assertQueryBudget(2):
+            response = self.client.get(f"/api/products/{self.product.id}/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class ProductRatingViewTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        size = Size.objects.create(name="M")
+        cls.products = ProductFactory.create_batch(3)
+        for product in cls.products:
+            VariantFactory(product=product, size=size, sort_order=1)
+        customers = ProfileFactory.create_batch(2)
+        for product, rates in zip(cls.products, [(3, 4), (5, 5), ()]):
+            for customer, rate in zip(customers, rates):
+                Feedback.objects.create(customer=customer, product=product, rate=rate)
+
+    def setUp(self) -> None:
+        # the discount schedule is precomputed by the scheduler, not by the requests
+        get_schedule()
+
+    def test_list_shows_the_rating(self) -> None:
+        response = self.client.get("/api/products/")
+        ratings = {item["id"]: item["rating"] for item in response.data["results"]}
+        self.assertEqual(
+            ratings[str(self.products[0].id)], {"average": 3.5, "count": 2}
+        )
+        self.assertEqual(ratings[str(self.products[2].id)], {"average": 0, "count": 0})
+
+    def test_detail_shows_the_histogram(self) -> None:
+        response = self.client.get(f"/api/products/{self.products[1].id}/")
+        self.assertEqual(
+            response.data["rating"],
+            {
+                "average": 5.0,
+                "count": 2,
+                "sum": 10,
+                "histogram": {"1": 0, "2": 0, "3": 0, "4": 0, "5": 2},
+            },
+        )
+
+    def test_sorted_by_rating(self) -> None:
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/products/?ordering=-rating,-rating_count")
+        self.assertEqual(
+            [item["id"] for item in response.data["results"]],
+            [
+                str(product.id)
+                for product in (self.products[1], self.products[0], self.products[2])
+            ],
+        )
+
+
+class ProductKeysetPaginationTestCase(QueryBudgetMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        size = Size.objects.create(name="M")
+        cls.products = ProductFactory.create_batch(25)
+        for product in cls.products:
+            VariantFactory(product=product, size=size, sort_order=1)
+        # ties on created_at are broken by the id
+        Product.objects.filter(
+            pk__in=[product.pk for product in cls.products[:10]]
+        ).update(created_at=timezone.now())
+
+    def walk(self, url: str, params: dict | None = None) -> list:
+        ids = []
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids += [item["id"] for item in response.data["results"]]
+            url, params = response.data["next"], None
+        return ids
+
+    def setUp(self) -> None:
+        # the discount schedule is precomputed by the scheduler, not by the requests
+        get_schedule()
+
+    def test_cursor_pages_cover_every_product_once(self) -> None:
+        ids = self.walk("/api/products/", {"pagination": "cursor"})
+        expected = Product.objects.order_by("-created_at", "-id").values_list(
+            "id", flat=True
+        )
+        self.assertEqual(ids, [str(pk) for pk in expected])
+
+    def test_cursor_page_skips_the_count(self) -> None:
+        # only the page query, no COUNT(*)
+        with self.assertQueryBudget(1):
+            response = self.client.get("/api/products/", {"pagination": "cursor"})
+        self.assertNotIn("count", response.data)
+        self.assertIsNone(response.data["previous"])
+        self.assertEqual(len(response.data["results"]), 10)
+
+        response = self.client.get(
+            "/api/products/", {"pagination": "cursor", "count": "true"}
+        )
+        self.assertEqual(response.data["count"], 25)
+
+    def test_previous_link(self) -> None:
+        first = self.client.get("/api/products/", {"pagination": "cursor"}).data
+        second = self.client.get(first["next"]).data
+        back = self.client.get(second["previous"]).data
+        self.assertEqual(back["results"], first["results"])
+        self.assertIsNone(back["previous"])
+        self.assertEqual(
+            self.client.get(back["next"]).data["results"][0]["id"],
+            second["results"][0]["id"],
+        )
+
+    def test_pages_are_stable_under_inserts(self) -> None:
+        first = self.client.get("/api/products/", {"pagination": "cursor"}).data
+        product = ProductFactory()
+        VariantFactory(product=product, size=Size.objects.get(), sort_order=1)
+        second = self.client.get(first["next"]).data
+        first_ids = {item["id"] for item in first["results"]}
+        self.assertFalse(first_ids & {item["id"] for item in second["results"]})
+        self.assertNotIn(str(product.id), [item["id"] for item in second["results"]])
+
+    def test_page_number_pagination_is_the_default(self) -> None:
+        response = self.client.get("/api/products/")
+        self.assertEqual(response.data["count"], 25)
+
+    def test_invalid_cursor(self) -> None:
+        response = self.client.get("/api/products/", {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_feedback_cursor_pagination(self) -> None:
+        product = self.products[0]
+        for rate in range(1, 5):
+            Feedback.objects.create(
+                customer=ProfileFactory(), product=product, rate=rate
+            )
+        url = f"/api/products/{product.id}/feedback/"
+        self.assertEqual(len(self.client.get(url).data["results"]), 4)
+        ids = self.walk(url, {"page_size": 3})
+        self.assertEqual(len(set(ids)), 4)
+
+
+class ProductFeedbackTestCase(QueryBudgetMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = ProductFactory()
+        VariantFactory(product=cls.product, size=Size.objects.create(name="M"))
+        cls.url = f"/api/products/{cls.product.id}/feedback/"
+        rates = [5, 3, 5, 0, 4, 3, 5, 1]
+        cls.feedbacks = [
+            Feedback.objects.create(
+                customer=ProfileFactory(),
+                product=cls.product,
+                rate=rate,
+                comment="Nice" if index % 2 else "",
+            )
+            for index, rate in enumerate(rates)
+        ]
+        # ties on the rate and created_at are broken by the id
+        Feedback.objects.filter(rate=5).update(created_at=timezone.now())
+
+    def walk(self, params: dict) -> list:
+        ids, url = [], self.url
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids += [item["id"] for item in response.data["results"]]
+            url, params = response.data["next"], None
+        return ids
+
+    def expected(self, **filters) -> list:
+        feedbacks = Feedback.objects.filter(product=self.product, **filters)
+        return [
+            str(pk)
+            for pk in feedbacks.order_by("-rate", "-created_at", "-id").values_list(
+                "pk", flat=True
+            )
+        ]
+
+    def test_best_rated_then_latest_first(self) -> None:
+        self.assertEqual(self.walk({"page_size": 3}), self.expected())
+
+    def test_page_budget(self) -> None:
+        # the product and the page
+        with self.assertQueryBudget(2):
+            response = self.client.get(self.url, {"page_size": 3})
+        self.assertEqual(len(response.data["results"]), 3)
+        self.assertNotIn("count", response.data)
+
+    def test_filters(self) -> None:
+        self.assertEqual(self.walk({"rate": 5, "page_size": 2}), self.expected(rate=5))
+        self.assertEqual(
+            self.walk({"min_rate": 4, "page_size": 2}), self.expected(rate__gte=4)
+        )
+        self.assertEqual(
+            self.walk({"has_comment": "true", "page_size": 2}),
+            self.expected(comment="Nice"),
+        )
+        self.assertEqual(
+            self.walk({"has_comment": "false", "rate": 5}),
+            self.expected(comment="", rate=5),
+        )
+
+    def test_invalid_filter(self) -> None:
+        response = self.client.get(self.url, {"rate": "five"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("rate", response.data)
+
+
+class ProductFilterTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.small = Size.objects.create(name="S")
+        cls.medium = Size.objects.create(name="M")
+        red = ColorFactory(color1_name="Red", color1_value="#ff0000")
+        blue = ColorFactory(color1_name="Blue", color1_value="#0000ff")
+        cls.dress = ProductFactory()
+        cls.shirt = ProductFactory()
+        VariantFactory(product=cls.dress, color=red, size=cls.small, cost=50, price=100)
+        VariantFactory(
+            product=cls.dress, color=blue, size=cls.medium, cost=50, price=300
+        )
+        VariantFactory(
+            product=cls.shirt, color=red, size=cls.medium, cost=50, price=200
+        )
+        VariantFactory(product=cls.shirt, color=red, size=cls.small, cost=50, price=220)
+
+    def filter(self, **params) -> list:
+        response = self.client.get("/api/products/", params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item["id"] for item in response.data["results"]]
+
+    def test_conditions_apply_to_the_same_variant(self) -> None:
+        self.assertEqual(self.filter(color_name="red", size="M"), [str(self.shirt.id)])
+        self.assertEqual(
+            self.filter(min_price=150, max_price=250), [str(self.shirt.id)]
+        )
+        self.assertEqual(
+            self.filter(color_value="#0000ff", max_price=250, size="M"), []
+        )
+
+    def test_no_duplicated_products(self) -> None:
+        # both products have several matching variants
+        self.assertEqual(
+            sorted(self.filter(color_name="red", min_price=50)),
+            sorted([str(self.dress.id), str(self.shirt.id)]),
+        )
+        self.assertEqual(len(self.filter(size="M", max_price=1000)), 2)
+
+    def test_variant_filters_are_combined_into_one_subquery(self) -> None:
+        with CaptureQueriesContext(connection) as context:
+            self.filter(color_name="red", size="M", min_price=1, max_price=1000)
+        page = context.captured_queries[-1]["sql"]
+        self.assertEqual(page.count("EXISTS"), 1)
+
+
+class ProductFacetsTestCase(QueryBudgetMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.small = Size.objects.create(name="S")
+        cls.medium = Size.objects.create(name="M")
+        cls.red = ColorFactory(color1_name="Red")
+        cls.blue = ColorFactory(color1_name="Blue")
+        cls.dress = ProductFactory(name="Dress")
+        cls.shirt = ProductFactory(name="Shirt")
+        cls.scarf = ProductFactory(name="Scarf", category=cls.dress.category)
+        VariantFactory(
+            product=cls.dress,
+            color=cls.red,
+            size=cls.small,
+            sort_order=1,
+            cost=50,
+            price=100,
+        )
+        VariantFactory(
+            product=cls.dress,
+            color=cls.red,
+            size=cls.medium,
+            sort_order=2,
+            cost=50,
+            price=300,
+        )
+        VariantFactory(
+            product=cls.shirt,
+            color=cls.blue,
+            size=cls.medium,
+            sort_order=1,
+            cost=50,
+            price=600,
+        )
+        VariantFactory(
+            product=cls.scarf,
+            color=cls.red,
+            size=cls.small,
+            sort_order=1,
+            cost=50,
+            price=120,
+        )
+
+    @staticmethod
+    def counts(facet: list) -> dict:
+        return {item["label"]: item["count"] for item in facet}
+
+    def test_facets(self) -> None:
+        with self.assertQueryBudget(1):
+            response = self.client.get("/api/products/facets/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data
+        self.assertEqual(self.counts(data["color"]), {"Red": 2, "Blue": 1})
+        self.assertEqual(self.counts(data["size"]), {"S": 2, "M": 2})
+        self.assertEqual(
+            self.counts(data["price"]),
+            {"0-250": 2, "250-500": 1, "500-1000": 1, "1000-": 0},
+        )
+        self.assertEqual(
+            self.counts(data["category"]),
+            {self.dress.category.name: 2, self.shirt.category.name: 1},
+        )
+        self.assertEqual(
+            {item["value"] for item in data["division"]},
+            {
+                str(self.dress.category.division_id),
+                str(self.shirt.category.division_id),
+            },
+        )
+
+    def test_facets_count_the_second_colors(self) -> None:
+        two_tone = ColorFactory(color1_name="Blue", color2_name="Red")
+        hat = ProductFactory(name="Hat")
+        VariantFactory(product=hat, color=two_tone, size=self.small, cost=50, price=100)
+        # red second, already counted by its first color
+        VariantFactory(
+            product=self.dress, color=two_tone, size=self.small, cost=50, price=100
+        )
+        response = self.client.get("/api/products/facets/")
+        self.assertEqual(self.counts(response.data["color"]), {"Red": 3, "Blue": 3})
+        # the counts match the products the filter returns
+        response = self.client.get("/api/products/", {"color_name": "red"})
+        self.assertEqual(response.data["count"], 3)
+
+    def test_facets_use_the_list_filters(self) -> None:
+        response = self.client.get(
+            "/api/products/facets/", {"category": str(self.dress.category_id)}
+        )
+        data = response.data
+        self.assertEqual(self.counts(data["color"]), {"Red": 2})
+        self.assertEqual(self.counts(data["size"]), {"S": 2, "M": 1})
+
+        response = self.client.get("/api/products/facets/", {"search": "shirt"})
+        self.assertEqual(self.counts(response.data["color"]), {"Blue": 1})
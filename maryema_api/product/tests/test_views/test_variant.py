@@ -0,0 +1,206 @@
+from profile.tests.factories import ProfileFactory
+from profile.wishlist import cache_key, get_wishlist_ids
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from discount.engine import get_schedule
+from product.models import Size
+from product.tests.factories import VariantFactory
+
+
+class WishlistTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        size = Size.objects.create(name="M")
+        cls.first = VariantFactory(size=size)
+        cls.second = VariantFactory(size=size, product=cls.first.product, sort_order=2)
+        cls.other = VariantFactory(size=size)
+        cls.profile = ProfileFactory()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=self.profile.user)
+
+    def add(self, variant):
+        return self.client.post(f"/api/variants/{variant.pk}/add-to-wishlist/")
+
+    def remove(self, variant):
+        return self.client.post(f"/api/variants/{variant.pk}/remove-from-wishlist/")
+
+    def test_add_is_idempotent(self):
+        response = self.add(self.first)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["status"], "added")
+        response = self.add(self.first)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], "unchanged")
+        self.assertEqual(list(self.profile.wishlist.all()), [self.first])
+
+    def test_remove_is_idempotent(self):
+        self.profile.wishlist.add(self.first)
+        response = self.remove(self.first)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], "removed")
+        response = self.remove(self.first)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], "unchanged")
+        self.assertFalse(self.profile.wishlist.exists())
+
+    def test_add_does_not_load_the_wishlist(self):
+        self.profile.wishlist.add(self.second, self.other)
+        with CaptureQueriesContext(connection) as queries:
+            self.add(self.first)
+        wishlist_queries = [
+            query["sql"] for query in queries if "profiles_wishlist" in query["sql"]
+        ]
+        self.assertEqual(len(wishlist_queries), 1)
+        self.assertTrue(wishlist_queries[0].startswith("INSERT"))
+
+    def test_anonymous_cannot_change_a_wishlist(self):
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.add(self.first).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_ids(self):
+        self.profile.wishlist.add(self.first, self.second)
+        response = self.client.get("/api/variants/wishlist/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data,
+            {
+                "variants": sorted([str(self.first.pk), str(self.second.pk)]),
+                "products": [str(self.first.product_id)],
+            },
+        )
+
+    def test_ids_are_cached(self):
+        get_wishlist_ids(self.profile.pk)
+        with self.assertNumQueries(0):
+            get_wishlist_ids(self.profile.pk)
+
+    def test_ids_are_forgotten_by_the_changes(self):
+        self.assertEqual(get_wishlist_ids(self.profile.pk)["variants"], [])
+        self.add(self.first)
+        self.assertIsNone(cache.get(cache_key(self.profile.pk)))
+        self.assertEqual(
+            get_wishlist_ids(self.profile.pk)["variants"], [str(self.first.pk)]
+        )
+        # through the related managers of both sides
+        self.other.wished_by.add(self.profile)
+        self.assertIsNone(cache.get(cache_key(self.profile.pk)))
+        get_wishlist_ids(self.profile.pk)
+        self.other.wished_by.clear()
+        self.assertIsNone(cache.get(cache_key(self.profile.pk)))
+        get_wishlist_ids(self.profile.pk)
+        self.first.delete()
+        self.assertEqual(get_wishlist_ids(self.profile.pk)["variants"], [])
+
+    def test_bulk_update(self):
+        self.profile.wishlist.add(self.first)
+        response = self.client.post(
+            "/api/variants/wishlist/",
+            {"add": [self.first.pk, self.second.pk], "remove": [self.other.pk]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"added": [self.second.pk], "removed": []})
+        self.assertEqual(set(self.profile.wishlist.all()), {self.first, self.second})
+        response = self.client.post(
+            "/api/variants/wishlist/",
+            {"remove": [self.first.pk, self.other.pk]},
+            format="json",
+        )
+        self.assertEqual(response.data, {"added": [], "removed": [self.first.pk]})
+        self.assertEqual(list(self.profile.wishlist.all()), [self.second])
+
+    def test_bulk_update_validation(self):
+        url = "/api/variants/wishlist/"
+        response = self.client.post(url, {}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(
+            url, {"add": [self.first.pk], "remove": [self.first.pk]}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(
+            url,
+            {"add": [self.first.pk, "00000000-0000-0000-0000-000000000000"]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("add", response.data)
+        self.assertFalse(self.profile.wishlist.exists())
+
+
+class WishedByTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        size = Size.objects.create(name="M")
+        cls.variant = VariantFactory(size=size)
+        cls.other = VariantFactory(size=size)
+        cls.admin = ProfileFactory(admin=True).user
+        cls.profiles = ProfileFactory.create_batch(3)
+        for profile in cls.profiles:
+            profile.wishlist.add(cls.variant)
+        cls.profiles[0].wishlist.add(cls.other)
+        cls.url = f"/api/variants/{cls.variant.pk}/wished-by/"
+
+    def setUp(self):
+        cache.clear()
+        # the discount schedule is precomputed by the scheduler, not by the requests
+        get_schedule()
+        self.client.force_authenticate(user=self.admin)
+
+    def count_queries(self, url) -> list[str]:
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [query["sql"] for query in queries if "COUNT(" in query["sql"]]
+
+    def test_paginated_users(self):
+        response = self.client.get(self.url, {"page_size": 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 3)
+        self.assertEqual(
+            [user["id"] for user in response.data["results"]],
+            sorted(profile.user.pk for profile in self.profiles),
+        )
+
+    def test_queries_do_not_grow_with_the_users(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(3):
+            self.client.get(self.url)
+        for profile in ProfileFactory.create_batch(3):
+            profile.wishlist.add(self.variant)
+        self.client.get(self.url)
+        # the variant, the users with their profiles and their wishlists (prefetched)
+        with self.assertNumQueries(3):
+            self.client.get(self.url)
+
+    def test_count_is_cached_until_the_wishlists_change(self):
+        self.assertEqual(len(self.count_queries(self.url)), 1)
+        self.assertEqual(self.count_queries(self.url), [])
+        ProfileFactory().wishlist.add(self.variant)
+        self.assertEqual(len(self.count_queries(self.url)), 1)
+        self.assertEqual(self.client.get(self.url).data["count"], 4)
+        self.profiles[1].wishlist.remove(self.variant)
+        self.assertEqual(self.client.get(self.url).data["count"], 3)
+        self.client.force_authenticate(user=self.profiles[2].user)
+        self.client.post(f"/api/variants/{self.variant.pk}/remove-from-wishlist/")
+        self.client.force_authenticate(user=self.admin)
+        self.assertEqual(self.client.get(self.url).data["count"], 2)
+
+    def test_customers_cannot_list_them(self):
+        self.client.force_authenticate(user=self.profiles[0].user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_variants_count_their_wishing_profiles_in_one_query(self):
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/variants/")
+        counts = {
+            variant["id"]: variant["wished_by"] for variant in response.data["results"]
+        }
+        self.assertEqual(counts, {str(self.variant.pk): 3, str(self.other.pk): 1})
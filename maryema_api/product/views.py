@@ -3,18 +3,42 @@ This module contains the viewsets for the product app
 """
 
 from profile.serializers import UserSerializer
+from profile.wishlist import (
+    add_to_wishlist,
+    get_wishlist_ids,
+    remove_from_wishlist,
+    update_wishlist,
+    wished_by_count,
+    wished_by_count_key,
+)
 
+from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+from django.db.models import F, Prefetch
+from django_filters import utils as filter_utils
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.filters import OrderingFilter, SearchFilter
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.filters import OrderingFilter
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 
+from core.cache import CachedResponseMixin
+from core.export import QuerysetExport
+from core.pagination import (
+    CachedCountPagination,
+    KeysetPagination,
+    PageNumberOrKeysetPagination,
+)
 from core.permissions import IsAdmin, IsAdminOrReadOnly
+from core.planner import QueryPlan, QueryPlannerMixin
+from discount.entitlements import current_discount
+from feedback.filters import FeedbackFilter
+from feedback.models import Feedback
 from feedback.serializers import FeedbackSerializer
-from product.filters import ProductFilter
+from product.facets import compute_facets
+from product.filters import ProductFilter, ProductSearchFilter
+from product.importer import CatalogImporter, guess_format
 from product.models import (
     Category,
     Collection,
@@ -26,6 +50,7 @@ from product.models import (
     Size,
 )
 from product.serializers import (
+    CatalogImportSerializer,
     CategorySerializer,
     ColorSerializer,
     DivisionSerializer,
@@ -36,11 +61,36 @@ from product.serializers import (
     ReadCollectionSerializer,
     SizeSerializer,
     VariantSerializer,
+    WishlistUpdateSerializer,
     WriteCollectionSerializer,
 )
 
-
-class DivisionViewSet(viewsets.ModelViewSet):
+# the columns of the catalog export, named as the columns of the import
+CATALOG_EXPORT_COLUMNS = {
+    "variant": "pk",
+    "product_id": "product_id",
+    "product": "product__name",
+    "description": "product__description",
+    "tags": "product__tags",
+    "category": "product__category__name",
+    "division": "product__category__division__name",
+    "color1_name": "color__color1_name",
+    "color1_value": "color__color1_value",
+    "color2_name": "color__color2_name",
+    "color2_value": "color__color2_value",
+    "size": "size__name",
+    "image": "image__src",
+    "alt": "image__alt",
+    "cost": "cost",
+    "price": "price",
+    "quantity": "quantity",
+    "sort_order": "sort_order",
+    "created_at": "created_at",
+    "updated_at": "updated_at",
+}
+
+
+class DivisionViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     """
     A viewset for the Division model
 
@@ -52,7 +102,7 @@ class DivisionViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAdminOrReadOnly]
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     """
     A viewset for the Category model
 
@@ -64,7 +114,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAdminOrReadOnly]
 
 
-class ColorViewSet(viewsets.ModelViewSet):
+class ColorViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     """
     A viewset for the Color model
 
@@ -76,7 +126,7 @@ class ColorViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAdminOrReadOnly]
 
 
-class SizeViewSet(viewsets.ModelViewSet):
+class SizeViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     """
     A viewset for the Size model
 
@@ -88,7 +138,7 @@ class SizeViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAdminOrReadOnly]
 
 
-class ImgViewSet(viewsets.ModelViewSet):
+class ImgViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     """
     A viewset for the Img model
 
@@ -100,30 +150,84 @@ class ImgViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAdminOrReadOnly]
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(CachedResponseMixin, QueryPlannerMixin, viewsets.ModelViewSet):
     """
     A viewset for the Product model that provides the following <b>extra</b> actions:
 
-    - `feedback`: Get or add feedbacks for a product
+    - `feedback`: Get (paginated and filtered) or add feedbacks for a product
+
+    - `facets`: Get the counts of each facet value for the filtered products
+
+    - `import_catalog`: Import products and variants from a CSV or JSONL file
+
+    - `export`: Stream the catalog as NDJSON or CSV, one variant per row
 
     It also, provides different serializers based on user type and action
+    and loads the relations each of them needs through its query plan
+
+    The list uses keyset pagination with `pagination=cursor`,
+    the feedbacks always do (best rated then latest first)
+
+    The list can be sorted by rating with `ordering=-rating,-rating_count`
+
+    The list, the details and the facets responses are cached until a change
+    of the products (or of what they show) invalidates them,
+    the first pages of the feedbacks of a product until a change of its feedbacks
     """
 
     permission_classes = [IsAdminOrReadOnly]
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    search_fields = [
-        "name",
-        "tags",
-        "collection__name",
-    ]
-    ordering_fields = ["created_at", "variant__price"]
+    cached_actions = ("list", "retrieve", "facets", "feedback")
+    feedback_ordering = ("-rate", "-created_at", "-id")
+    pagination_class = PageNumberOrKeysetPagination
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, OrderingFilter]
+    # the rating orderings are read from the listing (aliased in get_queryset)
+    ordering_fields = ["created_at", "variant__price", "rating", "rating_count"]
     filterset_class = ProductFilter
+    query_plans = {
+        # the admin serializer only renders ids and hyperlinks
+        ProductSerializer: QueryPlan(),
+        # the card values are read from the listing, so a page is a single query
+        ProductListPublicSerializer: QueryPlan(
+            select_related=("listing", "category"),
+            annotations={"sale_discount": current_discount("listing__lead_variant")},
+        ),
+        ProductDetailPublicSerializer: QueryPlan(
+            select_related=("listing",),
+            prefetch_related=(
+                Prefetch(
+                    "variants",
+                    queryset=ProductVariant.objects.select_related(
+                        "color", "size", "image"
+                    ).annotate(sale_discount=current_discount()),
+                ),
+            ),
+        ),
+    }
 
     def get_queryset(self):
         user = self.request.user
         if user.is_authenticated and user.profile.is_admin:
-            return Product.objects.all()
-        return Product.objects.filter(variant__isnull=False)
+            queryset = Product.objects.all()
+        else:
+            # only the products that have variants are public
+            queryset = Product.objects.filter(listing__variant_count__gt=0)
+        queryset = queryset.alias(
+            rating=F("listing__rating_average"),
+            rating_count=F("listing__rating_count"),
+        )
+        return self.plan_queryset(queryset)
+
+    def get_cache_namespace(self) -> str:
+        if self.action == "feedback":
+            return "product-feedback"
+        return super().get_cache_namespace()
+
+    def should_cache_response(self, request) -> bool:
+        # the next pages of the feedbacks are cheap keyset queries
+        return (
+            self.action != "feedback"
+            or KeysetPagination.cursor_query_param not in request.query_params
+        )
 
     def get_serializer_class(self):
         user = self.request.user
@@ -139,6 +243,18 @@ class ProductViewSet(viewsets.ModelViewSet):
         permission_classes=[permissions.IsAuthenticatedOrReadOnly],
     )
     def feedback(self, request, pk):
+        """
+        Get the feedbacks of the product, best rated then latest first,
+        or add one (customers only)
+
+        The feedbacks are paginated with a cursor (see `KeysetPagination`).
+
+        Query params:
+
+        - `rate`: the exact rate (0 for the feedbacks without a rate)
+        - `min_rate`: the lowest rate
+        - `has_comment`: `true` for the feedbacks with a comment, `false` without
+        """
         product = self.get_object()
         if request.method == "POST":
             serializer = FeedbackSerializer(
@@ -154,9 +270,69 @@ class ProductViewSet(viewsets.ModelViewSet):
                         status=status.HTTP_400_BAD_REQUEST,
                     )
             return Response(serializer.errors, status=400)
-        feedbacks = product.feedbacks.all()
-        serializer = FeedbackSerializer(feedbacks, many=True)
-        return Response(serializer.data)
+        filterset = FeedbackFilter(
+            request.query_params,
+            queryset=Feedback.objects.filter(product=product),
+            request=request,
+        )
+        if not filterset.is_valid():
+            raise filter_utils.translate_validation(filterset.errors)
+        paginator = KeysetPagination(ordering=self.feedback_ordering)
+        page = paginator.paginate_queryset(filterset.qs, request, view=self)
+        serializer = FeedbackSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=["GET"])
+    def facets(self, request):
+        """
+        Get the counts of each category, division, color, size and price range
+        for the products matching the same filters as the products list
+        """
+        products = self.filter_queryset(self.get_queryset())
+        return Response(compute_facets(products))
+
+    @action(
+        detail=False,
+        methods=["POST"],
+        permission_classes=[IsAdmin],
+        parser_classes=[MultiPartParser],
+        url_path="import",
+    )
+    def import_catalog(self, request):
+        """
+        Import products and variants from an uploaded CSV or JSONL file,
+        one variant per row (see `CatalogRowSerializer` for the columns)
+
+        The rows that can't be imported are reported with their line numbers
+        and errors, the others are imported anyway.
+        """
+        serializer = CatalogImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        file = serializer.validated_data["file"]
+        try:
+            format = serializer.validated_data.get("format") or guess_format(file.name)
+        except ValueError as e:
+            return Response({"format": [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+        report = CatalogImporter().import_file(file, format)
+        return Response(report.to_dict())
+
+    @action(detail=False, methods=["GET"], permission_classes=[IsAdmin])
+    def export(self, request):
+        """
+        Stream the whole catalog, one variant with its product per row
+
+        Query params:
+
+        - `columns`: comma separated column names, all of them by default
+        - `output`: `ndjson` (the default) or `csv`, which can be imported back
+        - `gzip`: `true` to compress the stream
+        """
+        variants = ProductVariant.objects.order_by(
+            "product__created_at", "product_id", "sort_order"
+        )
+        return QuerysetExport(variants, CATALOG_EXPORT_COLUMNS, "catalog").response(
+            request
+        )
 
 
 class VariantViewSet(viewsets.ModelViewSet):
@@ -166,6 +342,8 @@ class VariantViewSet(viewsets.ModelViewSet):
 
     - `remove_from_wishlist`: Remove the variant from the current user's wishlist
 
+    - `wishlist`: Get the ids in the current user's wishlist or add and remove many variants
+
     - `wished_by`: Get the users who have added this variant to their wishlist
 
     All users can read the variants but only authenticated users can add or remove them from their wishlist.
@@ -177,69 +355,116 @@ class VariantViewSet(viewsets.ModelViewSet):
     serializer_class = VariantSerializer
     permission_classes = [IsAdmin]
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ("list", "retrieve"):
+            # instead of a COUNT per variant for its `wished_by`
+            # and a lookup of its discounts for its `sale_price`
+            queryset = queryset.annotate(
+                wished_by_count=wished_by_count(), sale_discount=current_discount()
+            )
+        return queryset
+
     @action(
         detail=True,
+        methods=["GET", "POST"],
         permission_classes=[permissions.IsAuthenticated],
         url_path="add-to-wishlist",
     )
     def add_to_wishlist(self, request, pk):
-        """Add this variant to the current user's wishlist"""
+        """
+        Add this variant to the current user's wishlist
 
+        Adding a variant already in the wishlist changes nothing (200 instead of 201).
+        """
         variant = self.get_object()
-        current_user_wishlist = request.user.profile.wishlist
-        if variant in current_user_wishlist.all():
+        if not add_to_wishlist(request.user.profile.pk, variant.pk):
             return Response(
-                {"error": f"{variant} is already in your wishlist."},
-                status=status.HTTP_400_BAD_REQUEST,
+                {
+                    "detail": f"{variant} is already in your wishlist.",
+                    "status": "unchanged",
+                },
+                status=status.HTTP_200_OK,
             )
-        current_user_wishlist.add(variant)
         return Response(
-            {"detail": f"{variant} is added to your wishlist successfully"},
-            status=status.HTTP_200_OK,
+            {
+                "detail": f"{variant} is added to your wishlist successfully",
+                "status": "added",
+            },
+            status=status.HTTP_201_CREATED,
         )
 
     @action(
         detail=True,
+        methods=["GET", "POST"],
         permission_classes=[permissions.IsAuthenticated],
         url_path="remove-from-wishlist",
     )
     def remove_from_wishlist(self, request, pk):
-        """Remove this variant from the current user's wishlist"""
+        """
+        Remove this variant from the current user's wishlist
+
+        Removing a variant not in the wishlist changes nothing.
+        """
         variant = self.get_object()
-        current_user_wishlist = request.user.profile.wishlist
-        if variant not in current_user_wishlist.all():
+        if not remove_from_wishlist(request.user.profile.pk, variant.pk):
             return Response(
-                {"error": f"{variant} is not in your wishlist"},
-                status=status.HTTP_400_BAD_REQUEST,
+                {"detail": f"{variant} is not in your wishlist", "status": "unchanged"},
+                status=status.HTTP_200_OK,
             )
-        current_user_wishlist.remove(variant)
         return Response(
-            {"detail": f"{variant} is removed successfully."},
-            status=status.HTTP_204_NO_CONTENT,
+            {"detail": f"{variant} is removed successfully.", "status": "removed"},
+            status=status.HTTP_200_OK,
         )
 
+    @action(
+        detail=False,
+        methods=["GET", "POST"],
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def wishlist(self, request):
+        """
+        GET: the ids of the variants in the current user's wishlist and of their products,
+        to flag the product cards and variants "in wishlist"
+
+        POST: add and remove variants of the wishlist at once
+        (`{"add": [ids], "remove": [ids]}`), returns the ids actually added and removed
+        """
+        profile_id = request.user.profile.pk
+        if request.method == "GET":
+            return Response(get_wishlist_ids(profile_id))
+        serializer = WishlistUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(update_wishlist(profile_id, **serializer.validated_data))
+
     @action(
         detail=True,
         permission_classes=[permissions.IsAuthenticated, IsAdmin],
         url_path="wished-by",
     )
     def wished_by(self, request, pk):
-        """Get the users who have added this variant to their wishlist"""
-        variant = self.get_object()
-        wished_by = variant.wished_by.select_related("user").all()
-        wishing_users = [profile.user for profile in wished_by]
-
-        paginator = PageNumberPagination()
-        paginated_wishing_users = paginator.paginate_queryset(wishing_users, request)
+        """
+        Get the users who have added this variant to their wishlist
 
-        serializer = UserSerializer(
-            paginated_wishing_users, many=True, context={"request": request}
+        The users are paginated in the database, joined through the wishlist table,
+        and their total is counted once until the wishlists of the variant change.
+        """
+        variant = self.get_object()
+        wishing_users = (
+            User.objects.filter(profile__wishlist=variant)
+            .select_related("profile")
+            .prefetch_related(
+                Prefetch("profile__wishlist", ProductVariant.objects.only("pk"))
+            )
+            .order_by("pk")
         )
-
+        paginator = CachedCountPagination(wished_by_count_key(variant.pk))
+        page = paginator.paginate_queryset(wishing_users, request, view=self)
+        serializer = UserSerializer(page, many=True, context={"request": request})
         return paginator.get_paginated_response(serializer.data)
 
 
-class CollectionViewSet(viewsets.ModelViewSet):
+class CollectionViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     """
     A viewset for the Collection model
 
@@ -41,10 +41,6 @@ class Profile(BaseModel):
         verbose_name_plural = "Profiles"
         ordering = ["user__date_joined"]
 
-    def save(self, *args, **kwargs):
-        self.full_clean()
-        super().save(*args, **kwargs)
-
     def __str__(self) -> str:
         return self.user.username
 
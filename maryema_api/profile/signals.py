@@ -0,0 +1,52 @@
+from profile.models import Profile
+from profile.wishlist import Wishlist, forget_wished_by_counts, forget_wishlist_ids
+
+from django.db.models import signals
+from django.dispatch import receiver
+
+from product.models import ProductVariant
+
+
+@receiver(signals.m2m_changed, sender=Profile.wishlist.through)
+def forget_changed_wishlists(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Forgets the cached ids of the wishlists and the cached counts of the wishing profiles
+    changed through the related managers
+    """
+    if action == "pre_clear":
+        # the other side of the cleared rows is only known before they are deleted
+        related = instance.wished_by if reverse else instance.wishlist
+        instance._cleared_ids = list(related.values_list("pk", flat=True))
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    changed = instance._cleared_ids if action == "post_clear" else pk_set
+    if reverse:
+        # the wishlists were changed from the variant side
+        forget_wishlist_ids(*changed)
+        forget_wished_by_counts(instance.pk)
+    else:
+        forget_wishlist_ids(instance.pk)
+        forget_wished_by_counts(*changed)
+
+
+@receiver(signals.pre_delete, sender=ProductVariant)
+def forget_wishlists_of_deleted_variant(sender, instance, **kwargs):
+    """The wishlist rows of a deleted variant are removed by the cascade"""
+    forget_wishlist_ids(
+        *Wishlist.objects.filter(productvariant=instance).values_list(
+            "profile_id", flat=True
+        )
+    )
+    forget_wished_by_counts(instance.pk)
+
+
+@receiver(signals.pre_delete, sender=Profile)
+def forget_wishlist_of_deleted_profile(sender, instance, **kwargs):
+    """The wishlist rows of a deleted profile are removed by the cascade"""
+    forget_wished_by_counts(
+        *Wishlist.objects.filter(profile=instance).values_list(
+            "productvariant_id", flat=True
+        )
+    )
+    forget_wishlist_ids(instance.pk)
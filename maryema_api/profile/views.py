@@ -1,6 +1,7 @@
 import logging
 from profile.serializers import UserSerializer
 from profile.services import refresh_token, set_tokens
+from profile.wishlist import wished_by_count
 from typing import Any, Optional
 
 from django.conf import settings
@@ -15,6 +16,7 @@ from rest_framework.views import APIView
 from rest_framework_simplejwt import exceptions, views
 
 from core.permissions import IsAdmin
+from discount.entitlements import current_discount
 from feedback.serializers import FeedbackSerializer
 from product.serializers import VariantSerializer
 
@@ -49,8 +51,12 @@ class UserViewSet(viewsets.ModelViewSet):
         List all the product variants in the whishlist of a user
         """
         user = self.get_object()
-        whishlist = user.profile.wishlist
-        serializer = VariantSerializer(whishlist, many=True)
+        whishlist = user.profile.wishlist.annotate(
+            wished_by_count=wished_by_count(), sale_discount=current_discount()
+        )
+        serializer = VariantSerializer(
+            whishlist, many=True, context={"request": request}
+        )
         return Response(serializer.data)
 
 
@@ -0,0 +1,157 @@
+"""
+This module contains the operations on the wishlists of the profiles
+
+A variant is added or removed with a single statement on the through table
+of `Profile.wishlist`, which tells whether the wishlist changed,
+instead of loading the wishlist to check it first.
+
+The ids of the variants in a wishlist (and of their products) are cached
+per profile in the default cache, so the product cards can be flagged
+"in wishlist" from one cache read. The number of profiles wishing a variant
+is cached per variant for the pagination of its wishing users.
+They are forgotten by every change of the wishlists,
+the ones made through the related managers included (see profile/signals.py).
+"""
+
+from profile.models import Profile
+from typing import Iterable
+from uuid import UUID
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+Wishlist = Profile.wishlist.through
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def cache_key(profile_id) -> str:
+    return f"wishlist-ids:{profile_id}"
+
+
+def wished_by_count_key(variant_id) -> str:
+    return f"wished-by-count:{variant_id}"
+
+
+def wished_by_count() -> Coalesce:
+    """The number of profiles wishing each variant, to annotate the variants with"""
+    counts = (
+        Wishlist.objects.filter(productvariant_id=OuterRef("pk"))
+        .values("productvariant_id")
+        .annotate(n=Count("pk"))
+        .values("n")
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+def get_wishlist_ids(profile_id) -> dict:
+    """
+    The ids of the variants in a wishlist and of their products (cached)
+
+    Returns:
+        {"variants": [variant ids], "products": [product ids]}
+    """
+    key = cache_key(profile_id)
+    ids = cache.get(key)
+    if ids is None:
+        rows = Wishlist.objects.filter(profile_id=profile_id).values_list(
+            "productvariant_id", "productvariant__product_id"
+        )
+        variants, products = set(), set()
+        for variant_id, product_id in rows:
+            variants.add(str(variant_id))
+            products.add(str(product_id))
+        ids = {"variants": sorted(variants), "products": sorted(products)}
+        cache.set(key, ids, CACHE_TIMEOUT)
+    return ids
+
+
+def forget_wishlist_ids(*profile_ids) -> None:
+    """Drops the cached ids of the wishlists, now and again once committed"""
+    keys = [cache_key(profile_id) for profile_id in profile_ids]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    # in case the old wishlist was cached again before the commit
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def forget_wished_by_counts(*variant_ids) -> None:
+    """Drops the cached counts of the wishing profiles, now and again once committed"""
+    keys = [wished_by_count_key(variant_id) for variant_id in variant_ids]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def add_to_wishlist(profile_id, variant_id: UUID) -> bool:
+    """
+    Adds a variant to a wishlist if it isn't there already
+
+    Returns:
+        whether the variant was added
+    """
+    try:
+        # in a savepoint, so a duplicate doesn't break the outer transaction
+        with transaction.atomic():
+            Wishlist.objects.create(profile_id=profile_id, productvariant_id=variant_id)
+    except IntegrityError:
+        return False
+    forget_wishlist_ids(profile_id)
+    forget_wished_by_counts(variant_id)
+    return True
+
+
+def remove_from_wishlist(profile_id, variant_id: UUID) -> bool:
+    """
+    Removes a variant from a wishlist if it is there
+
+    Returns:
+        whether the variant was removed
+    """
+    deleted, _ = Wishlist.objects.filter(
+        profile_id=profile_id, productvariant_id=variant_id
+    ).delete()
+    if deleted:
+        forget_wishlist_ids(profile_id)
+        forget_wished_by_counts(variant_id)
+    return bool(deleted)
+
+
+def update_wishlist(
+    profile_id, add: Iterable[UUID] = (), remove: Iterable[UUID] = ()
+) -> dict:
+    """
+    Adds and removes variants of a wishlist in one INSERT and one DELETE
+
+    Returns:
+        {"added": [variant ids], "removed": [variant ids]}, the variants
+        already in (or not in) the wishlist are left out
+    """
+    add, remove = list(dict.fromkeys(add)), list(dict.fromkeys(remove))
+    existing = set(
+        Wishlist.objects.filter(
+            profile_id=profile_id, productvariant_id__in=add + remove
+        ).values_list("productvariant_id", flat=True)
+    )
+    added = [variant_id for variant_id in add if variant_id not in existing]
+    removed = [variant_id for variant_id in remove if variant_id in existing]
+    with transaction.atomic():
+        # the conflicts are the variants added concurrently
+        Wishlist.objects.bulk_create(
+            [
+                Wishlist(profile_id=profile_id, productvariant_id=variant_id)
+                for variant_id in added
+            ],
+            ignore_conflicts=True,
+        )
+        if removed:
+            Wishlist.objects.filter(
+                profile_id=profile_id, productvariant_id__in=removed
+            ).delete()
+    if added or removed:
+        forget_wishlist_ids(profile_id)
+        forget_wished_by_counts(*added, *removed)
+    return {"added": added, "removed": removed}